@@ -0,0 +1,68 @@
+"""
+Time Portfolio.load_transactions serially and with process pools of several sizes.
+
+Generate a synthetic ledger first if needed:
+    python benchmarks/bench_load.py ledger.csv --generate 5000000 --symbols 5000
+then compare pool sizes:
+    python benchmarks/bench_load.py ledger.csv --processes 1 8 32
+
+Besides the wall time, the CPU time of the parent process, which merges the
+ranges, and of each worker is reported; their sum is the expected load time
+when every worker has a core of its own, e.g. to size a pool on a busy machine.
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pt import Portfolio
+
+
+def generate(path, rows, symbols, seed=0):
+    rng = np.random.default_rng(seed)
+    names = rng.integers(0, symbols, rows)
+    amounts = rng.integers(1, 100, rows)
+    prices = rng.uniform(1, 500, rows)
+    days = np.datetime64("2000-01-01") + np.sort(rng.integers(0, 9000, rows))
+    with open(path, "w") as file:
+        file.write("USD,Cash,USD,deposit,1e15,1.0,0.0,2000-01-01\n")
+        file.writelines(f"S{name},Stock,USD,buy,{amount},{price:.2f},1.0,{day}\n"
+                        for name, amount, price, day in zip(names, amounts, prices, days.astype(str)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_file")
+    parser.add_argument("--generate", type=int, help="write a synthetic ledger of this many rows first")
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.generate:
+        generate(args.csv_file, args.generate, args.symbols)
+    for processes in args.processes:
+        timings, parent, workers = [], [], []
+        for _ in range(args.repeat):
+            started, cpu = time.perf_counter(), time.process_time()
+            children = resource.getrusage(resource.RUSAGE_CHILDREN)
+            portfolio = Portfolio.load_transactions(args.csv_file, processes=processes)
+            timings.append(time.perf_counter() - started)
+            parent.append(time.process_time() - cpu)
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            workers.append((usage.ru_utime + usage.ru_stime - children.ru_utime - children.ru_stime) / processes)
+        best = int(np.argmin(timings))
+        # With a core per worker the load takes about the work of the parent plus that of one worker
+        print(f"{processes:>3} processes: best {timings[best]:.2f} s, "
+              f"{len(portfolio.transactions) / timings[best] / 1e6:.2f} M rows/s, parent CPU {parent[best]:.2f} s, "
+              f"CPU per worker {max(workers[best], 0.0):.2f} s, "
+              f"{parent[best] + max(workers[best], 0.0):.2f} s with {processes} free cores")
+
+
+if __name__ == "__main__":
+    main()
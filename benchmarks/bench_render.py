@@ -0,0 +1,52 @@
+"""
+Time Portfolio.load_transactions -> render end to end against recorded market data.
+
+Record once with network access:
+    python benchmarks/bench_render.py portfolio_transactions.csv market.pt.gz --record
+then replay anywhere, optionally simulating provider latency:
+    python benchmarks/bench_render.py portfolio_transactions.csv market.pt.gz --latency 0.2
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pt import Portfolio, market_data
+from pt.replay import RecordingProvider, ReplayProvider
+from pt.richtools import repr_rich
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv_file")
+    parser.add_argument("recording")
+    parser.add_argument("--record", action="store_true", help="record from the live provider")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per provider request")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Histories must come from the recording, not from a local cache
+    market_data.set_history_cache(None)
+    if args.record:
+        with RecordingProvider(market_data.get_provider(), args.recording) as recorder:
+            market_data.set_provider(recorder)
+            repr_rich(Portfolio.load_transactions(args.csv_file))
+        return
+
+    provider = ReplayProvider(args.recording, latency=args.latency)
+    market_data.set_provider(provider)
+    timings = []
+    for _ in range(args.repeat):
+        market_data.set_quote_cache(market_data.QuoteCache())
+        started = time.perf_counter()
+        repr_rich(Portfolio.load_transactions(args.csv_file))
+        timings.append(time.perf_counter() - started)
+    print(f"load + render: best {min(timings) * 1000:.1f} ms, "
+          f"median {sorted(timings)[len(timings) // 2] * 1000:.1f} ms, "
+          f"{provider.requests / args.repeat:.0f} provider requests per run")
+
+
+if __name__ == "__main__":
+    main()
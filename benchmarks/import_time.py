@@ -0,0 +1,65 @@
+"""
+Track the startup cost of `import pt` with `python -X importtime`.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --statement "from pt import Portfolio" --budget 150
+
+Prints the best cumulative import time of the statement over a few fresh
+interpreters and the slowest modules it pulled in. Exits with status 1 when
+the time exceeds `--budget` milliseconds or when one of the `--forbid`
+modules, yfinance, pandas, pyarrow and rich by default, was imported.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(statement: str):
+    """Cumulative microseconds per top-level module imported by `statement` in a fresh interpreter"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for match in _LINE.finditer(result.stderr):
+        _, cumulative, indent, module = match.groups()
+        if len(indent) == 1:
+            times[module] = times.get(module, 0) + int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statement", default="import pt")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest modules listed")
+    parser.add_argument("--budget", type=float, help="fail above this many milliseconds")
+    parser.add_argument("--forbid", nargs="*", default=["yfinance", "pandas", "pyarrow", "rich"])
+    args = parser.parse_args()
+
+    # Modules of the interpreter startup itself, e.g. site, are not counted
+    startup = import_times("pass")
+    runs = [{module: cumulative for module, cumulative in import_times(args.statement).items()
+             if module not in startup} for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: sum(times.values()))
+    total = sum(best.values()) / 1000
+    print(f"{args.statement!r}: best {total:.1f} ms of {args.repeat}")
+    for module, cumulative in sorted(best.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{cumulative / 1000:>9.1f} ms  {module}")
+
+    failed = False
+    forbidden = [module for module in args.forbid if module in best]
+    if forbidden:
+        print(f"Imported eagerly: {', '.join(forbidden)}")
+        failed = True
+    if args.budget is not None and total > args.budget:
+        print(f"Over the budget of {args.budget:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@ from pt import Portfolio, Stock, ETF, Transaction, PortfolioFromCsv, Cash
 
 if __name__ == "__main__":
     # portfolio = Portfolio.load_transactions("portfolio_transactions.csv")
-    portfolio: Portfolio = PortfolioFromCsv("portfolio_transactions.csv")
+    # Restores portfolio_transactions.csv.snapshot and only replays the rows appended since
+    portfolio: Portfolio = Portfolio.load("portfolio_transactions.csv")
 
     # # Example: Add a new stock transaction with dividends
     # stock = Stock(name="AAPL", transaction_cost=10, dividends=50)
@@ -1,6 +1,4 @@
-from .transaction import Transaction
-from .asset import Asset, Stock, ETF, Crypto, Cash
-from .portfolio import Portfolio
+import importlib
 
 __all__ = [
     "Transaction", 
@@ -10,10 +8,44 @@ __all__ = [
     "Crypto",
     "Portfolio",
     "Cash",
+    "ConsolidatedPortfolio",
     "PortfolioFromCsv"
 ]
 
-def load_portfolio(filename: str) -> Portfolio:
+# Public names are imported from their module on first access, so that `import pt`
+# does not load numpy, pyarrow, pandas, yfinance or rich before they are needed
+_LAZY = {
+    "Transaction": ".transaction",
+    "Asset": ".asset",
+    "Stock": ".asset",
+    "ETF": ".asset",
+    "Crypto": ".asset",
+    "Cash": ".asset",
+    "Portfolio": ".portfolio",
+    "ConsolidatedPortfolio": ".consolidated",
+}
+
+_SUBMODULES = ("arrow_io", "asset", "consolidated", "fetcher", "fx", "history_cache", "holdings", "ingest",
+               "journal", "market_data", "portfolio", "price_history", "price_matrix", "replay", "resample",
+               "returns", "richtools", "snapshot", "sqlite_store", "transaction", "valuation")
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | set(_SUBMODULES))
+
+
+def load_portfolio(filename: str) -> "Portfolio":
     """
     Load a portfolio from a CSV file.
     
@@ -23,6 +55,22 @@ def load_portfolio(filename: str) -> Portfolio:
     Returns:
     Portfolio: The loaded portfolio object.
     """
+    from .portfolio import Portfolio
     return Portfolio.load_transactions(filename)
 
-PortfolioFromCsv = load_portfolio
\ No newline at end of file
+def load_portfolios(directory: str, pattern: str = "portfolio_*.csv", processes: int = None) -> "ConsolidatedPortfolio":
+    """
+    Load every portfolio CSV of a directory and consolidate them.
+
+    Args:
+    directory: str - Directory holding one CSV file per account.
+    pattern: str - File names to load.
+    processes: int - Files parsed in parallel, one per CPU by default.
+
+    Returns:
+    ConsolidatedPortfolio: The merged accounts, each account available by name.
+    """
+    from .consolidated import ConsolidatedPortfolio
+    return ConsolidatedPortfolio.load(directory, pattern, processes)
+
+PortfolioFromCsv = load_portfolio
@@ -0,0 +1,203 @@
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .asset import Assets, Cash, identify_asset
+from .transaction import CashFlows, Categories, Transactions
+
+__all__ = [
+    'cash_flows_from_arrow',
+    'cash_flows_to_arrow',
+    'positions_from_arrow',
+    'positions_to_arrow',
+    'read_portfolio',
+    'read_table',
+    'transactions_from_arrow',
+    'transactions_to_arrow',
+    'write_portfolio',
+    'write_table',
+]
+
+def _dictionary(codes: np.ndarray, categories: Categories) -> pa.DictionaryArray:
+    # The code column is the index buffer as is
+    return pa.DictionaryArray.from_arrays(pa.array(codes, pa.int32()), pa.array(categories.values, pa.string()))
+
+
+def _days(days: np.ndarray) -> pa.Array:
+    return pa.array(days, pa.int32()).view(pa.date32())
+
+
+def _array(column) -> pa.Array:
+    if isinstance(column, pa.ChunkedArray):
+        # combine_chunks copies even a single chunk
+        return column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    return column
+
+
+def _codes(column, categories: Categories) -> np.ndarray:
+    """
+    Code column of a dictionary or string column, read into `categories`.
+
+    Indices of a dictionary already in the order of `categories` are used
+    without copying, e.g. from a memory-mapped IPC file.
+    """
+    column = _array(column)
+    if not pa.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    lookup = categories.encode(column.dictionary.to_pylist())
+    indices = column.indices.to_numpy(zero_copy_only=False)
+    if np.array_equal(lookup, np.arange(len(lookup))):
+        return indices.astype(np.int32, copy=False)
+    return lookup[indices]
+
+
+def _values(column, dtype) -> np.ndarray:
+    column = _array(column)
+    if pa.types.is_date32(column.type):
+        column = column.view(pa.int32())
+    return column.to_numpy(zero_copy_only=False).astype(dtype, copy=False)
+
+
+def transactions_to_arrow(transactions: Transactions) -> pa.Table:
+    """Ledger as an Arrow table, dictionary-encoded categories and date32 dates, without copying the columns"""
+    categories = transactions.categories
+    return pa.table({
+        'symbol': _dictionary(transactions.column('symbol'), categories['symbol']),
+        'asset_type': _dictionary(transactions.column('asset_type'), categories['asset_type']),
+        'currency': _dictionary(transactions.column('currency'), categories['currency']),
+        'type': _dictionary(transactions.column('type'), categories['type']),
+        'amount': transactions.amounts,
+        'price': transactions.prices,
+        'transaction_cost': transactions.transaction_costs,
+        'date': _days(transactions.column('day')),
+    })
+
+
+def transactions_from_arrow(table: pa.Table, transactions_per_page=20) -> Transactions:
+    """Ledger from a table of `transactions_to_arrow`; string category columns are encoded too"""
+    categories = {name: Categories() for name in Transactions.CATEGORIES}
+    columns = {name: _codes(table.column(name), categories[name]) for name in Transactions.CATEGORIES}
+    columns['day'] = _values(table.column('date'), np.int32)
+    for name in ('amount', 'price', 'transaction_cost'):
+        columns[name] = _values(table.column(name), np.float64)
+    return Transactions.from_columns(columns, categories, transactions_per_page)
+
+
+def cash_flows_to_arrow(cash_flows: CashFlows) -> pa.Table:
+    return pa.table({
+        'currency': _dictionary(cash_flows.column('currency'), cash_flows.categories['currency']),
+        'type': _dictionary(cash_flows.column('type'), cash_flows.categories['type']),
+        'amount': cash_flows.column('amount'),
+        'date': _days(cash_flows.column('day')),
+        'position': cash_flows.column('position'),
+    })
+
+
+def cash_flows_from_arrow(table: pa.Table) -> CashFlows:
+    cash_flows = CashFlows()
+    cash_flows.append_columns({
+        'currency': _codes(table.column('currency'), cash_flows.categories['currency']),
+        'type': _codes(table.column('type'), cash_flows.categories['type']),
+        'day': _values(table.column('date'), np.int32),
+        'amount': _values(table.column('amount'), np.float64),
+        'position': _values(table.column('position'), np.int64),
+    })
+    return cash_flows
+
+
+def positions_to_arrow(assets: Assets, prices=None) -> pa.Table:
+    """
+    Positions and their valuation, see `Holdings.performance`.
+
+    `prices` defaults to the last prices seen, NaN where unknown; no quote is fetched.
+    """
+    performance, _ = assets.performance(prices)
+    price = np.asarray(prices, dtype=np.float64) if prices is not None else assets.column('price')
+    return pa.table({
+        'symbol': pa.array(list(assets.keys()), pa.string()),
+        'asset_type': pa.array([asset.asset_type() for asset in assets.values()], pa.string()).dictionary_encode(),
+        'currency': pa.array([asset.currency for asset in assets.values()], pa.string()).dictionary_encode(),
+        'amount': assets.column('amount'),
+        'total_invested': assets.column('total_invested'),
+        'average_loading_price': assets.column('average_loading_price'),
+        'price': price,
+        'current_value': performance['current_value'],
+        'profit_loss': performance['profit_loss'],
+        'profit_loss_percentage': performance['profit_loss_percentage'],
+    })
+
+
+def positions_from_arrow(table: pa.Table) -> Assets:
+    assets = Assets()
+    columns = table.select(['symbol', 'asset_type', 'currency']).to_pydict()
+    for symbol, asset_type, currency in zip(columns['symbol'], columns['asset_type'], columns['currency']):
+        assets[symbol] = identify_asset(asset_type)(name=symbol, currency=currency)
+    for name in ('amount', 'total_invested', 'average_loading_price', 'price'):
+        assets.holdings.column(name)[:] = _values(table.column(name), np.float64)
+    return assets
+
+
+def _format(path: str, format: str = None) -> str:
+    if format is None:
+        return "parquet" if path.endswith(".parquet") else "arrow"
+    if format not in ("parquet", "arrow"):
+        raise ValueError(f"Invalid format: {format}")
+    return format
+
+
+def write_table(table: pa.Table, path: str, format: str = None):
+    """
+    Write a table as Parquet or as an Arrow IPC file. Without a `format` it is
+    Parquet for a `.parquet` path and Arrow IPC otherwise.
+    """
+    if _format(path, format) == "parquet":
+        pq.write_table(table, path)
+        return
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table.combine_chunks())
+
+
+def read_table(path: str, memory_map: bool = True, format: str = None) -> pa.Table:
+    """
+    Read a table of `write_table`, the format chosen like there. Arrow IPC files
+    are memory-mapped by default, the columns of the table then point into the
+    mapped file.
+    """
+    if _format(path, format) == "parquet":
+        return pq.read_table(path)
+    source = pa.memory_map(path) if memory_map else pa.OSFile(path)
+    return pa.ipc.open_file(source).read_all()
+
+
+_FILES = ('transactions', 'cash_flows', 'positions', 'balances')
+
+
+def write_portfolio(portfolio, directory: str, format: str = "parquet"):
+    """Write the tables of a portfolio to `<directory>/<table>.parquet` or `.arrow`"""
+    _format(directory, format)
+    os.makedirs(directory, exist_ok=True)
+    balances = portfolio.cash.balances
+    tables = {
+        'transactions': transactions_to_arrow(portfolio.transactions),
+        'cash_flows': cash_flows_to_arrow(portfolio.cash_flows),
+        'positions': positions_to_arrow(portfolio.assets),
+        'balances': pa.table({'currency': pa.array(list(balances), pa.string()),
+                              'amount': pa.array(list(balances.values()), pa.float64())}),
+    }
+    for name, table in tables.items():
+        write_table(table, os.path.join(directory, f"{name}.{format}"), format)
+
+
+def read_portfolio(directory: str, format: str = "parquet",
+                   memory_map: bool = True) -> Tuple[Assets, Cash, Transactions, CashFlows]:
+    """Assets, cash, ledger and cash flows written by `write_portfolio`"""
+    tables: Dict[str, pa.Table] = {name: read_table(os.path.join(directory, f"{name}.{format}"), memory_map, format)
+                                   for name in _FILES}
+    cash = Cash()
+    balances = tables['balances'].to_pydict()
+    cash.balances = dict(zip(balances['currency'], balances['amount']))
+    return (positions_from_arrow(tables['positions']), cash, transactions_from_arrow(tables['transactions']),
+            cash_flows_from_arrow(tables['cash_flows']))
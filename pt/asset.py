@@ -1,18 +1,31 @@
 from abc import ABC, abstractmethod
-from pt.richtools import repr_rich
-from rich.panel import Panel
-from rich import box
-from rich.text import Text
-from rich.console import Group
-from rich.table import Table
-from typing import List, Union, Dict
+import numpy as np
+from typing import Dict, Iterable, List, Union
+import copy
 
-from .market_data import fetch_historical_prices, fetch_price
+from .market_data import fetch_historical_prices, get_price, get_prices, get_quote_cache
+from .fx import FXRates, get_fx_rates
+from .price_history import PriceHistory
+from .holdings import Holdings, HoldingColumn
 
-__all__ = ['Asset', 'Stock', 'ETF', 'Bond', 'Crypto', 'Assets', 'Cash']
+__all__ = ['Asset', 'Stock', 'ETF', 'Bond', 'Crypto', 'Assets', 'Cash', 'identify_asset']
 
 class Asset(ABC):
+    # Once added to an Assets, the numbers of the asset live in its Holdings table
+    __slots__ = ('name', 'currency', '_amount', '_total_invested', '_average_loading_price', '_last_price',
+                 '_price_history', '_holdings', '_row')
+
+    # Set to np.float32 to halve the memory of price histories in large universes
+    history_dtype = np.float64
+
+    amount = HoldingColumn('amount', '_amount')
+    total_invested = HoldingColumn('total_invested', '_total_invested')
+    average_loading_price = HoldingColumn('average_loading_price', '_average_loading_price')
+    _price = HoldingColumn('price', '_last_price', nullable=True)
+
     def __init__(self, name, currency: str = None):
+        self._holdings: Holdings = None
+        self._row = -1
         self.name = name
         self.currency = currency
         self.average_loading_price = 0
@@ -23,19 +36,47 @@ class Asset(ABC):
 
     @property
     def price(self) -> float:
-        if self._price is None:
-            self._price = fetch_price(self.name)
+        # The shared quote cache decides when the price is stale, _price keeps the last quote seen
+        self._price = get_price(self.name)
         return self._price
 
     @property
-    def price_history(self) -> List[float]:
+    def history(self) -> PriceHistory:
         if self._price_history is None:
-            self._price_history = fetch_historical_prices(self.name, period="max", interval="1d")['Close'].tolist()
+            data = fetch_historical_prices(self.name, period="max", interval="1d")
+            self._price_history = PriceHistory.from_frame(data, dtype=self.history_dtype)
         return self._price_history
 
+    @property
+    def price_history(self) -> List[float]:
+        # Kept for compatibility, `history` keeps the dates and avoids boxing every price
+        return self.history.tolist()
+
     def asset_type(self):
         return self.__class__.__name__
 
+    def _values(self):
+        return self.amount, self.total_invested, self.average_loading_price, self._price
+
+    def _set_values(self, values):
+        self.amount, self.total_invested, self.average_loading_price, self._price = values
+
+    def _bind(self, holdings: Holdings, row: int):
+        values = self._values()
+        self._holdings, self._row = holdings, row
+        self._set_values(values)
+
+    def _unbind(self):
+        values = self._values()
+        self._holdings, self._row = None, -1
+        self._set_values(values)
+
+    def detached(self) -> 'Asset':
+        """Copy of the asset holding its own numbers, outside of any Holdings table"""
+        asset = copy.copy(self)
+        asset._unbind()
+        return asset
+
     @abstractmethod
     def calculate_value(self, price):
         pass
@@ -53,6 +94,9 @@ class Asset(ABC):
         }
 
     def __rich__(self) -> str:
+        from rich import box
+        from rich.panel import Panel
+        from rich.table import Table
         # Create a table with the asset information
         table = Table(title=self.name, box=box.SIMPLE, show_header=False)
         table.add_column("Attribute")
@@ -64,9 +108,12 @@ class Asset(ABC):
         return Panel(table, title="Asset Information")
         
     def __repr__(self):
+        from .richtools import repr_rich
         return repr_rich(self)
 
 class Stock(Asset):
+    __slots__ = ('dividends',)
+
     def __init__(self, name, currency, dividends=0):
         super().__init__(name, currency)
         self.dividends = dividends
@@ -84,6 +131,8 @@ class Stock(Asset):
     #     }
 
 class ETF(Asset):
+    __slots__ = ('annual_cost',)
+
     def __init__(self, name, currency, annual_cost=0):
         super().__init__(name, currency)
         self.annual_cost = annual_cost
@@ -101,8 +150,10 @@ class ETF(Asset):
     #     }
 
 class Bond(Asset):
-    def __init__(self, name, interest_rate=0):
-        super().__init__(name)
+    __slots__ = ('interest_rate',)
+
+    def __init__(self, name, interest_rate=0, currency: str = None):
+        super().__init__(name, currency)
         self.interest_rate = interest_rate
 
     def calculate_value(self, price):
@@ -118,6 +169,8 @@ class Bond(Asset):
     #     }
 
 class Crypto(Asset):
+    __slots__ = ()
+
     def calculate_value(self, price):
         return self.amount * price
 
@@ -131,23 +184,157 @@ class Crypto(Asset):
     #     }
 
 
+def identify_asset(asset_type) -> type:
+    match asset_type:
+        case "Stock":
+            return Stock
+        case "ETF":
+            return ETF
+        case "Bond":
+            return Bond
+        case "Crypto":
+            return Crypto
+        case _:
+            raise ValueError(f"Unknown asset type: {asset_type}")
+
+
 class Assets(dict):
+    """
+    Assets by name, backed by a struct-of-arrays `Holdings` table.
+
+    Every asset added is bound to a row of `holdings` and reads and writes its
+    amount, total_invested, average_loading_price and price there, so totals
+    are computed on whole columns. An asset already bound to another table is
+    copied. Passing `holdings` creates a view sharing the table of the Assets
+    it was filtered from.
+    """
+
+    def __init__(self, *args, holdings: Holdings = None, **kwargs):
+        super().__init__()
+        self._view = holdings is not None
+        self.holdings: Holdings = holdings if holdings is not None else Holdings()
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    @classmethod
+    def _restore(cls, holdings: Holdings, items, view: bool) -> 'Assets':
+        # Assets are restored already bound to the unpickled table
+        assets = cls.__new__(cls)
+        assets._view = view
+        assets.holdings = holdings
+        for key, value in items:
+            dict.__setitem__(assets, key, value)
+        return assets
+
+    def __reduce__(self):
+        return self.__class__._restore, (self.holdings, list(self.items()), self._view)
+
     def __setitem__(self, key: str, value: Asset):
         if key in self:
             existing_asset = self[key]
             existing_asset.amount += value.amount
             existing_asset.average_loading_price = (existing_asset.total_invested + value.total_invested) / existing_asset.amount
             existing_asset.total_invested += value.total_invested
+        elif self._view:
+            if value._holdings is not self.holdings:
+                raise ValueError("Only assets of the parent table can be added to a filtered view.")
+            super().__setitem__(key, value)
         else:
+            if value._holdings is not None:
+                value = value.detached()
+            value._bind(self.holdings, self.holdings.add(key, value.currency))
             super().__setitem__(key, value)
 
     def __getitem__(self, key: str) -> Asset:
         return super().__getitem__(key)
 
+    def __delitem__(self, key: str):
+        if key not in self:
+            raise KeyError(key)
+        self.remove([key])
+
+    def remove(self, names: Iterable[str]):
+        """Delete several assets with one pass over the table instead of one per asset"""
+        names = list(dict.fromkeys(names))
+        missing = [name for name in names if name not in self]
+        if missing:
+            raise KeyError(missing[0])
+        for name in names:
+            asset = super().pop(name)
+            if not self._view:
+                asset._unbind()
+        if not self._view and names:
+            first = int(self.holdings.remove_many(names)[0])
+            # Rows follow the insertion order of the dict
+            for row, moved in enumerate(list(self.values())[first:], first):
+                moved._row = row
+
+    def pop(self, key: str, *default):
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        asset = self[key]
+        del self[key]
+        return asset
+
+    def popitem(self):
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def clear(self):
+        if not self._view:
+            for asset in self.values():
+                asset._unbind()
+            self.holdings.clear()
+        super().clear()
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Asset = None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def _rows(self) -> Union[slice, np.ndarray]:
+        """Rows of these assets in `holdings`, in iteration order"""
+        if self._view:
+            return self.holdings.rows(self.keys())
+        return slice(0, len(self))
+
+    def column(self, name: str) -> np.ndarray:
+        """Values of a holdings column for these assets, in iteration order"""
+        return self.holdings.column(name)[self._rows()]
+
+    def total_invested(self) -> float:
+        return float(self.column('total_invested').sum())
+
+    def totals(self) -> Dict[str, float]:
+        """Value, invested capital, P&L and P&L% from the running totals of `holdings`, see `Holdings.totals`"""
+        return self.holdings.totals(self._rows() if self._view else None)
+
+    def currency_totals(self) -> Dict[str, Dict[str, float]]:
+        """Value and invested capital per currency, see `Holdings.currency_totals`"""
+        return self.holdings.currency_totals(self._rows() if self._view else None)
+
+    def update_price(self, name: str, price: float):
+        """Set the price of one asset, revaluing the totals by that asset only"""
+        self[name]._price = price
+
+    def check_totals(self, rtol: float = 1e-9):
+        """Compare the running totals with a full recompute, see `Holdings.check_totals`"""
+        self.holdings.check_totals(rtol)
+
+    def to_frame(self):
+        frame = self.holdings.to_frame()
+        return frame if not self._view else frame.iloc[self._rows()]
+
     def filter(self, names: Union[str, List[str]]) -> 'Assets':
         if isinstance(names, str):
             names = [names]
-        return Assets({name: self[name] for name in names if name in self})
+        return Assets({name: self[name] for name in names if name in self}, holdings=self.holdings)
 
     def add_asset(self, name, amount, total_invested, transaction_cost=0):
         if name in self:
@@ -160,34 +347,59 @@ class Assets(dict):
             new_asset.total_invested = total_invested
             self[name] = new_asset
 
+    def refresh_prices(self, force: bool = False) -> 'Assets':
+        """
+        Fetch the price of every held asset in a single batched request.
+
+        Prices still fresh in the shared quote cache are reused unless `force` is set.
+        """
+        names = list(self.keys())
+        if force:
+            get_quote_cache().invalidate(names)
+        prices = get_prices(names)
+        # Written to the price column in one go, keeping the last known price of missing quotes
+        rows = self._rows()
+        quotes = np.fromiter((prices.get(name, np.nan) for name in names), dtype=np.float64, count=len(names))
+        column = self.holdings.price
+        self.holdings.update_prices(rows, np.where(np.isnan(quotes), column[rows], quotes))
+        return self
+
+    def performance(self, prices=None):
+        """
+        Vectorized performance of these assets, see `Holdings.performance`.
+
+        Uses the known prices unless `prices` is given, in iteration order.
+        """
+        return self.holdings.performance(self._rows(), prices)
+
+    def _current_performance(self):
+        self.refresh_prices()
+        prices = self.column('price')
+        missing = np.flatnonzero(np.isnan(prices))
+        if len(missing):
+            raise ValueError(f"No price data available for {list(self.keys())[missing[0]]}.")
+        return self.performance(prices)
+
     def calculate_performance(self):
-        performance = {}
-        total_perfomance = 0
-        for asset_name, asset in self.items():
-            asset_performance = asset.calculate_performance()
-            performance[asset_name] = asset_performance
-            total_perfomance += asset_performance['profit_loss']
-        
-        total = {
-            'current_value': sum([asset_performance['current_value'] for asset_performance in performance.values()]),
-            'profit_loss': total_perfomance,
-            'profit_loss_percentage': (total_perfomance / sum([asset.total_invested for asset in self.values()])) * 100
-        }
-        return performance, total
-    
-        # for asset_name, asset in self.items():
-        #     performance[asset_name] = asset.calculate_performance()
-        # return performance
+        performance, total = self._current_performance()
+        names = list(self.keys())
+        per_asset = {name: {} for name in names}
+        for key, values in performance.items():
+            for name, value in zip(names, values.tolist()):
+                per_asset[name][key] = value
+        return per_asset, total
 
     def __rich__(self) -> str:
-        performance, total = self.calculate_performance()
-        
+        from rich.console import Group
+        from rich.panel import Panel
+        from rich.table import Table
+        performance, total = self._current_performance()
 
         # Print total performance
         total_value = total['current_value']
         total_profit_loss = total['profit_loss']
         total_profit_loss_percentage = total['profit_loss_percentage']
-        total_invested = sum([asset.total_invested for asset in self.values()])
+        total_invested = self.total_invested()
         total_performance_table = Table(box=None, show_header=True)
         total_performance_table.add_column("Total Value", justify="right", style="green")
         total_performance_table.add_column("Total Profit/Loss", justify="right", style="red")
@@ -209,27 +421,37 @@ class Assets(dict):
         table.add_column("Currency")
         table.add_column("Performance")
         
-        for asset in self.values():
+        rows = zip(self.values(), self.column('amount').tolist(), self.column('total_invested').tolist(),
+                   self.column('price').tolist(), performance['profit_loss'].tolist(),
+                   performance['profit_loss_percentage'].tolist())
+        for asset, amount, total_invested, price, profit_loss, profit_loss_percentage in rows:
             table.add_row(
                 asset.name,
-                str(asset.amount),
-                f"${asset.total_invested:.2f}",
-                f"${asset.price:.2f}",
+                str(amount),
+                f"${total_invested:.2f}",
+                f"${price:.2f}",
                 asset.currency,
-                f"${performance[asset.name]['profit_loss']:.2f} ({performance[asset.name]['profit_loss_percentage']:.2f}%)"
+                f"${profit_loss:.2f} ({profit_loss_percentage:.2f}%)"
             )
         # Panel(table, title="Assets")
         return Group(total_performance_panel, Panel(table, title="Assets"))
     
     def __repr__(self):
+        from .richtools import repr_rich
         return repr_rich(self)
 
 
 class Cash:
-    def __init__(self, exchange_rates: Dict[str, Dict[str, float]] = None):
+    def __init__(self, exchange_rates: Dict[str, Dict[str, float]] = None, fx: FXRates = None):
         # Holds the balance for each currency
         self.balances = {}  # e.g., {"EUR": 1000.0, "USD": 500.0}
+        # Fixed rates take precedence over the historical ones of `fx`
         self.exchange_rates = exchange_rates or {}  # e.g., {"EUR": {"USD": 1.1, "GBP": 0.85}}
+        self.fx = fx
+
+    @property
+    def fx_rates(self) -> FXRates:
+        return self.fx if self.fx is not None else get_fx_rates()
 
     def __getitem__(self, currency: str) -> float:
         """Return the balance for the given currency, defaulting to 0 if it doesn't exist"""
@@ -296,19 +518,24 @@ class Cash:
             raise ValueError("Transaction amount must be positive.")
 
 
-    def convert(self, from_currency: str, to_currency: str, amount: float) -> float:
+    def convert(self, from_currency: str, to_currency: str, amount: float, date=None) -> float:
         if from_currency == to_currency:
             return amount
         elif from_currency in self.exchange_rates and to_currency in self.exchange_rates[from_currency]:
             rate = self.exchange_rates[from_currency][to_currency]
             return amount * rate
         else:
-            raise ValueError(f"Exchange rate from {from_currency} to {to_currency} not available.")
-
-    def total_balance(self, target_currency: str) -> float:
-        total = 0.0
-        for currency, balance in self.balances.items():
-            total += self.convert(currency, target_currency, balance)
+            return amount * self.fx_rates.rate(from_currency, to_currency, date)
+
+    def total_balance(self, target_currency: str, date=None) -> float:
+        fixed = [currency for currency in self.balances
+                 if currency == target_currency or target_currency in self.exchange_rates.get(currency, {})]
+        total = sum(self.convert(currency, target_currency, self.balances[currency]) for currency in fixed)
+        others = [currency for currency in self.balances if currency not in fixed]
+        if others:
+            # All remaining currencies converted in one vectorized call
+            amounts = [self.balances[currency] for currency in others]
+            total += float(self.fx_rates.convert(amounts, others, target_currency, date).sum())
         return total
 
     def __str__(self):
@@ -316,9 +543,12 @@ class Cash:
         return f"Balances: {balances_str}"
 
     def __rich__(self):
+        from rich.panel import Panel
+        from rich.text import Text
         balances_str = "\n".join([f"{currency}: {balance:.2f}" for currency, balance in self.balances.items()])
         text = Text(balances_str)
         return Panel(text, title="Cash Balances")
     
     def __repr__(self):
+        from .richtools import repr_rich
         return repr_rich(self)
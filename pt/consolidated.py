@@ -0,0 +1,216 @@
+import fnmatch
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+from .asset import Assets, Cash
+from .portfolio import Portfolio
+
+__all__ = ['ConsolidatedPortfolio', 'account_name', 'find_portfolio_files']
+
+
+def find_portfolio_files(directory: str, pattern: str = "portfolio_*.csv") -> List[str]:
+    """Ledgers of `directory` whose file name matches `pattern`, sorted by name"""
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if fnmatch.fnmatch(name, pattern) and os.path.isfile(os.path.join(directory, name)))
+
+
+def account_name(path: str) -> str:
+    """Account of a ledger file, e.g. 'broker' for portfolio_broker.csv"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name[len("portfolio_"):] if name.startswith("portfolio_") and len(name) > len("portfolio_") else name
+
+
+def _load_account(csv_file: str, keep_transactions: bool) -> Portfolio:
+    return Portfolio.load_transactions(csv_file, keep_transactions=keep_transactions)
+
+
+class ConsolidatedPortfolio:
+    """
+    Several accounts, one `Portfolio` per ledger, with holdings merged by symbol
+    and cash merged by currency.
+
+    `assets` and `cash` hold the consolidated positions and balances, `accounts`
+    the portfolio of each account for drill-down. The holdings of all accounts
+    are kept as one set of concatenated columns tagged with their account and
+    consolidated row, so per-account figures are a single `bincount` and a
+    price is fetched once per symbol however many accounts hold it.
+
+    accounts : dict
+        Portfolio by account name, in display order
+    """
+
+    def __init__(self, accounts: Dict[str, Portfolio]):
+        self.accounts: Dict[str, Portfolio] = dict(accounts)
+        self.assets = Assets()
+        self.cash = Cash()
+        self.consolidate()
+
+    @classmethod
+    def load(cls, source: Union[str, Iterable[str]], pattern: str = "portfolio_*.csv", processes: int = None,
+             keep_transactions: bool = True) -> 'ConsolidatedPortfolio':
+        """
+        Load the ledgers of a directory, or a list of ledgers, in a process pool.
+
+        source : str or list
+            Directory scanned for files matching `pattern`, or the ledger files themselves
+        processes : int
+            Size of the pool, one per CPU by default; each process parses whole files
+        keep_transactions : bool
+            Keep the ledger of each account, see `Portfolio.load_transactions`
+        """
+        if isinstance(source, str) and os.path.isdir(source):
+            paths = find_portfolio_files(source, pattern)
+        else:
+            paths = [source] if isinstance(source, str) else list(source)
+        if not paths:
+            raise ValueError(f"No portfolio files found in {source}.")
+        names = [account_name(path) for path in paths]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate account names: {', '.join(duplicates)}")
+
+        processes = min(processes or os.cpu_count() or 1, len(paths))
+        if processes > 1:
+            # Many small ledgers are handed out in batches to keep the pickling overhead down
+            chunksize = max(1, len(paths) // (4 * processes))
+            with ProcessPoolExecutor(processes) as executor:
+                portfolios = list(executor.map(_load_account, paths, repeat(keep_transactions), chunksize=chunksize))
+        else:
+            portfolios = [_load_account(path, keep_transactions) for path in paths]
+        return cls(dict(zip(names, portfolios)))
+
+    def consolidate(self):
+        """Rebuild the consolidated positions and balances, e.g. after transactions were added to an account"""
+        # A fresh table, emptying the old one asset by asset would shift the rows after each
+        self.assets = Assets()
+        rows = []
+        for portfolio in self.accounts.values():
+            for name, asset in portfolio.assets.items():
+                if name not in self.assets:
+                    self.assets[name] = asset
+            rows.append(self.assets.holdings.rows(portfolio.assets.keys()))
+        sizes = [len(account_rows) for account_rows in rows]
+        self._account = np.repeat(np.arange(len(rows), dtype=np.intp), sizes)
+        self._row = np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+        self._slices = np.concatenate(([0], np.cumsum(sizes))).astype(np.intp)
+        self._amount = self._gather('amount')
+        self._invested = self._gather('total_invested')
+
+        holdings, size = self.assets.holdings, len(self.assets)
+        holdings.amount[:] = np.bincount(self._row, self._amount, minlength=size)
+        holdings.total_invested[:] = np.bincount(self._row, self._invested, minlength=size)
+        # Same rule as merging an asset into Assets: the net invested over the amount held
+        average = np.zeros(size)
+        np.divide(holdings.total_invested, holdings.amount, out=average, where=holdings.amount != 0)
+        holdings.average_loading_price[:] = average
+        holdings.invalidate()
+        self._share_prices()
+
+        self.cash.balances = {}
+        for portfolio in self.accounts.values():
+            for currency, amount in portfolio.cash.balances.items():
+                self.cash.balances[currency] = self.cash.balances.get(currency, 0.0) + amount
+
+    def _gather(self, column: str) -> np.ndarray:
+        columns = [portfolio.assets.column(column) for portfolio in self.accounts.values()]
+        return np.concatenate(columns) if columns else np.empty(0)
+
+    def _share_prices(self):
+        # Last known price of every account, a price seen by one account being reused by all
+        merged = self.assets.holdings.price
+        prices = self._gather('price')
+        known = np.flatnonzero(~np.isnan(prices))
+        merged[self._row[known]] = prices[known]
+        self.assets.holdings.invalidate()
+        self._broadcast_prices()
+
+    def _broadcast_prices(self):
+        merged = self.assets.holdings.price
+        for portfolio, start, stop in zip(self.accounts.values(), self._slices[:-1], self._slices[1:]):
+            portfolio.assets.holdings.update_prices(slice(None), merged[self._row[start:stop]])
+
+    def refresh_prices(self, force: bool = False) -> 'ConsolidatedPortfolio':
+        """Fetch the price of every symbol held in any account in one batched request, see `Assets.refresh_prices`"""
+        self.assets.refresh_prices(force)
+        self._broadcast_prices()
+        return self
+
+    def performance(self, prices=None):
+        """Performance of the consolidated positions, see `Holdings.performance`"""
+        return self.assets.performance(prices)
+
+    def account_performance(self, prices=None) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """
+        Value, amount invested, P&L and P&L% of each account.
+
+        `prices` are per consolidated symbol, in the order of `assets`, and default
+        to the known prices. Returns the account names and an array per figure.
+        """
+        prices = self.assets.column('price') if prices is None else np.asarray(prices, dtype=np.float64)
+        count = len(self.accounts)
+        value = np.bincount(self._account, self._amount * prices[self._row], minlength=count)
+        invested = np.bincount(self._account, self._invested, minlength=count)
+        profit_loss = value - invested
+        percentage = np.zeros(count)
+        np.divide(profit_loss, invested, out=percentage, where=invested > 0)
+        return list(self.accounts), {
+            'current_value': value,
+            'total_invested': invested,
+            'profit_loss': profit_loss,
+            'profit_loss_percentage': percentage * 100
+        }
+
+    def account_returns(self, start=None, end=None, prices=None,
+                        currency: str = None) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """
+        Time-weighted and money-weighted returns of each account, see `Portfolio.returns`.
+
+        Every account is valued on one shared calendar with one set of prices, the
+        history of each symbol being fetched once, and the internal rates of return
+        of all the accounts are solved in one batch.
+        """
+        from .returns import money_weighted_return, time_weighted_return
+        from .valuation import first_ledger_day
+        portfolios = list(self.accounts.values())
+        if start is None:
+            days = [day for day in (first_ledger_day(p.transactions, p.cash_flows) for p in portfolios)
+                    if day is not None]
+            if not days:
+                raise ValueError("No ledger rows to value.")
+            start = np.datetime64(min(days), 'D')
+        if end is None:
+            last = [int(column.max()) for p in portfolios
+                    for column in (p.transactions.column('day'), p.cash_flows.column('day')) if len(column)]
+            end = max([np.datetime64('today', 'D')] + [np.datetime64(day, 'D') for day in last]) + 1
+        if prices is None:
+            prices = {name: asset.history for name, asset in self.assets.items()}
+        valuations = [portfolio.valuation_series(np.datetime64(start, 'D') - 1, end, prices, currency)
+                      for portfolio in portfolios]
+        values = np.stack([valuation.total for valuation in valuations], axis=1)
+        flows = np.stack([valuation.flows for valuation in valuations], axis=1)
+        return list(self.accounts), {
+            'time_weighted': time_weighted_return(values, flows),
+            'money_weighted': money_weighted_return(values, flows, valuations[0].dates),
+        }
+
+    def holders(self, symbol: str) -> Dict[str, float]:
+        """Amount of `symbol` held by each account holding it"""
+        if symbol not in self.assets:
+            raise KeyError(symbol)
+        positions = np.flatnonzero(self._row == self.assets.holdings.index[symbol])
+        names = list(self.accounts)
+        return {names[account]: amount
+                for account, amount in zip(self._account[positions].tolist(), self._amount[positions].tolist())}
+
+    def __getitem__(self, account: str) -> Portfolio:
+        return self.accounts[account]
+
+    def __len__(self):
+        return len(self.accounts)
+
+    def __iter__(self):
+        return iter(self.accounts)
@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable
+
+from . import market_data
+from .market_data import MarketDataProvider
+
+__all__ = ['TokenBucket', 'FetchResults', 'ConcurrentFetcher']
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by the worker threads.
+
+    rate : float
+        Tokens added per second, i.e. the sustained request rate
+    capacity : float
+        Largest burst allowed, defaults to one second worth of tokens
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class FetchResults(dict):
+    """Values per ticker, with the tickers that failed in `errors` instead of raising"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.errors: Dict[str, Exception] = {}
+
+
+class ConcurrentFetcher:
+    """
+    Fetch quotes and histories for many tickers on a bounded thread pool.
+
+    Every provider request goes through the rate limiter and failed requests are
+    retried with exponential backoff. A ticker that still fails ends up in
+    `FetchResults.errors` and the rest of the batch is returned.
+
+    provider : MarketDataProvider
+        Defaults to the installed provider. Histories then also go through the
+        on-disk history cache.
+    max_workers : int
+        Number of requests in flight at once
+    rate : float
+        Requests per second allowed by the token bucket, None for no limit
+    retries : int
+        Attempts after the first one for each request
+    backoff : float
+        Delay before the first retry in seconds, doubled after every attempt up to `max_backoff`
+    batch_size : int
+        Tickers per `fetch_prices` request
+    no_retry : tuple
+        Exceptions that will not go away by asking again, e.g. a ticker without data
+    """
+
+    def __init__(self, provider: MarketDataProvider = None, max_workers: int = 8, rate: float = None,
+                 burst: float = None, retries: int = 3, backoff: float = 0.5, max_backoff: float = 8.0,
+                 batch_size: int = 50, no_retry: tuple = (ValueError, KeyError),
+                 sleep: Callable[[float], None] = time.sleep):
+        self.provider = provider
+        self.max_workers = max_workers
+        self.limiter = TokenBucket(rate, burst, sleep=sleep) if rate else None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.batch_size = batch_size
+        self.no_retry = no_retry
+        self._sleep = sleep
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Call `fn` under the rate limit, retrying transient failures"""
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                return fn(*args, **kwargs)
+            except self.no_retry:
+                raise
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                # Jitter keeps the workers from retrying in lockstep
+                self._sleep(delay * (0.5 + random.random() / 2))
+                attempt += 1
+
+    def map(self, fn: Callable[[str], object], tickers: Iterable[str]) -> FetchResults:
+        """Run `fn(ticker)` for every ticker concurrently"""
+        tickers = list(dict.fromkeys(tickers))
+        results = FetchResults()
+        if not tickers:
+            return results
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(tickers))) as executor:
+            futures = {ticker: executor.submit(self.call, fn, ticker) for ticker in tickers}
+            for ticker, future in futures.items():
+                try:
+                    results[ticker] = future.result()
+                except Exception as error:
+                    results.errors[ticker] = error
+        return results
+
+    def fetch_prices(self, tickers: Iterable[str]) -> FetchResults:
+        provider = self.provider or market_data.get_provider()
+        tickers = list(dict.fromkeys(tickers))
+        batches = [tuple(tickers[i:i + self.batch_size]) for i in range(0, len(tickers), self.batch_size)]
+        batch_results = self.map(lambda batch: provider.fetch_prices(list(batch)), batches)
+
+        results = FetchResults()
+        for batch in batches:
+            if batch in batch_results.errors:
+                for ticker in batch:
+                    results.errors[ticker] = batch_results.errors[batch]
+                continue
+            prices = batch_results[batch]
+            for ticker in batch:
+                if ticker in prices:
+                    results[ticker] = prices[ticker]
+                else:
+                    results.errors[ticker] = ValueError(f"No price data available for {ticker}.")
+        return results
+
+    def fetch_historical_prices(self, tickers: Iterable[str], period="1mo", interval="1d",
+                                start=None, end=None) -> FetchResults:
+        fetch = self.provider.fetch_historical_prices if self.provider else market_data.fetch_historical_prices
+        return self.map(lambda ticker: fetch(ticker, period=period, interval=interval, start=start, end=end),
+                        tickers)
@@ -0,0 +1,163 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from . import market_data
+from .price_history import PriceHistory
+
+__all__ = ['FXRates', 'get_fx_rates', 'set_fx_rates']
+
+
+def _fetch_pair(base: str, quote: str) -> PriceHistory:
+    data = market_data.fetch_historical_prices(f"{base}{quote}=X", period="max", interval="1d")
+    if data is None or data.empty:
+        raise ValueError(f"Exchange rate from {base} to {quote} not available.")
+    return PriceHistory.from_frame(data)
+
+
+class FXRates:
+    """
+    Historical exchange rates with cross-rate triangulation.
+
+    A rate series is kept per currency pair, one rate per date, and read as of
+    any date (the last rate on or before it). Pairs that are not loaded are
+    derived from the inverse pair, or through the `pivot` currency, e.g.
+    EUR->GBP = EUR->USD * USD->GBP. Missing series are fetched through
+    `fetch(base, quote)`, which defaults to the "<BASE><QUOTE>=X" tickers of
+    the market data provider and therefore to the on-disk history cache.
+
+    pivot : str
+        Currency used to triangulate cross rates
+    fetch : callable
+        Returns the PriceHistory of a pair or raises ValueError, None to only use loaded series
+    retry_after : float
+        Seconds a pair whose fetch failed is reported unavailable before it is fetched again
+    """
+
+    def __init__(self, pivot: str = "USD", fetch: Optional[Callable[[str, str], PriceHistory]] = _fetch_pair,
+                 retry_after: float = 300, clock: Callable[[], float] = time.monotonic):
+        self.pivot = pivot
+        self.fetch = fetch
+        self.retry_after = retry_after
+        self._clock = clock
+        self._series: Dict[Tuple[str, str], PriceHistory] = {}
+        # Pair -> time of the last failed fetch
+        self._unavailable: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def set_rates(self, base: str, quote: str, dates, rates):
+        """Load the rates converting one unit of `base` into `quote`"""
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        rates = np.asarray(rates, dtype=np.float64)
+        if dates.shape != rates.shape:
+            raise ValueError("Dates and rates must have the same length.")
+        order = np.argsort(dates, kind="stable")
+        self._store(base, quote, PriceHistory(dates[order], rates[order]))
+
+    def _store(self, base: str, quote: str, series: PriceHistory):
+        with self._lock:
+            self._series[(base, quote)] = series
+            self._unavailable.pop((base, quote), None)
+
+    def pairs(self):
+        return list(self._series)
+
+    def refresh(self):
+        """Forget failed fetches, the next lookup of these pairs fetches them again"""
+        with self._lock:
+            self._unavailable.clear()
+
+    def _load(self, base: str, quote: str) -> Optional[PriceHistory]:
+        pair = (base, quote)
+        series = self._series.get(pair)
+        if series is not None or self.fetch is None:
+            return series
+        failed = self._unavailable.get(pair)
+        if failed is not None and self._clock() - failed < self.retry_after:
+            return None
+        try:
+            series = self.fetch(base, quote)
+        except ValueError:
+            with self._lock:
+                self._unavailable[pair] = self._clock()
+            return None
+        self._store(base, quote, series)
+        return series
+
+    @staticmethod
+    def _asof(series: PriceHistory, dates: np.ndarray) -> np.ndarray:
+        rates = series.asof_many(dates)
+        if np.isnan(rates).any():
+            raise ValueError("Exchange rate not available before the first quoted date.")
+        return rates
+
+    def _pair_rates(self, base: str, quote: str, dates: np.ndarray, fetch: bool) -> Optional[np.ndarray]:
+        """Rates from the direct or the inverse series, fetching them only when `fetch` is set"""
+        lookups = (self._series.get, lambda pair: self._load(*pair)) if fetch else (self._series.get,)
+        for lookup in lookups:
+            series = lookup((base, quote))
+            if series is not None:
+                return self._asof(series, dates)
+            series = lookup((quote, base))
+            if series is not None:
+                return 1.0 / self._asof(series, dates)
+        return None
+
+    def rates(self, base: str, quote: str, dates=None) -> np.ndarray:
+        """
+        Rates converting `base` into `quote` on each date (today's rate when dates is None).
+
+        Raises ValueError when the pair can not be resolved.
+        """
+        scalar = dates is None or np.ndim(dates) == 0
+        if dates is None:
+            dates = np.datetime64("today", "D")
+        dates = np.atleast_1d(np.asarray(dates, dtype="datetime64[D]"))
+        if base == quote:
+            rates = np.ones(len(dates))
+        else:
+            # Only pairs quoted against the pivot are fetched, other crosses go through it
+            rates = self._pair_rates(base, quote, dates, fetch=self.pivot in (base, quote))
+            if rates is None and self.pivot not in (base, quote):
+                to_pivot = self._pair_rates(base, self.pivot, dates, fetch=True)
+                from_pivot = self._pair_rates(self.pivot, quote, dates, fetch=True) if to_pivot is not None else None
+                if from_pivot is not None:
+                    rates = to_pivot * from_pivot
+            if rates is None:
+                raise ValueError(f"Exchange rate from {base} to {quote} not available.")
+        return rates[0] if scalar else rates
+
+    def rate(self, base: str, quote: str, date=None) -> float:
+        return float(self.rates(base, quote, date))
+
+    def convert(self, amounts, currencies: Union[str, Sequence[str]], to_currency: str, dates=None) -> np.ndarray:
+        """
+        Convert a vector of amounts, each in its own currency and on its own date,
+        into `to_currency`. One as-of lookup is done per distinct currency.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        currencies = np.broadcast_to(np.asarray(currencies, dtype=object), amounts.shape)
+        if dates is not None:
+            dates = np.broadcast_to(np.asarray(dates, dtype="datetime64[D]"), amounts.shape)
+        converted = np.empty_like(amounts)
+        for currency in set(currencies.ravel().tolist()):
+            mask = currencies == currency
+            rates = self.rates(currency, to_currency, None if dates is None else dates[mask])
+            converted[mask] = amounts[mask] * rates
+        return converted
+
+
+_fx_rates = FXRates()
+
+
+def get_fx_rates() -> FXRates:
+    return _fx_rates
+
+
+def set_fx_rates(fx_rates: FXRates) -> FXRates:
+    """Install the shared exchange rates and return the previous ones"""
+    global _fx_rates
+    previous, _fx_rates = _fx_rates, fx_rates
+    return previous
@@ -0,0 +1,103 @@
+import os
+import time
+import tempfile
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Optional
+from urllib.parse import quote
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+__all__ = ['HistoryCache', 'default_cache_dir']
+
+
+def default_cache_dir() -> str:
+    """Cache location, overridable with the PT_CACHE_DIR environment variable"""
+    return os.environ.get("PT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "portfolio-tracker")
+
+
+class HistoryCache:
+    """
+    On-disk cache of price history, one Parquet file per ticker and interval.
+
+    The first request for a ticker downloads the full history. Later requests only
+    download the bars from the last cached date onwards and append them, so a cold
+    process reads decades of bars from local disk instead of the network.
+
+    directory : str
+        Root folder of the cache, see `default_cache_dir`
+    max_age : float
+        Seconds during which a cached file is served without asking for new bars
+    """
+
+    def __init__(self, directory: str = None, max_age: float = 3600):
+        self.directory = os.path.join(directory or default_cache_dir(), "history")
+        self.max_age = max_age
+
+    def path(self, ticker: str, interval: str = "1d") -> str:
+        return os.path.join(self.directory, interval, f"{quote(ticker, safe='')}.parquet")
+
+    def load(self, ticker: str, interval: str = "1d") -> Optional['pd.DataFrame']:
+        import pandas as pd
+        path = self.path(ticker, interval)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_parquet(path)
+        except (OSError, ValueError):
+            # Unreadable file, e.g. a partial write from an older version: fetch again
+            return None
+
+    def store(self, ticker: str, interval: str, data: 'pd.DataFrame'):
+        path = self.path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write next to the target and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            data.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self, ticker: str = None, interval: str = "1d"):
+        if ticker is None:
+            import shutil
+            shutil.rmtree(self.directory, ignore_errors=True)
+        elif os.path.exists(self.path(ticker, interval)):
+            os.unlink(self.path(ticker, interval))
+
+    def is_fresh(self, ticker: str, interval: str = "1d") -> bool:
+        path = self.path(ticker, interval)
+        return os.path.exists(path) and time.time() - os.path.getmtime(path) < self.max_age
+
+    def history(self, ticker: str, interval: str, fetch: Callable) -> 'pd.DataFrame':
+        """
+        Return the full history of `ticker`, topping up the cache through `fetch`.
+
+        `fetch` has the signature of `pt.market_data.fetch_historical_prices`.
+        """
+        import pandas as pd
+        cached = self.load(ticker, interval)
+        if cached is None or cached.empty:
+            data = fetch(ticker, period="max", interval=interval)
+        elif self.is_fresh(ticker, interval):
+            return cached
+        else:
+            # The last cached bar may have been taken intraday, so it is downloaded again
+            last_date = cached.index[-1]
+            if last_date.date() > datetime.now().date():
+                return cached
+            new = fetch(ticker, period=None, interval=interval, start=last_date.strftime("%Y-%m-%d"))
+            if new is None or new.empty:
+                data = cached
+            else:
+                start = new.index[0]
+                if cached.index.tz is not None and start.tz is None:
+                    start = start.tz_localize(cached.index.tz)
+                data = pd.concat([cached[cached.index < start], new])
+                data = data[~data.index.duplicated(keep='last')]
+        if data is not None and not data.empty:
+            self.store(ticker, interval, data)
+        return data
@@ -0,0 +1,306 @@
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+__all__ = ['Holdings', 'HoldingColumn']
+
+
+class Holdings:
+    """
+    Positions stored as parallel NumPy arrays, one row per symbol.
+
+    `amount`, `total_invested`, `average_loading_price` and `price` (last quote,
+    NaN while unknown) are views on the first `len(self)` rows, so aggregates
+    over all positions are single vectorized operations. `index` maps a symbol
+    to its row. Rows are kept in insertion order.
+
+    Running totals of value, invested capital and unpriced positions are kept
+    per currency, so `totals` is O(1) on a live book: `set`, `update_price` and
+    `update_prices` apply the change of the rows they write only. They are
+    computed on first use; writes straight into the column arrays, e.g. a bulk
+    load, must be followed by `invalidate`.
+    """
+
+    COLUMNS = ('amount', 'total_invested', 'average_loading_price', 'price')
+
+    def __init__(self, capacity: int = 16):
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self._data = {column: np.zeros(max(1, capacity)) for column in self.COLUMNS}
+        self._data['price'][:] = np.nan
+        self.currencies: List[Optional[str]] = []
+        self._currency_index: Dict[Optional[str], int] = {}
+        self._currency = np.zeros(max(1, capacity), dtype=np.intp)
+        # Value, total invested and count of held rows without a price, one column per currency; None until used
+        self._totals: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str):
+        return symbol in self.index
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data['amount'])
+
+    @property
+    def amount(self) -> np.ndarray:
+        return self._data['amount'][:len(self)]
+
+    @property
+    def total_invested(self) -> np.ndarray:
+        return self._data['total_invested'][:len(self)]
+
+    @property
+    def average_loading_price(self) -> np.ndarray:
+        return self._data['average_loading_price'][:len(self)]
+
+    @property
+    def price(self) -> np.ndarray:
+        return self._data['price'][:len(self)]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._data[name][:len(self)]
+
+    def add(self, symbol: str, currency: str = None) -> int:
+        """Return the row of `symbol`, appending an empty one quoted in `currency` if needed"""
+        row = self.index.get(symbol)
+        if row is not None:
+            return row
+        row = len(self.symbols)
+        if row == self.capacity:
+            for column, values in self._data.items():
+                grown = np.full(2 * len(values), np.nan if column == 'price' else 0.0)
+                grown[:row] = values[:row]
+                self._data[column] = grown
+            self._currency = np.concatenate((self._currency, np.zeros(len(self._currency), dtype=np.intp)))
+        self.symbols.append(symbol)
+        self.index[symbol] = row
+        for column in self.COLUMNS:
+            self._data[column][row] = np.nan if column == 'price' else 0.0
+        code = self._currency_index.get(currency)
+        if code is None:
+            code = self._currency_index[currency] = len(self.currencies)
+            self.currencies.append(currency)
+            if self._totals is not None:
+                self._totals = np.hstack((self._totals, np.zeros((3, 1))))
+        self._currency[row] = code
+        return row
+
+    def remove(self, symbol: str) -> int:
+        """Drop the row of `symbol`, rows after it move up by one. Returns the removed row."""
+        row = self.index[symbol]
+        if self._totals is not None:
+            self._totals[:, self._currency[row]] -= self._contribution(row)
+        del self.index[symbol]
+        size = len(self.symbols)
+        for values in self._data.values():
+            values[row:size - 1] = values[row + 1:size]
+        self._currency[row:size - 1] = self._currency[row + 1:size]
+        del self.symbols[row]
+        for moved in self.symbols[row:]:
+            self.index[moved] -= 1
+        return row
+
+    def remove_many(self, symbols: Iterable[str]) -> np.ndarray:
+        """
+        Drop the rows of `symbols` in one pass, the remaining rows keep their order.
+        Returns the removed rows, sorted.
+        """
+        rows = np.unique(np.fromiter((self.index[symbol] for symbol in symbols), dtype=np.intp))
+        if not len(rows):
+            return rows
+        if self._totals is not None:
+            self._totals -= self._sum_by_currency(rows, self._contributions(rows))
+        size, left = len(self.symbols), len(self.symbols) - len(rows)
+        for values in self._data.values():
+            values[:left] = np.delete(values[:size], rows)
+        self._currency[:left] = np.delete(self._currency[:size], rows)
+        removed = set(rows.tolist())
+        self.symbols = [symbol for row, symbol in enumerate(self.symbols) if row not in removed]
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+        return rows
+
+    def clear(self):
+        """Drop every row, keeping the capacity and the currencies seen"""
+        self.symbols, self.index = [], {}
+        if self._totals is not None:
+            self._totals[:] = 0.0
+
+    def currency(self, row: int) -> Optional[str]:
+        return self.currencies[self._currency[row]]
+
+    def _contribution(self, row: int) -> np.ndarray:
+        """Value, total invested and unpriced count of one row, a row held without a price being worth 0"""
+        amount = self._data['amount'][row]
+        price = self._data['price'][row]
+        priced = price == price
+        return np.array([amount * price if amount != 0 and priced else 0.0, self._data['total_invested'][row],
+                         1.0 if amount != 0 and not priced else 0.0])
+
+    def _contributions(self, rows) -> np.ndarray:
+        amount = self.amount[rows]
+        price = self.price[rows]
+        held = amount != 0
+        priced = ~np.isnan(price)
+        return np.stack((np.where(held & priced, amount * price, 0.0), self.total_invested[rows],
+                         (held & ~priced).astype(np.float64)))
+
+    def _sum_by_currency(self, rows, contributions: np.ndarray) -> np.ndarray:
+        codes = self._currency[:len(self)][rows]
+        return np.stack([np.bincount(codes, values, minlength=len(self.currencies)) for values in contributions])
+
+    def set(self, row: int, column: str, value: float):
+        """Write one cell and apply its change to the running totals"""
+        values = self._data[column]
+        if self._totals is None or column == 'average_loading_price':
+            values[row] = value
+            return
+        before = self._contribution(row)
+        values[row] = value
+        self._totals[:, self._currency[row]] += self._contribution(row) - before
+
+    def update_price(self, symbol: str, price: float):
+        """Set the price of `symbol`, the totals change by the revaluation of that row only"""
+        self.set(self.index[symbol], 'price', np.nan if price is None else price)
+
+    def update_prices(self, rows, prices):
+        """Set the prices of distinct `rows` at once, the totals change by the revaluation of these rows"""
+        if self._totals is None:
+            self.price[rows] = prices
+            return
+        before = self._contributions(rows)
+        self.price[rows] = prices
+        self._totals += self._sum_by_currency(rows, self._contributions(rows) - before)
+
+    def invalidate(self):
+        """Drop the running totals after the columns were written directly, they are recomputed when next used"""
+        self._totals = None
+
+    def recompute(self) -> np.ndarray:
+        """Running totals rebuilt from the columns"""
+        self._totals = self._sum_by_currency(slice(None), self._contributions(slice(None)))
+        return self._totals
+
+    def _running(self, rows=None) -> np.ndarray:
+        if rows is not None:
+            return self._sum_by_currency(rows, self._contributions(rows))
+        return self._totals if self._totals is not None else self.recompute()
+
+    def totals(self, rows=None) -> Dict[str, float]:
+        """
+        Value, invested capital, P&L and P&L% of all positions from the running totals.
+
+        Unlike `performance`, positions no longer held do not need a price; the
+        value is NaN while a held position has none. Given `rows`, the totals of
+        those rows only are computed in full instead.
+        """
+        value, invested, unpriced = self._running(rows).sum(axis=1)
+        value = float(value) if not unpriced else float('nan')
+        profit_loss = value - float(invested)
+        return {
+            'current_value': value,
+            'total_invested': float(invested),
+            'profit_loss': profit_loss,
+            'profit_loss_percentage': profit_loss / invested * 100 if invested > 0 else 0.0
+        }
+
+    def currency_totals(self, rows=None) -> Dict[Optional[str], Dict[str, float]]:
+        """Value and invested capital per currency of the positions, not converted, like `totals`"""
+        running = self._running(rows)
+        used = np.bincount(self._currency[:len(self)][rows if rows is not None else slice(None)],
+                           minlength=len(self.currencies))
+        return {currency: {'current_value': float(value) if not unpriced else float('nan'),
+                           'total_invested': float(invested)}
+                for currency, count, (value, invested, unpriced) in zip(self.currencies, used, running.T.tolist())
+                if count}
+
+    def check_totals(self, rtol: float = 1e-9):
+        """
+        Compare the running totals with a full recompute, ValueError if they drifted apart.
+
+        Differences up to `rtol` times the sum of the absolute contributions are
+        rounding and accepted.
+        """
+        if self._totals is None:
+            return
+        contributions = self._contributions(slice(None))
+        expected = self._sum_by_currency(slice(None), contributions)
+        tolerance = rtol * np.maximum(self._sum_by_currency(slice(None), np.abs(contributions)), 1.0)
+        wrong = np.argwhere(np.abs(self._totals - expected) > tolerance)
+        if len(wrong):
+            figure, code = wrong[0]
+            raise ValueError(f"Running {('value', 'total invested', 'unpriced count')[figure]} of "
+                             f"{self.currencies[code]} is {self._totals[figure, code]}, "
+                             f"a full recompute gives {expected[figure, code]}.")
+
+    def performance(self, rows=slice(None), prices=None):
+        """
+        Value, P&L and P&L% of the given rows in one vectorized pass.
+
+        Every asset type is valued as amount * price. `prices` defaults to the
+        price column; a NaN price gives NaN for that row and for the totals.
+        Positions with nothing invested, e.g. fully sold, report 0%.
+
+        Returns a dict of per-row arrays and a dict of totals, with the keys
+        'current_value', 'profit_loss' and 'profit_loss_percentage'.
+        """
+        amount = self.amount[rows]
+        invested = self.total_invested[rows]
+        prices = self.price[rows] if prices is None else np.asarray(prices, dtype=np.float64)
+        current_value = amount * prices
+        profit_loss = current_value - invested
+        percentage = np.zeros_like(profit_loss)
+        np.divide(profit_loss, invested, out=percentage, where=invested > 0)
+        percentage *= 100
+        total_invested = invested.sum()
+        total_profit_loss = profit_loss.sum()
+        performance = {
+            'current_value': current_value,
+            'profit_loss': profit_loss,
+            'profit_loss_percentage': percentage
+        }
+        total = {
+            'current_value': float(current_value.sum()),
+            'profit_loss': float(total_profit_loss),
+            'profit_loss_percentage': float(total_profit_loss / total_invested * 100) if total_invested > 0 else 0.0
+        }
+        return performance, total
+
+    def rows(self, symbols: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.index[symbol] for symbol in symbols), dtype=np.intp)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({column: self.column(column) for column in self.COLUMNS},
+                            index=pd.Index(self.symbols, name="symbol"))
+
+
+class HoldingColumn:
+    """
+    Attribute of an `Asset` stored in its holdings row once the asset is bound to a
+    `Holdings` table, and in a slot of the asset itself before that.
+    """
+
+    def __init__(self, column: str, slot: str, nullable: bool = False):
+        self.column = column
+        self.slot = slot
+        # None is stored as NaN in the table, e.g. for a price not fetched yet
+        self.nullable = nullable
+
+    def __get__(self, asset, owner=None):
+        if asset is None:
+            return self
+        holdings = asset._holdings
+        if holdings is None:
+            return getattr(asset, self.slot)
+        value = float(holdings._data[self.column][asset._row])
+        return None if self.nullable and value != value else value
+
+    def __set__(self, asset, value):
+        holdings = asset._holdings
+        if holdings is None:
+            setattr(asset, self.slot, value)
+        else:
+            holdings.set(asset._row, self.column, np.nan if value is None else value)
@@ -0,0 +1,580 @@
+import io
+import multiprocessing
+import os
+from datetime import date as _date
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
+
+from .asset import Assets, Cash, identify_asset
+from .transaction import CashFlows, Categories, Transactions
+
+__all__ = ['COLUMNS', 'COLUMN_TYPES', 'DEFAULT_BLOCK_SIZE', 'LedgerLoader', 'average_terms', 'read_chunks',
+           'replay_positions', 'replay_ranges', 'split_ranges']
+
+# Columns of the header-less transaction CSV, as written by `Transaction.to_csv_row`
+COLUMNS = ('name', 'asset_type', 'currency', 'type', 'amount', 'price', 'transaction_cost', 'date')
+COLUMN_TYPES = {
+    'name': pa.string(),
+    'asset_type': pa.string(),
+    'currency': pa.string(),
+    'type': pa.string(),
+    'amount': pa.float64(),
+    'price': pa.float64(),
+    'transaction_cost': pa.float64(),
+    'date': pa.date32(),
+}
+
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+# Kinds of cash movements
+DEPOSIT, WITHDRAW, BUY, SELL = range(4)
+
+
+class _Range(io.RawIOBase):
+    """Binary file read up to `end` only, e.g. the size observed before a load"""
+
+    def __init__(self, file, end: int):
+        self.file = file
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.file.read(max(0, min(len(buffer), self.end - self.file.tell())))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_chunks(csv_file: str, block_size: int = DEFAULT_BLOCK_SIZE,
+                progress: Optional[Callable[[int, int, int], None]] = None,
+                start: int = 0, end: int = None) -> Iterator[pa.RecordBatch]:
+    """
+    Record batches of a transaction CSV parsed by pyarrow, about `block_size` bytes at a time.
+
+    progress : callable
+        Called as progress(rows, bytes_read, total_bytes) after each batch
+    start, end : int
+        Byte range to read, `start` being the beginning of a line; `end` defaults to the
+        current size, rows appended while reading are left for the next load
+    """
+    end = os.path.getsize(csv_file) if end is None else end
+    if end <= start:
+        return
+    with open(csv_file, 'rb') as file:
+        file.seek(start)
+        reader = pa_csv.open_csv(
+            _Range(file, end),
+            read_options=pa_csv.ReadOptions(column_names=list(COLUMNS), block_size=block_size),
+            convert_options=pa_csv.ConvertOptions(column_types=COLUMN_TYPES))
+        rows = 0
+        for batch in reader:
+            rows += batch.num_rows
+            yield batch
+            if progress is not None:
+                progress(rows, file.tell() - start, end - start)
+
+
+def _sum_after(values: np.ndarray, starts: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Sum of the values after each element within its group, groups being contiguous runs"""
+    cumulative = np.cumsum(values)
+    return cumulative[np.r_[starts[1:], len(values)] - 1][groups] - cumulative
+
+
+def _groups(keys: np.ndarray):
+    """Start of each run of equal keys and the run of every element"""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return starts, np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(keys)]))
+
+
+def average_terms(rows: np.ndarray, buys: np.ndarray, amounts: np.ndarray, prices: np.ndarray,
+                  held: np.ndarray):
+    """
+    Effect of a run of trades on the average loading price of each symbol bought.
+
+    held : np.ndarray
+        Amount of the row of each trade held before the run
+
+    The average only moves on buys, avg_k = w_k * avg_(k-1) + (1 - w_k) * p_k with
+    w_k the share of the position held before buy k. Over the run this is affine,
+    new average = a + b * previous average, with a the sum over the buys weighted
+    by the products of the later w and b the product of all of them. Positions
+    held and the products, as sums of logarithms, are cumulative sums over the
+    trades sorted by row.
+
+    Returns the rows bought, a and b.
+    """
+    if not buys.any():
+        return rows[:0], prices[:0], prices[:0]
+    order = np.argsort(rows, kind='stable')
+    sorted_rows, deltas = rows[order], np.where(buys[order], amounts[order], -amounts[order])
+    starts, groups = _groups(sorted_rows)
+    before = np.cumsum(deltas) - deltas
+    before = held[order] + before - before[starts][groups]
+
+    bought = buys[order]
+    rows_bought, before = sorted_rows[bought], before[bought]
+    starts, groups = _groups(rows_bought)
+    after = before + amounts[order][bought]
+    weight = np.divide(before, after, out=np.ones_like(before), where=after != 0)
+    # Product of the later weights: a zero resets the average, negative ones flip the sign
+    magnitude = np.abs(weight)
+    logs = np.log(magnitude, out=np.zeros_like(magnitude), where=magnitude > 0)
+    later = np.exp(_sum_after(logs, starts, groups))
+    later[_sum_after(weight == 0, starts, groups) > 0] = 0.0
+    later[_sum_after(weight < 0, starts, groups) % 2 == 1] *= -1
+    a = np.add.reduceat((1 - weight) * prices[order][bought] * later, starts)
+    return rows_bought[starts], a, weight[starts] * later[starts]
+
+
+def replay_positions(rows: np.ndarray, buys: np.ndarray, amounts: np.ndarray, prices: np.ndarray,
+                     amount: np.ndarray, total_invested: np.ndarray, average_loading_price: np.ndarray):
+    """
+    Apply trades in ledger order to running positions, in place.
+
+    rows : np.ndarray
+        Position row of each trade
+    buys : np.ndarray
+        True for a buy, False for a sell
+    amount, total_invested, average_loading_price : np.ndarray
+        Running positions, e.g. the columns of a `Holdings` table
+
+    Amounts and totals are accumulated in trade order by `np.add.at`, averages
+    through `average_terms`.
+    """
+    symbols, a, b = average_terms(rows, buys, amounts, prices, amount[rows])
+    average_loading_price[symbols] = a + b * average_loading_price[symbols]
+    signed = np.where(buys, amounts, -amounts)
+    np.add.at(amount, rows, signed)
+    np.add.at(total_invested, rows, signed * prices)
+
+
+def _encode(values: pa.Array, categories: Categories) -> np.ndarray:
+    """Codes of `values`, only the distinct strings of the chunk go through the dictionary"""
+    encoded = values.dictionary_encode()
+    codes = np.fromiter(map(categories.code, encoded.dictionary.to_pylist()), dtype=np.int32,
+                        count=len(encoded.dictionary))
+    return codes[encoded.indices.to_numpy(zero_copy_only=False)]
+
+
+def _apply_cash(balances: Dict[str, float], currencies: np.ndarray, names: Categories, kinds: np.ndarray,
+                values: np.ndarray, costs: np.ndarray) -> Optional[int]:
+    """
+    Apply cash movements in order, per currency, with the checks of `Cash`.
+
+    Balances before each movement are a cumulative sum seeded with the running
+    balance. Returns the position of the first movement `Cash` would refuse,
+    in which case nothing is applied.
+    """
+    delta = np.select([kinds == DEPOSIT, kinds == WITHDRAW, kinds == BUY],
+                      [values, -values, -(values + costs)], values - costs)
+    first_error, updated = None, {}
+    for code in np.unique(currencies).tolist():
+        movements = np.flatnonzero(currencies == code)
+        currency, kind, value = names.values[code], kinds[movements], values[movements]
+        balance = np.cumsum(np.concatenate(([balances.get(currency, 0.0)], delta[movements])))
+        before = balance[:-1]
+        deposited = np.cumsum(kind == DEPOSIT) - (kind == DEPOSIT)
+        failed = ~(value > 0)
+        failed |= (kind == WITHDRAW) & ~(before >= value)
+        failed |= (kind == BUY) & ~((before >= value) & (before >= costs[movements]))
+        failed |= (kind == SELL) & ~((currency in balances) | (deposited > 0))
+        if failed.any():
+            position = int(movements[np.argmax(failed)])
+            first_error = position if first_error is None else min(first_error, position)
+        else:
+            updated[currency] = float(balance[-1])
+    if first_error is None:
+        balances.update(updated)
+    return first_error
+
+
+def _reduce_cash(currencies: np.ndarray, names: Categories, kinds: np.ndarray, values: np.ndarray,
+                 costs: np.ndarray) -> Dict[str, Tuple]:
+    """
+    Cash movements of a range of the ledger reduced per currency, checked and applied
+    by `_apply_reduced_cash` from the balances before the range alone.
+
+    The balance before a movement is the opening balance plus the movements before
+    it in the range, so a withdrawal or purchase passes when the opening balance
+    is at least its threshold less that sum. Only the movements raising the
+    highest such requirement so far can be the first to fail and are kept, with
+    the first movement of a non-positive value and the first sale before any
+    deposit of the range.
+    """
+    delta = np.select([kinds == DEPOSIT, kinds == WITHDRAW, kinds == BUY],
+                      [values, -values, -(values + costs)], values - costs)
+    reduced = {}
+    for code in np.unique(currencies).tolist():
+        movements = np.flatnonzero(currencies == code)
+        kind, value, change = kinds[movements], values[movements], delta[movements]
+        threshold = np.where(kind == WITHDRAW, value,
+                             np.where(kind == BUY, np.maximum(value, costs[movements]), -np.inf))
+        need = threshold - (np.cumsum(change) - change)
+        records = np.flatnonzero(need > np.r_[-np.inf, np.maximum.accumulate(need)[:-1]])
+        deposited = np.cumsum(kind == DEPOSIT) - (kind == DEPOSIT)
+        first = [np.flatnonzero(mask)[:1] for mask in (~(value > 0), (kind == SELL) & (deposited == 0))]
+        non_positive, unfunded = ((int(movements[i[0]]), int(kind[i[0]]), float(value[i[0]])) if len(i) else None
+                                  for i in first)
+        reduced[names.values[code]] = (float(change.sum()), need[records], movements[records], kind[records],
+                                       value[records], non_positive, unfunded)
+    return reduced
+
+
+def _apply_reduced_cash(balances: Dict[str, float], reduced: Dict[str, Tuple]) -> Optional[Tuple[int, float, str]]:
+    """
+    Apply the movements of `_reduce_cash` with the checks of `Cash`. Returns the kind,
+    value and currency of the first movement refused, in which case nothing is applied.
+    """
+    errors, updated = [], {}
+    for currency, (change, needs, positions, kinds, values, non_positive, unfunded) in reduced.items():
+        opening = balances.get(currency, 0.0)
+        if non_positive is not None:
+            errors.append((*non_positive, currency))
+        if unfunded is not None and currency not in balances:
+            errors.append((*unfunded, currency))
+        # Requirements rise strictly, the first one above the opening balance fails first
+        failing = int(np.searchsorted(needs, opening, side='right'))
+        if failing < len(needs):
+            errors.append((int(positions[failing]), int(kinds[failing]), float(values[failing]), currency))
+        updated[currency] = opening + change
+    if errors:
+        return min(errors)[1:]
+    balances.update(updated)
+    return None
+
+
+def _cash_error(kind: int, value: float, currency: str) -> Exception:
+    """The error `Cash` raises for a refused movement"""
+    if not value > 0:
+        return ValueError("Deposit amount must be positive." if kind == DEPOSIT else
+                          "Withdrawal amount must be positive." if kind == WITHDRAW else
+                          "Transaction amount must be positive.")
+    if kind == WITHDRAW:
+        return ValueError("Insufficient cash balance or currency not found.")
+    if kind == BUY:
+        return ValueError(f"Insufficient cash balance for {currency}.")
+    # Selling into a currency never deposited
+    return KeyError(currency)
+
+
+class _MissingValue(ValueError):
+    """Trade without an amount, price or cost; the line is renumbered when ranges are loaded in parallel"""
+
+    def __init__(self, name: str, line: int):
+        super().__init__(f"Missing {name} on line {line}.")
+        self.name, self.line = name, line
+
+    def __reduce__(self):
+        return _MissingValue, (self.name, self.line)
+
+
+class LedgerLoader:
+    """
+    Running state of a ledger loaded chunk by chunk.
+
+    Positions live in the holdings table of `assets` and balances in `cash`, each
+    chunk updates them with vectorized passes, so memory is bounded by the chunk
+    size plus one row per symbol. With `keep_transactions` the rows are also
+    appended to the columnar `transactions` and `cash_flows`. See `replay_ranges`
+    to load a file in parallel.
+
+    Rows have the semantics of the row-by-row loader: names and currencies are
+    upper-cased, types lower-cased, Cash rows only deposit or withdraw, and a
+    movement refused by `Cash` raises the same error.
+    """
+
+    def __init__(self, keep_transactions: bool = True):
+        self.assets = Assets()
+        self.cash = Cash()
+        self.transactions = Transactions()
+        self.cash_flows = CashFlows()
+        self.keep_transactions = keep_transactions
+        self.rows = 0
+
+    def restore(self, assets: Assets, cash: Cash, transactions: Transactions, cash_flows: CashFlows, rows: int):
+        """Continue from a saved state, e.g. a snapshot covering the first `rows` rows"""
+        self.assets, self.cash, self.transactions, self.cash_flows = assets, cash, transactions, cash_flows
+        self.rows = rows
+
+    def feed(self, batch: pa.RecordBatch):
+        is_cash = pc.equal(batch.column('asset_type'), 'Cash').to_numpy(zero_copy_only=False)
+        trades = batch.filter(pa.array(~is_cash))
+        self._check_trades(trades, np.flatnonzero(~is_cash))
+
+        types = pc.utf8_lower(batch.column('type')).to_numpy(zero_copy_only=False)
+        amounts = batch.column('amount').to_numpy(zero_copy_only=False)
+        prices = batch.column('price').to_numpy(zero_copy_only=False)
+        costs = batch.column('transaction_cost').to_numpy(zero_copy_only=False)
+        currency = pc.utf8_upper(batch.column('currency'))
+
+        kinds = np.full(batch.num_rows, -1, dtype=np.int8)
+        kinds[is_cash & (types == 'deposit')] = DEPOSIT
+        kinds[is_cash & (types == 'withdraw')] = WITHDRAW
+        kinds[~is_cash & (types == 'buy')] = BUY
+        kinds[~is_cash & (types == 'sell')] = SELL
+        moves = np.flatnonzero(kinds >= 0)
+        trade_moves = kinds[moves] >= BUY
+        values = np.where(trade_moves, amounts[moves] * prices[moves], amounts[moves])
+        move_costs = np.where(trade_moves, costs[moves], 0.0)
+        currencies = Categories()
+        currency_codes = _encode(currency, currencies)[moves]
+        self._move_cash(currency_codes, currencies, kinds[moves], values, move_costs)
+
+        trade_rows = self._add_assets(trades)
+        traded = np.flatnonzero(kinds[~is_cash] >= BUY)
+        self._replay(trade_rows[traded], kinds[~is_cash][traded] == BUY, amounts[~is_cash][traded],
+                     prices[~is_cash][traded])
+
+        if self.keep_transactions:
+            self._record(batch, trades, is_cash, kinds, types, amounts, currency)
+        self.rows += batch.num_rows
+
+    def _move_cash(self, currency_codes, currencies, kinds, values, costs):
+        error = _apply_cash(self.cash.balances, currency_codes, currencies, kinds, values, costs)
+        if error is not None:
+            raise _cash_error(int(kinds[error]), float(values[error]), currencies.values[currency_codes[error]])
+
+    def _replay(self, rows, buys, amounts, prices):
+        holdings = self.assets.holdings
+        holdings.invalidate()
+        replay_positions(rows, buys, amounts, prices, holdings.amount, holdings.total_invested,
+                         holdings.average_loading_price)
+
+    def _check_trades(self, trades: pa.RecordBatch, lines: np.ndarray):
+        for asset_type in pc.unique(trades.column('asset_type')).to_pylist():
+            identify_asset(asset_type)
+        for name in ('amount', 'price', 'transaction_cost'):
+            column = trades.column(name)
+            if column.null_count:
+                line = self.rows + int(lines[np.argmax(column.is_null().to_numpy(zero_copy_only=False))]) + 1
+                raise _MissingValue(name, line)
+
+    def _add_assets(self, trades: pa.RecordBatch) -> np.ndarray:
+        """Holdings row of every trade, assets are built once for names not seen before"""
+        encoded = pc.utf8_upper(trades.column('name')).dictionary_encode()
+        indices = encoded.indices.to_numpy(zero_copy_only=False)
+        names = encoded.dictionary.to_pylist()
+        new = [i for i, name in enumerate(names) if name not in self.assets]
+        if new:
+            _, first = np.unique(indices, return_index=True)
+            asset_types = trades.column('asset_type').take(pa.array(first[new])).to_pylist()
+            currencies = pc.utf8_upper(trades.column('currency')).take(pa.array(first[new])).to_pylist()
+            for i, asset_type, currency in zip(new, asset_types, currencies):
+                self.assets[names[i]] = identify_asset(asset_type)(name=names[i], currency=currency)
+        rows = np.fromiter((self.assets.holdings.index[name] for name in names), dtype=np.intp, count=len(names))
+        return rows[indices]
+
+    def _record(self, batch, trades, is_cash, kinds, types, amounts, currency):
+        transactions, flows = self.transactions, self.cash_flows
+        today = pa.scalar(_date.today(), pa.date32())
+        days = pc.fill_null(batch.column('date'), today).cast(pa.int32()).to_numpy(zero_copy_only=False)
+        trade = ~is_cash
+        flow = np.flatnonzero((kinds == DEPOSIT) | (kinds == WITHDRAW))
+        if len(flow):
+            flow_array = pa.array(flow)
+            flows.append_columns({
+                'currency': _encode(currency.take(flow_array), flows.categories['currency']),
+                'type': _encode(pa.array(types[flow]), flows.categories['type']),
+                'day': days[flow],
+                'amount': amounts[flow],
+                # Ledger rows recorded before each flow
+                'position': len(transactions) + np.cumsum(trade)[flow] - trade[flow],
+            })
+        categories = transactions.categories
+        transactions.append_columns({
+            'symbol': _encode(pc.utf8_upper(trades.column('name')), categories['symbol']),
+            'asset_type': _encode(trades.column('asset_type'), categories['asset_type']),
+            'type': _encode(pa.array(types[trade]), categories['type']),
+            'currency': _encode(currency.filter(pa.array(trade)), categories['currency']),
+            'day': days[trade],
+            'amount': amounts[trade],
+            'price': trades.column('price').to_numpy(zero_copy_only=False),
+            'transaction_cost': trades.column('transaction_cost').to_numpy(zero_copy_only=False),
+        })
+
+
+def split_ranges(csv_file: str, parts: int, start: int = 0, end: int = None) -> List[Tuple[int, int]]:
+    """Up to `parts` byte ranges of about equal size covering start to end, each beginning at a line"""
+    end = os.path.getsize(csv_file) if end is None else end
+    bounds = [start]
+    with open(csv_file, 'rb') as file:
+        for part in range(1, parts):
+            target = start + (end - start) * part // parts
+            if target <= bounds[-1]:
+                continue
+            # The rest of the line holding the byte before the target, nothing if that byte ends a line
+            file.seek(target - 1)
+            file.readline()
+            if bounds[-1] < file.tell() < end:
+                bounds.append(file.tell())
+    bounds.append(end)
+    return [(first, last) for first, last in zip(bounds[:-1], bounds[1:]) if last > first]
+
+
+class _RangeLoader(LedgerLoader):
+    """
+    Replay of one byte range of a ledger in a worker, from an empty state.
+
+    Amounts and totals invested are sums and are replayed here. Cash movements,
+    whose checks need the balances before the range, are collected and reduced
+    by `_reduce_cash`; trades are kept until the amounts held before the range
+    are known to compute the averages.
+    """
+
+    def __init__(self, keep_transactions: bool):
+        super().__init__(keep_transactions)
+        self._currencies = Categories()
+        self._movements = []
+        self._trades = []
+
+    def _move_cash(self, currency_codes, currencies, kinds, values, costs):
+        self._movements.append((self._currencies.encode(currencies.values)[currency_codes], kinds, values, costs))
+
+    def _replay(self, rows, buys, amounts, prices):
+        holdings = self.assets.holdings
+        signed = np.where(buys, amounts, -amounts)
+        np.add.at(holdings.amount, rows, signed)
+        np.add.at(holdings.total_invested, rows, signed * prices)
+        self._trades.append((rows, buys, amounts, prices))
+
+    def partial(self, error: Optional[Exception]) -> Dict:
+        """Symbols, position sums and reduced cash movements of the range, and the error that stopped it"""
+        codes, kinds, values, costs = (np.concatenate(column) for column in zip(*self._movements)) \
+            if self._movements else (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int8), np.empty(0), np.empty(0))
+        return {
+            'rows': self.rows,
+            'symbols': list(self.assets),
+            'asset_types': [asset.asset_type() for asset in self.assets.values()],
+            'currencies': [asset.currency for asset in self.assets.values()],
+            'amount': self.assets.column('amount'),
+            'total_invested': self.assets.column('total_invested'),
+            'cash': _reduce_cash(codes, self._currencies, kinds, values, costs),
+            'error': error,
+        }
+
+    def averages(self, held: np.ndarray):
+        """Affine effect of the range on the average of each symbol bought, given the amounts held before it"""
+        if not self._trades:
+            return np.empty(0, dtype=np.intp), np.empty(0), np.empty(0)
+        rows, buys, amounts, prices = (np.concatenate(column) for column in zip(*self._trades))
+        return average_terms(rows, buys, amounts, prices, held[rows])
+
+
+def _replay_range(connection, csv_file: str, start: int, end: int, block_size: int, keep_transactions: bool):
+    """Worker of `replay_ranges`: parse and replay a range, then answer with its averages once given the amounts held"""
+    # One core per worker, the workers already use them all
+    pa.set_cpu_count(1)
+    pa.set_io_thread_count(1)
+    loader = _RangeLoader(keep_transactions)
+    try:
+        try:
+            for batch in read_chunks(csv_file, block_size, start=start, end=end):
+                loader.feed(batch)
+            error = None
+        except Exception as exc:
+            error = exc
+        connection.send(loader.partial(error))
+        try:
+            held = connection.recv()
+        except EOFError:
+            # The load was abandoned on an error in an earlier range
+            return
+        if held is not None:
+            ledger = (loader.transactions, loader.cash_flows) if keep_transactions else (None, None)
+            connection.send((*loader.averages(held), *ledger))
+    finally:
+        connection.close()
+
+
+def _append_ledger(loader: LedgerLoader, transactions: Transactions, cash_flows: CashFlows):
+    """Append the ledger of a range, recoded into the categories of `loader`"""
+    offset = len(loader.transactions)
+    columns = {name: transactions.column(name) for name in Transactions.DTYPES}
+    for name in Transactions.CATEGORIES:
+        columns[name] = loader.transactions.categories[name].encode(transactions.categories[name].values)[columns[name]]
+    loader.transactions.append_columns(columns)
+    columns = {name: cash_flows.column(name) for name in CashFlows.DTYPES}
+    for name in ('currency', 'type'):
+        columns[name] = loader.cash_flows.categories[name].encode(cash_flows.categories[name].values)[columns[name]]
+    columns['position'] = columns['position'] + offset
+    loader.cash_flows.append_columns(columns)
+
+
+def replay_ranges(loader: LedgerLoader, csv_file: str, processes: int, block_size: int = DEFAULT_BLOCK_SIZE,
+                  progress: Optional[Callable[[int, int, int], None]] = None, start: int = 0, end: int = None):
+    """
+    Load a ledger into `loader` with one worker process per byte range of the file.
+
+    Each worker parses its range and replays it from an empty state: amounts and
+    totals invested of its symbols, its cash movements and, with
+    `keep_transactions`, its rows. Here the ranges are merged in file order:
+    the cash of each range, reduced to a few figures per currency, is checked
+    against the running balances and applied, sums are added, and each worker is sent the amounts held before its range.
+    The average loading price over a range is affine in the average before it,
+    so the workers return that map and it is composed here per symbol.
+    Parsing and replay, nearly all the work, run in the workers.
+
+    Ranges are split at line ends, the file must not hold quoted line breaks.
+    """
+    end = os.path.getsize(csv_file) if end is None else end
+    ranges = split_ranges(csv_file, processes, start, end)
+    # pyarrow imports pandas on its first conversion of a Python value, once here rather than in every forked worker
+    pa.scalar('Cash')
+    context = multiprocessing.get_context()
+    workers = []
+    try:
+        for range_start, range_end in ranges:
+            connection, child = context.Pipe()
+            process = context.Process(target=_replay_range, daemon=True,
+                                      args=(child, csv_file, range_start, range_end, block_size,
+                                            loader.keep_transactions))
+            process.start()
+            child.close()
+            workers.append((process, connection))
+
+        holdings = loader.assets.holdings
+        merged = []
+        for (_, connection), (_, range_end) in zip(workers, ranges):
+            partial = connection.recv()
+            refused = _apply_reduced_cash(loader.cash.balances, partial['cash'])
+            if refused is not None:
+                raise _cash_error(*refused)
+            if partial['error'] is not None:
+                if isinstance(partial['error'], _MissingValue):
+                    raise _MissingValue(partial['error'].name, loader.rows + partial['error'].line)
+                raise partial['error']
+            for name, asset_type, currency in zip(partial['symbols'], partial['asset_types'], partial['currencies']):
+                if name not in loader.assets:
+                    loader.assets[name] = identify_asset(asset_type)(name=name, currency=currency)
+            rows = holdings.rows(partial['symbols'])
+            connection.send(holdings.amount[rows].copy())
+            holdings.invalidate()
+            holdings.amount[rows] += partial['amount']
+            holdings.total_invested[rows] += partial['total_invested']
+            loader.rows += partial['rows']
+            merged.append(rows)
+            if progress is not None:
+                progress(loader.rows, range_end - start, end - start)
+
+        average = holdings.average_loading_price
+        for (_, connection), rows in zip(workers, merged):
+            symbols, a, b, transactions, cash_flows = connection.recv()
+            average[rows[symbols]] = a + b * average[rows[symbols]]
+            if loader.keep_transactions:
+                _append_ledger(loader, transactions, cash_flows)
+        workers, finished = [], workers
+    finally:
+        # Left set only when the load failed, workers still running are of no use
+        for process, connection in workers:
+            connection.close()
+            process.terminate()
+        for process, connection in workers:
+            process.join()
+    for process, connection in finished:
+        connection.close()
+        process.join()
@@ -0,0 +1,107 @@
+import csv
+import os
+import time
+from typing import TYPE_CHECKING, Callable, Iterable
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+__all__ = ['Journal']
+
+
+class Journal:
+    """
+    Append-only write-ahead log of ledger rows.
+
+    Each line is a row of the transaction CSV prefixed by its sequence number,
+    the number of ledger rows before it. Rows already folded into the CSV by a
+    compaction are recognized by their sequence number, so replaying the journal
+    after a crash in the middle of a compaction adds no row twice.
+
+    Every append is written to the OS before returning, so rows survive a crash
+    of the process. `sync` sets when they are forced to disk to also survive a
+    power loss:
+
+    - 'always' fsyncs every append
+    - 'batch' fsyncs once `batch_size` rows are pending or `interval` seconds
+      passed since the last fsync, checked on append; `fsync` or `close` for the rest
+    - 'never' leaves it to the OS
+
+    A last line cut short by a crash is dropped when the journal is opened.
+    """
+
+    SYNC_MODES = ('always', 'batch', 'never')
+
+    def __init__(self, path: str, sync: str = 'batch', batch_size: int = 64, interval: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if sync not in self.SYNC_MODES:
+            raise ValueError(f"Invalid sync mode: {sync}")
+        self.path = path
+        self.sync = sync
+        self.batch_size = batch_size
+        self.interval = interval
+        self._clock = clock
+        self._repair()
+        self._file = open(path, 'a', newline='')
+        self._writer = csv.writer(self._file, lineterminator='\n')
+        self._pending = 0
+        self._synced_at = clock()
+
+    def _repair(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r+b') as file:
+            data = file.read()
+            if data and not data.endswith(b'\n'):
+                file.truncate(data.rfind(b'\n') + 1)
+
+    def append(self, seq: int, row: Iterable):
+        self._writer.writerow([seq, *row])
+        self._file.flush()
+        self._pending += 1
+        if self.sync == 'always' or (self.sync == 'batch' and (
+                self._pending >= self.batch_size or self._clock() - self._synced_at >= self.interval)):
+            self.fsync()
+
+    def fsync(self):
+        if self._pending:
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._synced_at = self._clock()
+
+    def truncate(self):
+        """Drop every row, e.g. once they were compacted into the CSV"""
+        self._file.truncate(0)
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        if not self._file.closed:
+            self.fsync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def read(path: str, start: int = 0) -> 'pa.Table':
+        """Complete rows with a sequence number of at least `start`, with the columns of the CSV"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from pyarrow import csv as pa_csv
+        from .ingest import COLUMN_TYPES, COLUMNS
+        data = b''
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                data = file.read()
+        data = data[:data.rfind(b'\n') + 1]
+        if not data:
+            return pa.table({name: pa.array([], type) for name, type in COLUMN_TYPES.items()})
+        table = pa_csv.read_csv(
+            pa.py_buffer(data),
+            read_options=pa_csv.ReadOptions(column_names=['seq', *COLUMNS]),
+            convert_options=pa_csv.ConvertOptions(column_types={'seq': pa.int64(), **COLUMN_TYPES}))
+        return table.filter(pc.greater_equal(table.column('seq'), start)).select(list(COLUMNS))
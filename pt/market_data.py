@@ -1,12 +1,371 @@
-import yfinance as yf
-from typing import Union, List
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Union, List, Dict, Iterable, Optional, Callable
+
+from .history_cache import HistoryCache
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# yfinance, pandas and the resampling rules are imported on the first fetch, so
+# that `import pt` stays cheap for callers that never touch market data
+
+__all__ = [
+    'MarketDataProvider',
+    'YFinanceProvider',
+    'StaticProvider',
+    'QuoteCache',
+    'SingleFlight',
+    'get_provider',
+    'set_provider',
+    'get_history_cache',
+    'set_history_cache',
+    'get_quote_cache',
+    'set_quote_cache',
+    'get_price',
+    'get_prices',
+    'fetch_price',
+    'fetch_prices',
+    'fetch_historical_prices'
+]
+
+
+class MarketDataProvider(ABC):
+    """
+    Source of quotes and price history.
+
+    Implementations must answer a whole list of tickers in `fetch_prices`, so that
+    callers holding many assets pay for one round-trip instead of one per symbol.
+    """
+
+    @abstractmethod
+    def fetch_prices(self, tickers: List[str]) -> Dict[str, float]:
+        """Return the last close for each ticker. Tickers without data are left out."""
+        pass
+
+    @abstractmethod
+    def fetch_historical_prices(self, ticker: str, period="1mo", interval="1d", start=None, end=None):
+        pass
+
+    def fetch_price(self, ticker: str) -> float:
+        prices = self.fetch_prices([ticker])
+        if ticker not in prices:
+            raise ValueError(f"No price data available for {ticker}.")
+        return prices[ticker]
+
+
+class YFinanceProvider(MarketDataProvider):
+    def __init__(self, period: str = "5d"):
+        # A few days back so that every market has a close even on its holidays
+        self.period = period
+
+    def fetch_prices(self, tickers: List[str]) -> Dict[str, float]:
+        tickers = list(dict.fromkeys(tickers))
+        if not tickers:
+            return {}
+        import yfinance as yf
+        data = yf.download(tickers, period=self.period, auto_adjust=True, group_by='column',
+                           multi_level_index=True, progress=False, threads=True)
+        if data is None or data.empty:
+            return {}
+        close = data['Close']
+        if not hasattr(close, 'columns'):
+            close = close.to_frame(tickers[0])
+        last = close.ffill().iloc[-1].dropna()
+        return {ticker: float(last[ticker]) for ticker in tickers if ticker in last.index}
+
+    def fetch_historical_prices(self, ticker: str, period="1mo", interval="1d", start=None, end=None):
+        import yfinance as yf
+        if period and not (start or end):
+            return yf.Ticker(ticker).history(period=period, interval=interval)
+        return yf.Ticker(ticker).history(start=start, end=end, interval=interval)
+
+
+class StaticProvider(MarketDataProvider):
+    """
+    Offline provider serving fixed quotes and histories, e.g. for tests.
+
+    prices : dict
+        Last price per ticker
+    histories : dict
+        DataFrame per ticker, sliced to `start`/`end` by `fetch_historical_prices`
+    """
+
+    def __init__(self, prices: Dict[str, float] = None, histories: Dict = None):
+        self.prices = dict(prices or {})
+        self.histories = dict(histories or {})
+        self.requests = 0
+
+    def fetch_prices(self, tickers: Iterable[str]) -> Dict[str, float]:
+        self.requests += 1
+        return {ticker: self.prices[ticker] for ticker in tickers if ticker in self.prices}
+
+    def fetch_historical_prices(self, ticker: str, period="1mo", interval="1d", start=None, end=None):
+        self.requests += 1
+        if ticker not in self.histories:
+            raise ValueError(f"No price history available for {ticker}.")
+        data = self.histories[ticker]
+        if start is not None:
+            data = data[data.index >= _timestamp(start, data.index)]
+        if end is not None:
+            data = data[data.index < _timestamp(end, data.index)]
+        return data
+
+
+def _timestamp(value, index) -> 'pd.Timestamp':
+    import pandas as pd
+    timestamp = pd.Timestamp(value)
+    if index.tz is not None and timestamp.tz is None:
+        timestamp = timestamp.tz_localize(index.tz)
+    return timestamp
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent requests for the same key into one call.
+
+    The first caller of a key runs the fetch, callers arriving while it is in
+    flight wait for it and share its result, or its exception.
+    """
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+        def wait(self):
+            self.done.wait()
+            if self.error is not None:
+                raise self.error
+            return self.result
+
+    _MISSING = object()
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def do(self, key, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            return call.wait()
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_many(self, keys: Iterable, fn: Callable[[List], Dict]) -> Dict:
+        """
+        Batch version of `do`: `fn` receives the keys not already in flight and
+        returns a dict of results. Keys missing from that dict are left out.
+        """
+        owned, waiting = {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    owned[key] = self._calls[key] = self._Call()
+                else:
+                    waiting[key] = call
+        results = {}
+        try:
+            if owned:
+                results = dict(fn(list(owned)))
+                for key, call in owned.items():
+                    call.result = results.get(key, self._MISSING)
+        except BaseException as error:
+            for call in owned.values():
+                call.error = error
+            raise
+        finally:
+            with self._lock:
+                for key in owned:
+                    del self._calls[key]
+            for call in owned.values():
+                call.done.set()
+        for key, call in waiting.items():
+            result = call.wait()
+            if result is not self._MISSING:
+                results[key] = result
+        return results
+
+
+class QuoteCache:
+    """
+    Process-wide cache of last prices shared by every `Asset`.
+
+    ttl : float
+        Seconds a quote is served before it is fetched again
+    maxsize : int
+        Number of tickers kept, the least recently used ones are evicted first
+    stale_while_revalidate : float
+        Seconds past `ttl` during which the expired quote is still served while a
+        background thread refreshes it. 0 always fetches expired quotes in line.
+    fetch : callable
+        Batch fetch function, defaults to `fetch_prices` of the installed provider
+    """
+
+    def __init__(self, ttl: float = 300, maxsize: int = 10000, stale_while_revalidate: float = 0,
+                 fetch: Callable[[List[str]], Dict[str, float]] = None, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.stale_while_revalidate = stale_while_revalidate
+        self.fetch = fetch
+        self._clock = clock
+        self._entries = OrderedDict()  # ticker -> (price, fetched_at)
+        self._refreshing = set()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, ticker: str):
+        return ticker in self._entries
+
+    def get(self, ticker: str) -> float:
+        prices = self.get_many([ticker])
+        if ticker not in prices:
+            raise ValueError(f"No price data available for {ticker}.")
+        return prices[ticker]
+
+    def get_many(self, tickers: Iterable[str]) -> Dict[str, float]:
+        """Return the cached prices, fetching every missing or expired one in a single batch"""
+        prices, missing, stale = {}, [], []
+        now = self._clock()
+        with self._lock:
+            for ticker in dict.fromkeys(tickers):
+                entry = self._entries.get(ticker)
+                if entry is not None:
+                    age = now - entry[1]
+                    if age < self.ttl + self.stale_while_revalidate:
+                        prices[ticker] = entry[0]
+                        self._entries.move_to_end(ticker)
+                        if age >= self.ttl and ticker not in self._refreshing:
+                            self._refreshing.add(ticker)
+                            stale.append(ticker)
+                        continue
+                missing.append(ticker)
+        if stale:
+            self._refresh_in_background(stale)
+        if missing:
+            fetched = self._fetch(missing)
+            self.put_many(fetched)
+            prices.update(fetched)
+        return prices
+
+    def put(self, ticker: str, price: float):
+        self.put_many({ticker: price})
+
+    def put_many(self, prices: Dict[str, float]):
+        now = self._clock()
+        with self._lock:
+            for ticker, price in prices.items():
+                self._entries[ticker] = (price, now)
+                self._entries.move_to_end(ticker)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tickers: Iterable[str] = None):
+        with self._lock:
+            if tickers is None:
+                self._entries.clear()
+            else:
+                for ticker in tickers:
+                    self._entries.pop(ticker, None)
+
+    def _fetch(self, tickers: List[str]) -> Dict[str, float]:
+        fetch = self.fetch or fetch_prices
+
+        def fetch_batch(keys):
+            prices = fetch([ticker for _, ticker in keys])
+            return {("price", ticker): float(price) for ticker, price in prices.items()}
+
+        # Tickers another thread is already fetching are awaited, not requested again
+        prices = _flights.do_many([("price", ticker) for ticker in tickers], fetch_batch)
+        return {ticker: price for (_, ticker), price in prices.items()}
+
+    def _refresh_in_background(self, tickers: List[str]):
+        def refresh():
+            try:
+                self.put_many(self._fetch(tickers))
+            except Exception:
+                # Keep serving the stale quotes, the next expired read retries
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(tickers)
+
+        threading.Thread(target=refresh, name="pt-quote-refresh", daemon=True).start()
+
+
+_provider: MarketDataProvider = YFinanceProvider()
+_history_cache: Optional[HistoryCache] = HistoryCache()
+_quote_cache: QuoteCache = QuoteCache()
+_flights = SingleFlight()
+
+
+def get_provider() -> MarketDataProvider:
+    return _provider
+
+
+def set_provider(provider: MarketDataProvider) -> MarketDataProvider:
+    """Install `provider` for all market data lookups and return the previous one"""
+    global _provider
+    previous, _provider = _provider, provider
+    return previous
+
+
+def get_history_cache() -> Optional[HistoryCache]:
+    return _history_cache
+
+
+def set_history_cache(cache: Optional[HistoryCache]) -> Optional[HistoryCache]:
+    """Install the on-disk history cache, or disable it with None, and return the previous one"""
+    global _history_cache
+    previous, _history_cache = _history_cache, cache
+    return previous
+
+
+def get_quote_cache() -> QuoteCache:
+    return _quote_cache
+
+
+def set_quote_cache(cache: QuoteCache) -> QuoteCache:
+    """Install the shared quote cache and return the previous one"""
+    global _quote_cache
+    previous, _quote_cache = _quote_cache, cache
+    return previous
+
+
+def get_price(ticker) -> float:
+    """Last price of `ticker` through the shared quote cache"""
+    return _quote_cache.get(ticker)
+
+def get_prices(tickers) -> Dict[str, float]:
+    """Last prices through the shared quote cache, fetching the missing ones in one batch"""
+    return _quote_cache.get_many(tickers)
 
 def fetch_price(ticker):
-    data = yf.Ticker(ticker).history(period='1d')
-    return data['Close'].iloc[-1]
+    return _provider.fetch_price(ticker)
 
 def fetch_prices(tickers):
-    return {ticker: fetch_price(ticker) for ticker in tickers}
+    return _provider.fetch_prices(list(tickers))
 
 def fetch_historical_prices(tickers: Union[str, List], period="1mo", interval="1d", start = None, end = None):
     """
@@ -26,9 +385,32 @@ def fetch_historical_prices(tickers: Union[str, List], period="1mo", interval="1
         Download end date string (YYYY-MM-DD) or _datetime, exclusive.
         Default is now
         E.g. for end="2023-01-01", the last data point will be on "2022-12-31"
+
+    Full histories (period="max") are served from the on-disk history cache when one
+    is installed, downloading only the bars newer than the cached ones. Weekly,
+    monthly and quarterly bars are then derived from the cached daily bars instead
+    of being downloaded separately.
+
+    Concurrent calls with the same arguments share a single request, and the
+    returned DataFrame, so callers must not modify it in place.
     """
-    if period and not (start or end):
-        data = yf.Ticker(tickers).history(period=period, interval=interval)
-    else:
-        data = yf.Ticker(tickers).history(start=start, end=end, interval=interval)
-    return data
\ No newline at end of file
+    key = ("history", tickers, period, interval, start, end)
+    return _flights.do(key, _fetch_historical_prices, tickers, period, interval, start, end)
+
+def _fetch_historical_prices(ticker, period, interval, start, end):
+    import pandas as pd
+    from .resample import RESAMPLE_RULES, resample_ohlc, period_start
+    if _history_cache is not None and interval in RESAMPLE_RULES:
+        daily = fetch_historical_prices(ticker, period="max", interval="1d")
+        if start or end:
+            if start is not None:
+                daily = daily[daily.index >= _timestamp(start, daily.index)]
+            if end is not None:
+                daily = daily[daily.index < _timestamp(end, daily.index)]
+        elif period != "max" and not daily.empty:
+            first = period_start(period, pd.Timestamp.now(tz=daily.index.tz))
+            daily = daily[daily.index >= first]
+        return resample_ohlc(daily, interval)
+    if _history_cache is not None and period == "max" and not (start or end):
+        return _history_cache.history(ticker, interval, _provider.fetch_historical_prices)
+    return _provider.fetch_historical_prices(ticker, period=period, interval=interval, start=start, end=end)
@@ -1,83 +1,334 @@
+import copy
 import csv
-from rich.table import Table
-from rich.panel import Panel
-from rich import box
-from pt.richtools import repr_rich
-from pt.asset import Assets, Asset, Stock, ETF, Bond, Crypto, Cash
-from pt.transaction import Transaction, Transactions
+import os
+import tempfile
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pt.asset import Assets, Asset, Stock, ETF, Bond, Crypto, Cash, identify_asset
+from pt.journal import Journal
+from pt.sqlite_store import SQLiteStore
+from pt.snapshot import SnapshotError, ledger_fingerprint, ledger_fingerprints, read_snapshot, write_snapshot
+from pt.transaction import CashFlows, Transaction, Transactions
+
+if TYPE_CHECKING:
+    from pt.ingest import LedgerLoader
 
 class Portfolio:
-    def __init__(self, assets: Assets, cash: Cash, transactions: Transactions):
+    def __init__(self, assets: Assets, cash: Cash, transactions: Transactions, cash_flows: CashFlows = None):
         self.assets: Assets = assets
         self.cash: Cash = cash
         self.transactions: Transactions = transactions
+        self.cash_flows: CashFlows = cash_flows if cash_flows is not None else CashFlows()
+        # Set by `load`: new rows go to the journal, `compact` folds them into the CSV
+        self.csv_file: Optional[str] = None
+        self.snapshot_file: Optional[str] = None
+        self.journal: Optional[Journal] = None
+
+    def _ledger_rows(self) -> int:
+        return len(self.transactions) + len(self.cash_flows)
+
+    @staticmethod
+    def _normalized(transaction: Transaction) -> Transaction:
+        """The transaction as the loader reads it back: name and currency upper-case, type lower-case"""
+        name, currency, kind = transaction.asset.name.upper(), transaction.currency.upper(), transaction.type.lower()
+        if (name, currency, kind) == (transaction.asset.name, transaction.currency, transaction.type):
+            return transaction
+        normalized = copy.copy(transaction)
+        normalized.asset = transaction.asset.detached()
+        normalized.asset.name = name
+        if normalized.asset.currency is not None:
+            normalized.asset.currency = normalized.asset.currency.upper()
+        normalized.currency, normalized.type = currency, kind
+        return normalized
 
     def add_transaction(self, transaction: Transaction):
+        transaction = self._normalized(transaction)
+        seq = self._ledger_rows()
+        # Settle cash first, with the loader's checks, so a refused trade leaves no trace
+        value = transaction.amount * transaction.price
+        if transaction.type == 'buy':
+            self.cash.asset_bought(transaction.currency, value, transaction.transaction_cost)
+        elif transaction.type == 'sell':
+            self.cash.asset_sold(transaction.currency, value, transaction.transaction_cost)
         if transaction.asset.name not in self.assets:
             self.assets[transaction.asset.name] = transaction.asset
+        # Each write revalues the running totals by this asset only
+        asset = self.assets[transaction.asset.name]
         if transaction.type == 'buy':
-            self.assets[transaction.asset.name].average_loading_price = self.average_loading_price(transaction.asset, transaction.amount, transaction.price)
-            self.assets[transaction.asset.name].amount += transaction.amount
-            self.assets[transaction.asset.name].total_invested += transaction.amount * transaction.price
+            asset.average_loading_price = self.average_loading_price(asset, transaction.amount, transaction.price)
+            asset.amount += transaction.amount
+            asset.total_invested += value
         elif transaction.type == 'sell':
-            self.assets[transaction.asset.name].amount -= transaction.amount
-            self.assets[transaction.asset.name].total_invested -= transaction.amount * transaction.price
+            asset.amount -= transaction.amount
+            asset.total_invested -= value
         self.transactions.append(transaction)
+        if self.journal is not None:
+            self.journal.append(seq, transaction.to_csv_row())
+
+    def deposit(self, currency: str, amount: float, date=None):
+        currency = currency.upper()
+        self.cash.deposit(currency, amount)
+        self._record_flow(currency, 'deposit', amount, date)
+
+    def withdraw(self, currency: str, amount: float, date=None):
+        currency = currency.upper()
+        self.cash.withdraw(currency, amount)
+        self._record_flow(currency, 'withdraw', amount, date)
+
+    def _record_flow(self, currency: str, type: str, amount: float, date):
+        seq = self._ledger_rows()
+        row = self.cash_flows.append_row(currency, type, amount, len(self.transactions), date)
+        if self.journal is not None:
+            self.journal.append(seq, self.cash_flows.csv_row(row))
 
     @classmethod
-    def load_transactions(cls, csv_file):
-        assets = Assets()
-        transactions = Transactions()
-        cash = Cash()
-        with open(csv_file, mode='r') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                name, asset_type, currency, transaction_type, amount, price, transaction_cost, date = row
-
-                name = name.upper()
-                currency = currency.upper()
-                transaction_type = transaction_type.lower()
-
-                # If asset_type is Cash
-                if asset_type == 'Cash':
-                    if transaction_type == 'deposit':
-                        cash.deposit(currency, float(amount))
-                    elif transaction_type == 'withdraw':
-                        cash.withdraw(currency, float(amount))
-                    continue
-
-                asset: Asset = cls.identify_asset(asset_type)(name=name, currency=currency)
-                transaction = Transaction(asset, transaction_type, currency, float(amount), float(price), float(transaction_cost), date)
-                
-                if asset.name not in assets:
-                    assets[asset.name] = asset
-                if transaction.type == 'buy':
-                    assets[asset.name].average_loading_price = cls.average_loading_price(asset, transaction.amount, transaction.price)
-                    assets[asset.name].amount += transaction.amount
-                    assets[asset.name].total_invested += transaction.amount * transaction.price
-
-                    cash.asset_bought(currency, transaction.amount * transaction.price, transaction.transaction_cost)
-                elif transaction.type == 'sell':
-                    assets[asset.name].amount -= transaction.amount
-                    assets[asset.name].total_invested -= transaction.amount * transaction.price   
-
-                    cash.asset_sold(currency, transaction.amount * transaction.price, transaction.transaction_cost) 
-                
-                transactions.append(transaction)
-
-        return cls(assets, cash, transactions)
-    
+    def load_transactions(cls, csv_file, block_size: int = None, progress=None, keep_transactions: bool = True,
+                          processes: int = None):
+        """
+        Load a portfolio from a transaction CSV, parsed and applied in chunks.
+
+        block_size : int
+            Bytes parsed per chunk, 1 MiB by default
+        progress : callable
+            Called as progress(rows, bytes_read, total_bytes) after each chunk
+        keep_transactions : bool
+            Keep the ledger and cash flows; without them only positions and balances are held
+        processes : int
+            Parse and replay the file in this many processes, one byte range each, see `replay_ranges`
+        """
+        from pt.ingest import LedgerLoader
+        loader = LedgerLoader(keep_transactions)
+        cls._replay(loader, csv_file, block_size, progress, processes)
+        return cls(loader.assets, loader.cash, loader.transactions, loader.cash_flows)
+
+    @classmethod
+    def load(cls, csv_file, snapshot_file: str = None, journal_file: str = None, sync: str = 'batch',
+             block_size: int = None, progress=None, processes: int = None):
+        """
+        Open a portfolio kept as a transaction CSV, a snapshot of it and a journal of new rows.
+
+        The snapshot, `<csv_file>.snapshot` by default, records the size and a
+        hash of the part of the CSV it covers; only the rows appended to the
+        CSV after it are replayed. A missing, corrupt or stale snapshot, e.g. after
+        the CSV was rewritten by another program or a row edited in place, is
+        rebuilt from the whole CSV.
+
+        Rows of the journal, `<csv_file>.journal` by default, are applied next, like
+        rows of the CSV by `load_transactions`.
+        Transactions, deposits and withdrawals added afterwards are appended to the
+        journal with the given `sync` mode, see `Journal`, until `compact` writes
+        them to the CSV.
+        """
+        from pt.ingest import LedgerLoader
+        snapshot_file = snapshot_file or f"{csv_file}.snapshot"
+        journal_file = journal_file or f"{csv_file}.journal"
+        end = os.path.getsize(csv_file)
+        loader = LedgerLoader()
+        start, restored, fingerprint = 0, False, None
+        try:
+            header, state = read_snapshot(snapshot_file)
+            if header["offset"] <= end:
+                # The covered part and the whole ledger are hashed in one pass
+                covered, fingerprint = ledger_fingerprints(csv_file, [header["offset"], end])
+                if header["fingerprint"] == covered:
+                    cash = Cash(state["exchange_rates"])
+                    cash.balances = state["balances"]
+                    loader.restore(state["assets"], cash, state["transactions"], state["cash_flows"], header["rows"])
+                    start, restored = header["offset"], True
+        except (FileNotFoundError, SnapshotError, KeyError):
+            pass
+        cls._replay(loader, csv_file, block_size, progress, processes, start, end)
+        portfolio = cls(loader.assets, loader.cash, loader.transactions, loader.cash_flows)
+        if not restored or start < end:
+            portfolio._write_snapshot(snapshot_file, csv_file, end, loader.rows, fingerprint)
+
+        # Journal rows before the end of the CSV were compacted into it already
+        for batch in Journal.read(journal_file, start=portfolio._ledger_rows()).to_batches():
+            loader.feed(batch)
+        portfolio.csv_file, portfolio.snapshot_file = csv_file, snapshot_file
+        portfolio.journal = Journal(journal_file, sync=sync)
+        return portfolio
+
+    @staticmethod
+    def _replay(loader: 'LedgerLoader', csv_file, block_size, progress, processes, start=0, end=None):
+        from pt.ingest import DEFAULT_BLOCK_SIZE, read_chunks, replay_ranges
+        if processes is not None and processes > 1:
+            replay_ranges(loader, csv_file, processes, block_size or DEFAULT_BLOCK_SIZE, progress, start, end)
+            return
+        for batch in read_chunks(csv_file, block_size or DEFAULT_BLOCK_SIZE, progress, start, end):
+            loader.feed(batch)
+
+    def _write_snapshot(self, snapshot_file, csv_file, offset, rows, fingerprint: str = None):
+        state = {
+            "assets": self.assets,
+            "balances": self.cash.balances,
+            "exchange_rates": self.cash.exchange_rates,
+            "transactions": self.transactions,
+            "cash_flows": self.cash_flows,
+        }
+        write_snapshot(snapshot_file, state,
+                       {"offset": offset, "rows": rows,
+                        "fingerprint": fingerprint or ledger_fingerprint(csv_file, offset)})
+
+    def compact(self):
+        """
+        Write the whole ledger to the CSV of `load`, with a new snapshot, and empty the journal.
+
+        Each step leaves a consistent state if the process dies: the CSV is replaced
+        atomically, a stale snapshot is rebuilt, and journal rows already in the
+        CSV are skipped by their sequence number.
+        """
+        if self.journal is None:
+            raise ValueError("Only a portfolio opened with Portfolio.load can be compacted.")
+        self.save_transactions(self.csv_file)
+        self._write_snapshot(self.snapshot_file, self.csv_file, os.path.getsize(self.csv_file), self._ledger_rows())
+        self.journal.truncate()
+
+    def to_sqlite(self, path: str):
+        """Store the portfolio in a SQLite database, see `SQLiteStore`"""
+        with SQLiteStore(path) as store:
+            store.save(self)
+
+    @classmethod
+    def from_sqlite(cls, path: str) -> 'Portfolio':
+        with SQLiteStore(path) as store:
+            return cls(*store.load_state())
+
+    def to_parquet(self, directory: str):
+        """Write the ledger, cash flows, valued positions and balances as Parquet files in `directory`"""
+        from pt.arrow_io import write_portfolio
+        write_portfolio(self, directory, "parquet")
+
+    @classmethod
+    def from_parquet(cls, directory: str) -> 'Portfolio':
+        from pt.arrow_io import read_portfolio
+        return cls(*read_portfolio(directory, "parquet"))
+
+    def to_ipc(self, directory: str):
+        """Write the tables of `to_parquet` as Arrow IPC files"""
+        from pt.arrow_io import write_portfolio
+        write_portfolio(self, directory, "arrow")
+
+    @classmethod
+    def from_ipc(cls, directory: str, memory_map: bool = True) -> 'Portfolio':
+        from pt.arrow_io import read_portfolio
+        return cls(*read_portfolio(directory, "arrow", memory_map))
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
     def save_transactions(self, csv_file):
-        with open(csv_file, mode='w', newline='') as file:
-            writer = csv.writer(file)
-            for transaction in self.transactions:
-                writer.writerow(transaction.to_csv_row())
+        # Written next to the target and renamed, a crash leaves the previous file in place
+        directory = os.path.dirname(os.path.abspath(csv_file))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerows(self.cash_flows.merge_csv_rows(self.transactions))
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, csv_file)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+    def valuation_series(self, start=None, end=None, prices=None, currency: str = None):
+        """
+        Market value, cash and invested capital on every day with start <= date < end, see `valuation_series`.
+
+        prices : PriceMatrix or dict
+            Price matrix, or PriceHistory per symbol; by default the daily history
+            of each asset, through the history cache
+        """
+        from pt.valuation import valuation_series
+        if prices is None:
+            prices = {name: asset.history for name, asset in self.assets.items()}
+        return valuation_series(self.transactions, self.cash_flows, prices, start, end, currency, self.cash.fx)
+
+    def _returns_valuation(self, start, end, prices, currency):
+        # Valued from the day before `start`, whose value is the starting value of the returns
+        from pt.valuation import first_ledger_day
+        if start is None:
+            start = first_ledger_day(self.transactions, self.cash_flows)
+            if start is None:
+                raise ValueError("No ledger rows to value.")
+            start = np.datetime64(start, 'D')
+        return self.valuation_series(np.datetime64(start, 'D') - 1, end, prices, currency)
+
+    def returns(self, start=None, end=None, prices=None, currency: str = None) -> Dict[str, float]:
+        """
+        Time-weighted and money-weighted returns of the whole portfolio, cash included,
+        on the days with start <= date < end. Deposits and withdrawals are the external flows.
+
+        The time-weighted return chain-links the daily returns, see `daily_returns`;
+        the money-weighted return is the annual internal rate of return, see `xirr`.
+        Arguments are those of `valuation_series`.
+        """
+        from pt.returns import money_weighted_return, time_weighted_return
+        valuation = self._returns_valuation(start, end, prices, currency)
+        total = valuation.total
+        return {
+            'time_weighted': float(time_weighted_return(total, valuation.flows)),
+            'money_weighted': float(money_weighted_return(total, valuation.flows, valuation.dates)),
+        }
+
+    def asset_returns(self, start=None, end=None, prices=None) -> Tuple[List[str], Dict[str, np.ndarray]]:
+        """
+        Time-weighted and money-weighted returns of every asset, in its own currency.
+
+        Purchases put money into an asset and sales take it out, see `trade_flows`.
+        Returns the symbols and an array of each return, computed for all assets in one batch.
+        """
+        from pt.returns import money_weighted_return, time_weighted_return
+        from pt.valuation import trade_flows
+        valuation = self._returns_valuation(start, end, prices, None)
+        values = np.where(valuation.holdings != 0, valuation.holdings * valuation.prices, 0.0)
+        flows = trade_flows(self.transactions, valuation.symbols, valuation.dates[0],
+                            valuation.dates[-1] + 1)
+        return valuation.symbols, {
+            'time_weighted': time_weighted_return(values, flows),
+            'money_weighted': money_weighted_return(values, flows, valuation.dates),
+        }
+
+    def update_price(self, symbol: str, price: float):
+        """Set the price of one asset, see `Assets.update_price`"""
+        self.assets.update_price(symbol, price)
+
+    def totals(self) -> Dict[str, float]:
+        """Value, invested capital, P&L and P&L% of the assets from their running totals, without fetching prices"""
+        return self.assets.totals()
+
+    def currency_totals(self) -> Dict[str, Dict[str, float]]:
+        """Value and invested capital of the assets and the cash balance, per currency and not converted"""
+        totals = {currency: dict(figures, cash=self.cash[currency])
+                  for currency, figures in self.assets.currency_totals().items()}
+        for currency, balance in self.cash.balances.items():
+            totals.setdefault(currency, {'current_value': 0.0, 'total_invested': 0.0, 'cash': balance})
+        return totals
 
+    def check_totals(self, rtol: float = 1e-9):
+        """Compare the running totals with a full recompute, ValueError if they drifted apart"""
+        self.assets.check_totals(rtol)
 
     def calculate_performance(self):
         return self.assets.calculate_performance()
 
     def display_performance(self):
+        from rich import box
+        from rich.panel import Panel
+        from rich.table import Table
+        from pt.richtools import repr_rich
         table = Table(box=box.SIMPLE, show_lines=True)
 
         table.add_column("Asset", justify="right", style="cyan", no_wrap=True)
@@ -86,20 +337,26 @@ class Portfolio:
         table.add_column("Profit/Loss", justify="right", style="red")
         table.add_column("Profit/Loss %", justify="right", style="blue")
 
-        performance = self.calculate_performance()
-        for asset_name, data in performance.items():
+        performance, _ = self.assets._current_performance()
+        rows = zip(self.assets.keys(), self.assets.column('total_invested').tolist(),
+                   performance['current_value'].tolist(), performance['profit_loss'].tolist(),
+                   performance['profit_loss_percentage'].tolist())
+        for asset_name, total_invested, current_value, profit_loss, profit_loss_percentage in rows:
             table.add_row(
                 asset_name,
-                f"${self.assets[asset_name].total_invested:.2f}",
-                f"${data['current_value']:.2f}",
-                f"${data['profit_loss']:.2f}",
-                f"{data['profit_loss_percentage']:.2f}%"
+                f"${total_invested:.2f}",
+                f"${current_value:.2f}",
+                f"${profit_loss:.2f}",
+                f"{profit_loss_percentage:.2f}%"
             )
 
         print(repr_rich(Panel(table, title="Performance")))
 
 
     def __rich__(self):
+        from rich import box
+        from rich.panel import Panel
+        from rich.table import Table
         table = Table(box=box.SIMPLE, show_lines=True)
 
         table.add_column("Asset", justify="right", style="cyan", no_wrap=True)
@@ -110,39 +367,34 @@ class Portfolio:
         table.add_column("Profit/Loss %", justify="right", style="blue")
         table.add_column("Price", justify="right", style="yellow")
 
-        performance, _ = self.calculate_performance()
-        for asset_name, data in performance.items():
+        performance, _ = self.assets._current_performance()
+        rows = zip(self.assets.keys(), self.assets.column('amount').tolist(), performance['current_value'].tolist(),
+                   self.assets.column('total_invested').tolist(), performance['profit_loss'].tolist(),
+                   performance['profit_loss_percentage'].tolist(), self.assets.column('price').tolist())
+        for asset_name, amount, current_value, total_invested, profit_loss, profit_loss_percentage, price in rows:
             table.add_row(
                 asset_name,
-                str(self.assets[asset_name].amount),
-                f"${data['current_value']:.2f}",
-                f"${self.assets[asset_name].total_invested:.2f}",
-                f"${data['profit_loss']:.2f}",
-                f"{data['profit_loss_percentage']:.2f}%",
-                f"${self.assets[asset_name].price:.2f}"
+                str(amount),
+                f"${current_value:.2f}",
+                f"${total_invested:.2f}",
+                f"${profit_loss:.2f}",
+                f"{profit_loss_percentage:.2f}%",
+                f"${price:.2f}"
             )
         return Panel(table, title="Portfolio Summary")
     
     def __repr__(self):
+        from pt.richtools import repr_rich
         return repr_rich(self.__rich__())
     
     def display_portfolio(self):
+        from pt.richtools import repr_rich
         print(repr_rich(self.__rich__()))
 
 
     @staticmethod
     def identify_asset(asset_type) -> Asset:
-        match asset_type:
-            case "Stock":
-                return Stock
-            case "ETF":
-                return ETF
-            case "Bond":
-                return Bond
-            case "Crypto":
-                return Crypto
-            case _:
-                raise ValueError(f"Unknown asset type: {asset_type}")
+        return identify_asset(asset_type)
             
     @staticmethod
     def average_loading_price(asset: Asset, amount: int, price: float) -> float:
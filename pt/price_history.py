@@ -0,0 +1,101 @@
+from typing import List
+
+import numpy as np
+
+__all__ = ['PriceHistory', 'to_days']
+
+
+def to_days(dates) -> np.ndarray:
+    """Convert dates (strings, datetimes, DatetimeIndex) to datetime64[D]"""
+    if getattr(dates, "tz", None) is not None:
+        # Keep the exchange's calendar date, not the UTC one
+        dates = dates.tz_localize(None)
+    return np.asarray(dates, dtype="datetime64[D]")
+
+
+class PriceHistory:
+    """
+    Prices of one ticker as contiguous arrays sharing a sorted datetime64[D] index.
+
+    Lookups by date are binary searches and `window` returns views on the same
+    buffers, so slicing never copies. Prices may be stored as float32 to halve
+    the memory of large universes.
+
+    dates : array-like
+        Increasing dates
+    close : array-like
+        Close price per date
+    open, high, low, volume : array-like
+        Optional columns of the same length
+    """
+
+    __slots__ = ('dates', 'close', 'open', 'high', 'low', 'volume')
+
+    _COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+    def __init__(self, dates, close, open=None, high=None, low=None, volume=None, dtype=np.float64):
+        self.dates: np.ndarray = to_days(dates)
+        self.close: np.ndarray = np.ascontiguousarray(close, dtype=dtype)
+        self.open = None if open is None else np.ascontiguousarray(open, dtype=dtype)
+        self.high = None if high is None else np.ascontiguousarray(high, dtype=dtype)
+        self.low = None if low is None else np.ascontiguousarray(low, dtype=dtype)
+        self.volume = None if volume is None else np.ascontiguousarray(volume, dtype=np.float64)
+        if self.dates.shape != self.close.shape:
+            raise ValueError("Dates and prices must have the same length.")
+
+    @classmethod
+    def from_frame(cls, data, dtype=np.float64) -> 'PriceHistory':
+        """Build from a DataFrame of `fetch_historical_prices`, dropping bars without a close"""
+        data = data[data["Close"].notna()]
+        columns = {name: data[column].to_numpy() for name, column in cls._COLUMNS.items() if column in data.columns}
+        return cls(data.index, dtype=dtype, **columns)
+
+    def to_frame(self):
+        import pandas as pd
+        columns = {column: getattr(self, name) for name, column in self._COLUMNS.items()
+                   if getattr(self, name) is not None}
+        return pd.DataFrame(columns, index=pd.DatetimeIndex(self.dates, name="Date"))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        if not len(self):
+            return "PriceHistory([])"
+        return f"PriceHistory({len(self)} prices from {self.dates[0]} to {self.dates[-1]}, {self.close.dtype})"
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.__slots__ if getattr(self, name) is not None)
+
+    def tolist(self) -> List[float]:
+        return self.close.tolist()
+
+    def position(self, date) -> int:
+        """Index of the last date on or before `date`, -1 if there is none"""
+        return int(np.searchsorted(self.dates, np.datetime64(date, "D"), side="right")) - 1
+
+    def asof(self, date) -> float:
+        """Close on the last date on or before `date`"""
+        position = self.position(date)
+        if position < 0:
+            raise KeyError(f"No price on or before {date}.")
+        return float(self.close[position])
+
+    def asof_many(self, dates) -> np.ndarray:
+        """Close as of each date, NaN for dates before the first price"""
+        positions = np.searchsorted(self.dates, to_days(dates), side="right") - 1
+        prices = self.close[np.maximum(positions, 0)].astype(np.float64) if len(self) \
+            else np.full(positions.shape, np.nan)
+        prices[positions < 0] = np.nan
+        return prices
+
+    def window(self, start=None, end=None) -> 'PriceHistory':
+        """Prices with start <= date < end, as views on this history"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "D"), side="left"))
+        hi = len(self) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "D"), side="left"))
+        window = PriceHistory.__new__(PriceHistory)
+        for name in self.__slots__:
+            values = getattr(self, name)
+            setattr(window, name, None if values is None else values[lo:hi])
+        return window
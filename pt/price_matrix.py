@@ -0,0 +1,219 @@
+import json
+import os
+from typing import Dict, Iterable, List, Mapping, Union
+
+import numpy as np
+
+from .price_history import PriceHistory, to_days
+
+__all__ = ['PriceMatrix']
+
+_META = "meta.json"
+_DATES = "dates.i8"
+_PRICES = "prices.f8"
+
+
+class PriceMatrix:
+    """
+    Dense date x ticker matrix of float64 prices stored on disk and opened with numpy memmap.
+
+    All tickers share one trading calendar, rows are dates in increasing order and
+    columns follow `tickers`. Slices returned by `values`, `column` and `window`
+    are views on the mapped file, so several processes opening the same directory
+    share one physical copy through the page cache. Missing prices are NaN.
+
+    The files are preallocated for `capacity` rows, so appending a day writes one
+    row in place and only grows the files when the capacity is exhausted.
+
+    path : str
+        Directory holding the matrix
+    mode : str
+        'r' for read-only access, 'r+' to append
+    """
+
+    def __init__(self, path: str, mode: str = "r"):
+        if mode not in ("r", "r+"):
+            raise ValueError(f"Invalid mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.refresh()
+
+    @classmethod
+    def create(cls, path: str, tickers: Iterable[str], capacity: int = 1024) -> 'PriceMatrix':
+        tickers = list(dict.fromkeys(tickers))
+        os.makedirs(path, exist_ok=True)
+        capacity = max(1, capacity)
+        cls._allocate(path, capacity, len(tickers))
+        cls._write_meta(path, {"tickers": tickers, "rows": 0, "capacity": capacity})
+        return cls(path, mode="r+")
+
+    @classmethod
+    def from_histories(cls, path: str, histories: Mapping[str, object], column: str = "Close") -> 'PriceMatrix':
+        """
+        Build a matrix from price histories per ticker, either PriceHistory objects or
+        DataFrames of `fetch_historical_prices`. The calendar is the union of all their dates.
+        """
+        series = {}
+        for ticker, history in histories.items():
+            if isinstance(history, PriceHistory):
+                series[ticker] = (history.dates, np.asarray(history.close, dtype=np.float64))
+                continue
+            values = history[column] if hasattr(history, "columns") else history
+            series[ticker] = (to_days(values.index), np.asarray(values, dtype=np.float64))
+        calendar = np.unique(np.concatenate([days for days, _ in series.values()])) if series \
+            else np.array([], dtype="datetime64[D]")
+        matrix = np.full((len(calendar), len(series)), np.nan)
+        for col, (days, values) in enumerate(series.values()):
+            matrix[np.searchsorted(calendar, days), col] = values
+        prices = cls.create(path, series.keys(), capacity=max(1024, len(calendar)))
+        prices.append_many(calendar, matrix)
+        return prices
+
+    @staticmethod
+    def _allocate(path: str, capacity: int, n_tickers: int):
+        for name, itemsize in ((_DATES, 8), (_PRICES, 8 * max(1, n_tickers))):
+            with open(os.path.join(path, name), "ab") as file:
+                file.truncate(capacity * itemsize)
+
+    @staticmethod
+    def _write_meta(path: str, meta: Dict):
+        tmp_path = os.path.join(path, _META + ".tmp")
+        with open(tmp_path, "w") as file:
+            json.dump(meta, file)
+        os.replace(tmp_path, os.path.join(path, _META))
+
+    def refresh(self):
+        """Re-read the metadata, picking up rows appended by another process"""
+        with open(os.path.join(self.path, _META)) as file:
+            meta = json.load(file)
+        self.tickers: List[str] = meta["tickers"]
+        self.columns: Dict[str, int] = {ticker: col for col, ticker in enumerate(self.tickers)}
+        self._rows: int = meta["rows"]
+        self._capacity: int = meta["capacity"]
+        self._dates = np.memmap(os.path.join(self.path, _DATES), dtype=np.int64, mode=self.mode,
+                                shape=(self._capacity,))
+        self._prices = np.memmap(os.path.join(self.path, _PRICES), dtype=np.float64, mode=self.mode,
+                                 shape=(self._capacity, max(1, len(self.tickers))))
+
+    def _save_meta(self):
+        self._write_meta(self.path, {"tickers": self.tickers, "rows": self._rows, "capacity": self._capacity})
+
+    def __len__(self):
+        return self._rows
+
+    @property
+    def shape(self):
+        return self._rows, len(self.tickers)
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self._dates[:self._rows].view("datetime64[D]")
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._prices[:self._rows, :len(self.tickers)]
+
+    def column(self, ticker: str) -> np.ndarray:
+        return self.values[:, self.columns[ticker]]
+
+    def row_slice(self, start=None, end=None) -> slice:
+        """Rows with start <= date < end"""
+        dates = self.dates
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="left"))
+        return slice(lo, hi)
+
+    def window(self, start=None, end=None, tickers: Union[str, List[str]] = None) -> np.ndarray:
+        """
+        Prices with start <= date < end. Without `tickers`, or with a single one,
+        the result is a view; selecting several tickers copies their columns.
+        """
+        rows = self.values[self.row_slice(start, end)]
+        if tickers is None:
+            return rows
+        if isinstance(tickers, str):
+            return rows[:, self.columns[tickers]]
+        return rows[:, [self.columns[ticker] for ticker in tickers]]
+
+    def asof(self, date, tickers: Union[str, List[str]] = None) -> np.ndarray:
+        """Prices on the last calendar date on or before `date`"""
+        row = int(np.searchsorted(self.dates, np.datetime64(date, "D"), side="right")) - 1
+        if row < 0:
+            raise KeyError(f"No prices on or before {date}.")
+        values = self.values[row]
+        if tickers is None:
+            return values
+        if isinstance(tickers, str):
+            return values[self.columns[tickers]]
+        return values[[self.columns[ticker] for ticker in tickers]]
+
+    def _check_writable(self):
+        if self.mode != "r+":
+            raise ValueError("Price matrix is opened read-only.")
+
+    def _reserve(self, rows: int):
+        if rows <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < rows:
+            capacity *= 2
+        self._dates.flush()
+        self._prices.flush()
+        self._allocate(self.path, capacity, len(self.tickers))
+        self._capacity = capacity
+        self._save_meta()
+        self.refresh()
+
+    def append(self, date, prices: Union[Mapping[str, float], np.ndarray]):
+        """Append one day; prices are given per ticker or as a full row in column order"""
+        if isinstance(prices, Mapping):
+            row = np.full(len(self.tickers), np.nan)
+            for ticker, price in prices.items():
+                row[self.columns[ticker]] = price
+            prices = row
+        self.append_many(np.array([date], dtype="datetime64[D]"), np.asarray(prices, dtype=np.float64)[None, :])
+
+    def append_many(self, dates, prices: np.ndarray):
+        """Append several days at once; `prices` has one row per date and one column per ticker"""
+        self._check_writable()
+        days = to_days(dates)
+        prices = np.asarray(prices, dtype=np.float64)
+        if prices.shape != (len(days), len(self.tickers)):
+            raise ValueError(f"Expected prices of shape {(len(days), len(self.tickers))}, got {prices.shape}.")
+        if len(days) == 0:
+            return
+        if np.any(np.diff(days) <= np.timedelta64(0, "D")) or (self._rows and days[0] <= self.dates[-1]):
+            raise ValueError("Dates must be increasing and after the last stored date.")
+        start = self._rows
+        self._reserve(start + len(days))
+        self._dates[start:start + len(days)] = days.astype(np.int64)
+        self._prices[start:start + len(days), :len(self.tickers)] = prices
+        self._dates.flush()
+        self._prices.flush()
+        # Rows become visible to readers only once the data is written
+        self._rows += len(days)
+        self._save_meta()
+
+    def add_tickers(self, tickers: Iterable[str]):
+        """Add columns filled with NaN. This rewrites the price file."""
+        self._check_writable()
+        new = [ticker for ticker in dict.fromkeys(tickers) if ticker not in self.columns]
+        if not new:
+            return
+        old_values = np.array(self.values)
+        old_width = len(self.tickers)
+        self._prices.flush()
+        del self._prices
+        os.unlink(os.path.join(self.path, _PRICES))
+        self.tickers = self.tickers + new
+        self._allocate(self.path, self._capacity, len(self.tickers))
+        self._save_meta()
+        self.refresh()
+        self._prices[:self._rows, :old_width] = old_values
+        self._prices[:self._rows, old_width:] = np.nan
+        self._prices.flush()
+
+    def flush(self):
+        if self.mode == "r+":
+            self._dates.flush()
+            self._prices.flush()
@@ -0,0 +1,125 @@
+import gzip
+import io
+import os
+import pickle
+import threading
+import time
+from typing import Dict, List
+
+import pandas as pd
+
+from .market_data import MarketDataProvider
+
+__all__ = ['RecordingProvider', 'ReplayProvider']
+
+_FORMAT_VERSION = 1
+
+
+def _history_key(ticker, period, interval, start, end):
+    # Dates may be given as strings or datetimes, record them in one form
+    start = None if start is None else pd.Timestamp(start).isoformat()
+    end = None if end is None else pd.Timestamp(end).isoformat()
+    if start or end:
+        period = None
+    return ticker, period, interval, start, end
+
+
+def _read_recording(path: str) -> Dict:
+    with gzip.open(path, "rb") as file:
+        recording = pickle.load(file)
+    if recording.get("version") != _FORMAT_VERSION:
+        raise ValueError(f"Unsupported recording version in {path}.")
+    return recording
+
+
+class RecordingProvider(MarketDataProvider):
+    """
+    Wrap a provider and record every answer to a compact local file.
+
+    Quotes are kept per ticker, histories per request arguments, stored as
+    Parquet inside a gzip-compressed file. Use as a context manager or call
+    `save` to write the recording.
+
+    provider : MarketDataProvider
+        Provider actually answering the requests
+    path : str
+        Recording file, extended if it already exists
+    """
+
+    def __init__(self, provider: MarketDataProvider, path: str):
+        self.provider = provider
+        self.path = path
+        self.prices: Dict[str, float] = {}
+        self.histories: Dict[tuple, bytes] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            recording = _read_recording(path)
+            self.prices.update(recording["prices"])
+            self.histories.update(recording["histories"])
+
+    def fetch_prices(self, tickers: List[str]) -> Dict[str, float]:
+        prices = self.provider.fetch_prices(tickers)
+        with self._lock:
+            self.prices.update({ticker: float(price) for ticker, price in prices.items()})
+        return prices
+
+    def fetch_historical_prices(self, ticker: str, period="1mo", interval="1d", start=None, end=None):
+        data = self.provider.fetch_historical_prices(ticker, period=period, interval=interval, start=start, end=end)
+        buffer = io.BytesIO()
+        data.to_parquet(buffer)
+        with self._lock:
+            self.histories[_history_key(ticker, period, interval, start, end)] = buffer.getvalue()
+        return data
+
+    def save(self):
+        with self._lock:
+            recording = {"version": _FORMAT_VERSION, "prices": dict(self.prices), "histories": dict(self.histories)}
+        tmp_path = self.path + ".tmp"
+        with gzip.open(tmp_path, "wb") as file:
+            pickle.dump(recording, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.save()
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serve a recording made by `RecordingProvider` without any network access.
+
+    Requests missing from the recording raise ValueError, like a ticker without data.
+
+    path : str
+        Recording file
+    latency : float
+        Seconds slept before each answer to simulate a remote provider
+    """
+
+    def __init__(self, path: str, latency: float = 0.0):
+        recording = _read_recording(path)
+        self.prices: Dict[str, float] = recording["prices"]
+        self._histories: Dict[tuple, bytes] = recording["histories"]
+        self._decoded: Dict[tuple, pd.DataFrame] = {}
+        self.latency = latency
+        self.requests = 0
+
+    def _wait(self):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def fetch_prices(self, tickers: List[str]) -> Dict[str, float]:
+        self._wait()
+        return {ticker: self.prices[ticker] for ticker in tickers if ticker in self.prices}
+
+    def fetch_historical_prices(self, ticker: str, period="1mo", interval="1d", start=None, end=None):
+        self._wait()
+        key = _history_key(ticker, period, interval, start, end)
+        if key not in self._histories:
+            raise ValueError(f"No recorded price history for {key}.")
+        if key not in self._decoded:
+            self._decoded[key] = pd.read_parquet(io.BytesIO(self._histories[key]))
+        return self._decoded[key]
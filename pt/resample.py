@@ -0,0 +1,70 @@
+import pandas as pd
+
+__all__ = ['RESAMPLE_RULES', 'resample_ohlc', 'period_start']
+
+# yfinance interval -> pandas rule, bars are labelled by their first day like yfinance does
+RESAMPLE_RULES = {
+    "1wk": "W-MON",
+    "1mo": "MS",
+    "3mo": "QS",
+}
+
+_PERIODS = {
+    "1d": pd.DateOffset(days=1),
+    "5d": pd.DateOffset(days=5),
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+_AGGREGATIONS = {
+    "Open": "first",
+    "High": "max",
+    "Low": "min",
+    "Close": "last",
+    "Adj Close": "last",
+    "Volume": "sum",
+    "Dividends": "sum",
+    "Capital Gains": "sum",
+}
+
+
+def _splits(ratios: pd.Series) -> float:
+    # 0 means no split, several splits in one bar compound
+    ratios = ratios[ratios != 0]
+    return float(ratios.prod()) if len(ratios) else 0.0
+
+
+def resample_ohlc(data: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """
+    Derive bars for a coarser interval (see RESAMPLE_RULES) from daily bars.
+
+    Each bar takes the first Open, highest High, lowest Low and last Close of
+    the days it covers; volumes and dividends are summed. Bars without any
+    trading day are dropped.
+    """
+    if interval not in RESAMPLE_RULES:
+        raise ValueError(f"Cannot resample to interval {interval}.")
+    if data.empty:
+        return data
+    how = {column: _AGGREGATIONS.get(column, "last") for column in data.columns}
+    if "Stock Splits" in data.columns:
+        how["Stock Splits"] = _splits
+    bars = data.resample(RESAMPLE_RULES[interval], label="left", closed="left").agg(how)
+    close = "Close" if "Close" in bars.columns else bars.columns[0]
+    return bars[bars[close].notna()]
+
+
+def period_start(period: str, now: pd.Timestamp) -> pd.Timestamp:
+    """First timestamp covered by a yfinance `period` ending at `now`, None for max"""
+    if period in (None, "max"):
+        return None
+    if period == "ytd":
+        return now.normalize().replace(month=1, day=1)
+    if period not in _PERIODS:
+        raise ValueError(f"Invalid period: {period}")
+    return now.normalize() - _PERIODS[period]
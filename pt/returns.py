@@ -0,0 +1,177 @@
+from typing import Tuple
+
+import numpy as np
+
+__all__ = ['daily_returns', 'money_weighted_return', 'series_cash_flows', 'time_weighted_return', 'xirr']
+
+_DAYS_PER_YEAR = 365.0
+
+
+def daily_returns(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+    """
+    Return of each day from end-of-day values and the external flows of each day.
+
+    Flows are counted at the end of their day, so the return of day t is
+    `(values[t] - flows[t]) / values[t - 1] - 1`: money put in earns nothing
+    on its first day and money taken out earns that day's return. Days that
+    start with nothing invested return 0.
+    `values[0]` is the starting value, its return is 0. Two-dimensional inputs
+    hold one entity per column.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flows = np.asarray(flows, dtype=np.float64)
+    returns = np.zeros_like(values)
+    gain = values[1:] - values[:-1] - flows[1:]
+    np.divide(gain, values[:-1], out=returns[1:], where=values[:-1] > 0)
+    # A missing value is not a zero return
+    returns[1:][np.isnan(gain)] = np.nan
+    return returns
+
+
+def time_weighted_return(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+    """Daily returns chain-linked over the whole series, per column for two-dimensional inputs"""
+    return np.prod(1 + daily_returns(values, flows), axis=0) - 1
+
+
+def _npv(growth: np.ndarray, entities: np.ndarray, years: np.ndarray, amounts: np.ndarray,
+         count: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Present value of each entity's flows at the continuous rate `growth`, its
+    derivative and the present value of the absolute flows, all scaled by a
+    positive factor per entity so that no discount factor overflows.
+    """
+    exponent = -years * growth[entities]
+    largest = np.full(count, -np.inf)
+    np.maximum.at(largest, entities, exponent)
+    discount = np.exp(exponent - largest[entities])
+    value = np.bincount(entities, amounts * discount, minlength=count)
+    derivative = np.bincount(entities, -years * amounts * discount, minlength=count)
+    scale = np.bincount(entities, np.abs(amounts) * discount, minlength=count)
+    return value, derivative, scale
+
+
+def xirr(entities, days, amounts, count: int = None, guess: float = 0.1, tol: float = 1e-10,
+         max_iterations: int = 50) -> np.ndarray:
+    """
+    Annual internal rate of return of the dated cash flows of many entities at once.
+
+    Flows are given as flat arrays, one entry per flow, tagged with the entity
+    they belong to, e.g. the column of an asset or an account. The equation is
+    solved for the continuous rate log(1 + rate), which stays finite even for
+    a near total loss. Newton steps are taken for every entity together, each
+    evaluation of the present values being one `bincount` over all the flows.
+    Entities Newton does not settle are solved by bisection on a bracket of
+    rates searched for each of them, again all together. An entity whose flows
+    do not change sign has no rate and gets NaN.
+
+    entities : array-like
+        Entity of each flow, from 0 to count - 1
+    days : array-like
+        Date or day number of each flow
+    amounts : array-like
+        Flow amounts, negative for money put in and positive for money taken out
+    """
+    entities = np.asarray(entities, dtype=np.intp)
+    days = np.asarray(days)
+    if np.issubdtype(days.dtype, np.datetime64):
+        days = days.astype("datetime64[D]").astype(np.int64)
+    days = days.astype(np.float64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    count = int(entities.max()) + 1 if count is None and len(entities) else (count or 0)
+    rates = np.full(count, np.nan)
+    if not count:
+        return rates
+
+    first = np.full(count, np.inf)
+    np.minimum.at(first, entities, days)
+    years = (days - first[entities]) / _DAYS_PER_YEAR
+    solvable = (np.bincount(entities, amounts > 0, minlength=count) > 0) \
+        & (np.bincount(entities, amounts < 0, minlength=count) > 0) \
+        & (np.bincount(entities, ~np.isfinite(amounts), minlength=count) == 0)
+    # Flows of unsolvable entities would only turn the shared bincounts into NaN
+    selected = solvable[entities]
+    entities, years, amounts = entities[selected], years[selected], amounts[selected]
+
+    # Newton runs on the value compounded to the last flow, sum(a * exp((last - t) * growth)):
+    # concave and monotone when money is put in before it is taken out, so it converges from anywhere
+    last = np.zeros(count)
+    np.maximum.at(last, entities, years)
+    growth = np.full(count, np.log1p(guess))
+    converged = ~solvable
+    for _ in range(max_iterations):
+        value, derivative, _ = _npv(growth, entities, years, amounts, count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = value / (derivative + last * value)
+        # Steps are capped, far from the root Newton may overshoot by orders of magnitude
+        step = np.where(converged | ~np.isfinite(newton), 0.0, np.clip(newton, -1.0, 1.0))
+        growth = growth - step
+        converged |= np.abs(newton) <= tol
+        if converged.all():
+            break
+    value, _, scale = _npv(growth, entities, years, amounts, count)
+    settled = solvable & converged & (np.abs(value) <= 1e-8 * scale)
+    rates[settled] = np.expm1(growth[settled])
+
+    pending = np.flatnonzero(solvable & ~settled)
+    if len(pending):
+        rates[pending] = np.expm1(_bisect(pending, entities, years, amounts, count, tol))
+    return rates
+
+
+def _bisect(pending: np.ndarray, entities: np.ndarray, years: np.ndarray, amounts: np.ndarray, count: int,
+            tol: float) -> np.ndarray:
+    """Continuous rates of the `pending` entities by bisection, NaN where no bracket is found"""
+    selected = np.isin(entities, pending)
+    entities, years, amounts = entities[selected], years[selected], amounts[selected]
+    low = np.full(count, -1.0)
+    high = np.full(count, 1.0)
+    value_low = _npv(low, entities, years, amounts, count)[0]
+    value_high = _npv(high, entities, years, amounts, count)[0]
+    # Widen the bracket both ways until the present value changes sign
+    for _ in range(12):
+        widen = np.sign(value_low) == np.sign(value_high)
+        if not widen[pending].any():
+            break
+        low = np.where(widen, low * 2, low)
+        high = np.where(widen, high * 2, high)
+        value_low = _npv(low, entities, years, amounts, count)[0]
+        value_high = _npv(high, entities, years, amounts, count)[0]
+    bracketed = np.sign(value_low) != np.sign(value_high)
+    for _ in range(200):
+        middle = (low + high) / 2
+        value_middle = _npv(middle, entities, years, amounts, count)[0]
+        lower = np.sign(value_middle) == np.sign(value_low)
+        low = np.where(lower, middle, low)
+        value_low = np.where(lower, value_middle, value_low)
+        high = np.where(lower, high, middle)
+        if (high - low)[pending].max() <= tol:
+            break
+    return np.where(bracketed, (low + high) / 2, np.nan)[pending]
+
+
+def series_cash_flows(values: np.ndarray, flows: np.ndarray, dates) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Dated cash flows of `xirr` from the series of `daily_returns`, one entity per column.
+
+    The starting value is put in on the first date, the flows of the following
+    days as they happen and the last value is taken out on the last date.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flows = np.asarray(flows, dtype=np.float64)
+    if values.ndim == 1:
+        values, flows = values[:, None], flows[:, None]
+    width = values.shape[1]
+    days, columns = np.nonzero(flows[1:])
+    last = len(values) - 1
+    entities = np.concatenate((np.arange(width), columns, np.arange(width)))
+    positions = np.concatenate((np.zeros(width, dtype=np.intp), days + 1, np.full(width, last)))
+    amounts = np.concatenate((-values[0], -flows[1:][days, columns], values[last]))
+    return entities, np.asarray(dates)[positions], amounts
+
+
+def money_weighted_return(values: np.ndarray, flows: np.ndarray, dates) -> np.ndarray:
+    """Annual internal rate of return of the series of `daily_returns`, per column for two-dimensional inputs"""
+    values = np.asarray(values, dtype=np.float64)
+    entities, days, amounts = series_cash_flows(values, flows, dates)
+    rates = xirr(entities, days, amounts, count=1 if values.ndim == 1 else values.shape[1])
+    return rates[0] if values.ndim == 1 else rates
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import pickle
+import struct
+import tempfile
+import zlib
+from typing import Dict, List, Sequence, Tuple
+
+__all__ = ['SnapshotError', 'ledger_fingerprint', 'ledger_fingerprints', 'read_header', 'read_snapshot', 'write_snapshot']
+
+MAGIC = b"PTSNAP\x00\x01"
+# 2: holdings keep the currency of each row
+VERSION = 2
+_LENGTH = struct.Struct("<I")
+_BLOCK = 1 << 20
+
+
+class SnapshotError(ValueError):
+    """Unreadable snapshot: truncated, corrupt or of another format version"""
+
+
+def ledger_fingerprints(csv_file: str, offsets: Sequence[int]) -> List[str]:
+    """
+    Hash of each of the first `offsets` bytes of a ledger and of their size, in one pass over the file.
+
+    Appending rows keeps the fingerprint of the covered part; any change to
+    it, e.g. a row edited in place, a compaction or a restored backup, changes
+    it. The whole covered part is hashed, about a second per GB.
+    """
+    digest = hashlib.sha256()
+    fingerprints, position = {}, 0
+    buffer = memoryview(bytearray(_BLOCK))
+    with open(csv_file, 'rb') as file:
+        for offset in sorted(set(offsets)):
+            while position < offset:
+                read = file.readinto(buffer[:min(_BLOCK, offset - position)])
+                if not read:
+                    break
+                digest.update(buffer[:read])
+                position += read
+            # The size goes last, so the hash of a longer part continues from this one
+            final = digest.copy()
+            final.update(str(offset).encode())
+            fingerprints[offset] = final.hexdigest()
+    return [fingerprints[offset] for offset in offsets]
+
+
+def ledger_fingerprint(csv_file: str, offset: int) -> str:
+    """Hash of the first `offset` bytes of a ledger and of their size, see `ledger_fingerprints`"""
+    return ledger_fingerprints(csv_file, [offset])[0]
+
+
+def write_snapshot(path: str, state: Dict, header: Dict):
+    """
+    Write `state` pickled after a JSON `header` and the checksum of the payload.
+
+    The file is written next to `path` and renamed, so a crash leaves the
+    previous snapshot in place.
+    """
+    payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    header = dict(header, version=VERSION, size=len(payload), crc32=zlib.crc32(payload))
+    encoded = json.dumps(header).encode()
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(MAGIC)
+            file.write(_LENGTH.pack(len(encoded)))
+            file.write(encoded)
+            file.write(payload)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def read_header(path: str) -> Dict:
+    with open(path, 'rb') as file:
+        return _read_header(file)
+
+
+def _read_header(file) -> Dict:
+    if file.read(len(MAGIC)) != MAGIC:
+        raise SnapshotError("Not a portfolio snapshot.")
+    try:
+        (length,) = _LENGTH.unpack(file.read(_LENGTH.size))
+        header = json.loads(file.read(length))
+    except (struct.error, ValueError) as error:
+        raise SnapshotError(f"Corrupt snapshot header: {error}") from None
+    if header.get("version") != VERSION:
+        raise SnapshotError(f"Unsupported snapshot version: {header.get('version')}")
+    return header
+
+
+def read_snapshot(path: str) -> Tuple[Dict, Dict]:
+    """Header and state of a snapshot, `SnapshotError` if it does not match its checksum"""
+    with open(path, 'rb') as file:
+        header = _read_header(file)
+        payload = file.read()
+    if len(payload) != header["size"] or zlib.crc32(payload) != header["crc32"]:
+        raise SnapshotError("Snapshot checksum mismatch.")
+    try:
+        return header, pickle.loads(payload)
+    except Exception as error:
+        raise SnapshotError(f"Corrupt snapshot payload: {error}") from None
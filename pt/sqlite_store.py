@@ -0,0 +1,284 @@
+import sqlite3
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .asset import Assets, Cash, identify_asset
+from .price_history import PriceHistory
+from .transaction import CashFlows, Categories, Transactions
+
+__all__ = ['SQLiteStore']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    asset_type TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    price REAL NOT NULL,
+    transaction_cost REAL NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_symbol_date ON transactions (symbol, date);
+CREATE INDEX IF NOT EXISTS transactions_type_date ON transactions (type, date);
+CREATE TABLE IF NOT EXISTS cash_flows (
+    id INTEGER PRIMARY KEY,
+    currency TEXT NOT NULL,
+    type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    date TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS positions (
+    row INTEGER NOT NULL,
+    symbol TEXT PRIMARY KEY,
+    asset_type TEXT NOT NULL,
+    currency TEXT,
+    amount REAL NOT NULL,
+    total_invested REAL NOT NULL,
+    average_loading_price REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS balances (
+    currency TEXT PRIMARY KEY,
+    amount REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS prices (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+"""
+
+_INSERT_TRANSACTION = ("INSERT INTO transactions (symbol, asset_type, currency, type, amount, price, "
+                       "transaction_cost, date) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+# Same arithmetic as Portfolio.add_transaction, applied row by row by executemany
+_UPSERT_POSITION = """
+INSERT INTO positions (row, symbol, asset_type, currency, amount, total_invested, average_loading_price)
+VALUES ((SELECT COUNT(*) FROM positions), :symbol, :asset_type, :currency,
+        :signed, :signed * :price, CASE WHEN :type = 'buy' THEN :price ELSE 0 END)
+ON CONFLICT (symbol) DO UPDATE SET
+    average_loading_price = CASE WHEN :type = 'buy'
+        THEN CASE WHEN amount + :amount = 0 THEN 0
+                  ELSE (average_loading_price * amount + :amount * :price) / (amount + :amount) END
+        ELSE average_loading_price END,
+    amount = amount + :signed,
+    total_invested = total_invested + :signed * :price
+"""
+
+_PERFORMANCE = """
+SELECT symbol, amount, invested, amount * price, amount * price - invested,
+       CASE WHEN invested > 0 THEN (amount * price - invested) / invested * 100 ELSE 0 END
+FROM (
+    SELECT t.symbol AS symbol, MIN(t.id) AS first,
+           SUM(CASE t.type WHEN 'buy' THEN t.amount WHEN 'sell' THEN -t.amount ELSE 0 END) AS amount,
+           SUM(CASE t.type WHEN 'buy' THEN t.amount * t.price WHEN 'sell' THEN -t.amount * t.price ELSE 0 END)
+               AS invested,
+           (SELECT p.close FROM prices p WHERE p.symbol = t.symbol AND p.date <= :as_of
+            ORDER BY p.date DESC LIMIT 1) AS price
+    FROM transactions t
+    WHERE t.date <= :as_of
+    GROUP BY t.symbol
+)
+ORDER BY first
+"""
+
+
+def _iso(days: np.ndarray) -> List[str]:
+    return days.astype('datetime64[D]').astype(str).tolist()
+
+
+class SQLiteStore:
+    """
+    Portfolio stored in a SQLite database: the ledger, cash flows, positions,
+    cash balances and cached daily prices.
+
+    The database runs in WAL mode, so a reader, e.g. a dashboard running
+    `performance`, is not blocked by a writer appending transactions. Rows are
+    written by `executemany` inside one transaction per call. Lookups by symbol
+    or by type within a date range use the (symbol, date) and (type, date)
+    indexes, and `performance` aggregates positions in SQL without loading the
+    ledger.
+
+    path : str
+        Database file, created if needed
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def save(self, portfolio):
+        """Replace the stored portfolio"""
+        transactions, flows, assets = portfolio.transactions, portfolio.cash_flows, portfolio.assets
+        with self.connection:
+            for table in ("transactions", "cash_flows", "positions", "balances"):
+                self.connection.execute(f"DELETE FROM {table}")
+            self._insert_transactions(transactions)
+            self.connection.executemany(
+                "INSERT INTO cash_flows (currency, type, amount, date, position) VALUES (?, ?, ?, ?, ?)",
+                zip(flows.values('currency'), flows.values('type'), flows.column('amount').tolist(),
+                    _iso(flows.column('day')), flows.column('position').tolist()))
+            self.connection.executemany(
+                "INSERT INTO positions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                zip(range(len(assets)), assets.keys(), (asset.asset_type() for asset in assets.values()),
+                    (asset.currency for asset in assets.values()), assets.column('amount').tolist(),
+                    assets.column('total_invested').tolist(), assets.column('average_loading_price').tolist()))
+            self.connection.executemany("INSERT INTO balances VALUES (?, ?)", portfolio.cash.balances.items())
+
+    def _insert_transactions(self, transactions: Transactions):
+        self.connection.executemany(_INSERT_TRANSACTION, zip(
+            transactions.values('symbol'), transactions.values('asset_type'), transactions.values('currency'),
+            transactions.values('type'), transactions.amounts.tolist(), transactions.prices.tolist(),
+            transactions.transaction_costs.tolist(), _iso(transactions.column('day'))))
+
+    def append(self, transactions: Transactions):
+        """
+        Append transactions and apply them to the stored positions and cash balances,
+        in one database transaction.
+
+        Cash is settled with the checks of `Cash.asset_bought` and `Cash.asset_sold`,
+        so a trade the loader would refuse raises and leaves the database unchanged.
+        """
+        with self.connection:
+            # Read and write the balances under one write lock
+            self.connection.execute("BEGIN IMMEDIATE")
+            cash = Cash()
+            cash.balances = dict(self.connection.execute("SELECT currency, amount FROM balances"))
+            trades = []
+            for symbol, asset_type, currency, type, amount, price, cost in zip(
+                    transactions.values('symbol'), transactions.values('asset_type'),
+                    transactions.values('currency'), transactions.values('type'), transactions.amounts.tolist(),
+                    transactions.prices.tolist(), transactions.transaction_costs.tolist()):
+                if type == 'buy':
+                    cash.asset_bought(currency, amount * price, cost)
+                elif type == 'sell':
+                    cash.asset_sold(currency, amount * price, cost)
+                else:
+                    continue
+                trades.append({'symbol': symbol, 'asset_type': asset_type, 'currency': currency, 'type': type,
+                               'amount': amount, 'price': price, 'signed': amount if type == 'buy' else -amount})
+            self._insert_transactions(transactions)
+            self.connection.executemany(_UPSERT_POSITION, trades)
+            self.connection.executemany("INSERT OR REPLACE INTO balances VALUES (?, ?)", cash.balances.items())
+
+    def load_state(self) -> Tuple[Assets, Cash, Transactions, CashFlows]:
+        """Assets, cash, ledger and cash flows of the stored portfolio, the ledger read into columns"""
+        assets = Assets()
+        positions = self.connection.execute(
+            "SELECT symbol, asset_type, currency, amount, total_invested, average_loading_price "
+            "FROM positions ORDER BY row").fetchall()
+        for symbol, asset_type, currency, *_ in positions:
+            assets[symbol] = identify_asset(asset_type)(name=symbol, currency=currency)
+        if positions:
+            values = np.array([position[3:] for position in positions], dtype=np.float64)
+            for i, column in enumerate(('amount', 'total_invested', 'average_loading_price')):
+                assets.holdings.column(column)[:] = values[:, i]
+        cash = Cash()
+        cash.balances = dict(self.connection.execute("SELECT currency, amount FROM balances"))
+        flows = CashFlows()
+        rows = self.connection.execute(
+            "SELECT currency, type, date, amount, position FROM cash_flows ORDER BY id").fetchall()
+        if rows:
+            currencies, types, dates, amounts, positions = zip(*rows)
+            flows.append_columns({
+                'currency': flows.categories['currency'].encode(currencies),
+                'type': flows.categories['type'].encode(types),
+                'day': np.array(dates, dtype='datetime64[D]').astype(np.int32),
+                'amount': np.array(amounts, dtype=np.float64),
+                'position': np.array(positions, dtype=np.int64),
+            })
+        return assets, cash, self.transactions(), flows
+
+    def transactions(self, symbol: str = None, type: str = None, start=None, end=None) -> Transactions:
+        """
+        Columnar ledger of the matching rows, in ledger order.
+
+        start : str
+            First date included (YYYY-MM-DD)
+        end : str
+            First date excluded
+        """
+        clauses, parameters = [], []
+        for column, value in (('symbol', symbol), ('type', type)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                parameters.append(value)
+        if start is not None:
+            clauses.append("date >= ?")
+            parameters.append(str(np.datetime64(start, 'D')))
+        if end is not None:
+            clauses.append("date < ?")
+            parameters.append(str(np.datetime64(end, 'D')))
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.connection.execute(
+            "SELECT symbol, asset_type, type, currency, date, amount, price, transaction_cost "
+            f"FROM transactions{where} ORDER BY id", parameters).fetchall()
+        categories = {name: Categories() for name in Transactions.CATEGORIES}
+        if not rows:
+            return Transactions.from_columns({name: np.empty(0, dtype) for name, dtype in Transactions.DTYPES.items()},
+                                             categories)
+        symbols, asset_types, types, currencies, dates, amounts, prices, costs = zip(*rows)
+        return Transactions.from_columns({
+            'symbol': categories['symbol'].encode(symbols),
+            'asset_type': categories['asset_type'].encode(asset_types),
+            'type': categories['type'].encode(types),
+            'currency': categories['currency'].encode(currencies),
+            'day': np.array(dates, dtype='datetime64[D]').astype(np.int32),
+            'amount': np.array(amounts, dtype=np.float64),
+            'price': np.array(prices, dtype=np.float64),
+            'transaction_cost': np.array(costs, dtype=np.float64),
+        }, categories)
+
+    def store_prices(self, symbol: str, history: PriceHistory):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO prices (symbol, date, close) VALUES (?, ?, ?)",
+                zip([symbol] * len(history), history.dates.astype(str).tolist(), history.close.tolist()))
+
+    def prices(self, symbol: str, start=None, end=None) -> PriceHistory:
+        """Cached closes of `symbol` with start <= date < end"""
+        rows = self.connection.execute(
+            "SELECT date, close FROM prices WHERE symbol = ? AND date >= ? AND date < ? ORDER BY date",
+            (symbol, str(np.datetime64(start, 'D')) if start is not None else "",
+             str(np.datetime64(end, 'D')) if end is not None else "9999-12-31")).fetchall()
+        dates, closes = zip(*rows) if rows else ((), ())
+        return PriceHistory(np.array(dates, dtype='datetime64[D]'), np.array(closes, dtype=np.float64))
+
+    def performance(self, as_of=None) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, float]]:
+        """
+        Positions valued at the last cached price on or before `as_of`, computed in SQL.
+
+        Returns the symbols, then per-symbol arrays and totals like `Holdings.performance`,
+        with the amount and total invested added to the per-symbol arrays. A symbol
+        without a cached price is valued NaN.
+        """
+        as_of = str(np.datetime64(as_of, 'D')) if as_of is not None else "9999-12-31"
+        rows = self.connection.execute(_PERFORMANCE, {'as_of': as_of}).fetchall()
+        symbols = [row[0] for row in rows]
+        values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), 5)
+        performance = dict(zip(('amount', 'total_invested', 'current_value', 'profit_loss',
+                                'profit_loss_percentage'), values.T))
+        total_invested = values[:, 1].sum()
+        total_profit_loss = values[:, 4].sum()
+        total = {
+            'current_value': float(values[:, 2].sum()),
+            'profit_loss': float(total_profit_loss),
+            'profit_loss_percentage': float(total_profit_loss / total_invested * 100) if total_invested > 0 else 0.0
+        }
+        return symbols, performance, total
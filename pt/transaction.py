@@ -1,12 +1,10 @@
+from array import array
+from bisect import bisect_left, bisect_right
 from datetime import datetime
-from pt.asset import Asset
+from pt.asset import Asset, identify_asset
 
-from .richtools import repr_rich
-from rich import box
-from rich.panel import Panel
-from rich.table import Table
-
-from typing import Literal, Union
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Literal, Optional, Union
 
 # AssetType = Literal["Stock", "ETF", "Crypto", "Bond"]
 TransactionType = Literal["buy", "sell"]
@@ -24,8 +22,11 @@ class Transaction:
 
     def to_csv_row(self):
         return [self.asset.name, self.asset.asset_type(), self.currency, self.type, self.amount, self.price, self.transaction_cost, self.date]
-    
+
     def __rich__(self):
+        from rich import box
+        from rich.panel import Panel
+        from rich.table import Table
         # Create a table with the transaction information
         table = Table(title=self.asset.name, box=box.SIMPLE, show_header=False)
         table.add_column("Attribute")
@@ -37,39 +38,357 @@ class Transaction:
         table.add_row("Transaction Cost", f"${self.transaction_cost:.2f}")
         table.add_row("Date", self.date)
         return Panel(table, title="Transaction Information")
-    
+
     def __repr__(self):
+        from .richtools import repr_rich
         return repr_rich(self)
 
-class Transactions(list):
-    def __init__(self, *args, transactions_per_page=20):
-        if any(not isinstance(transaction, Transaction) for transaction in args):
-            raise ValueError("Only Transaction objects can be appended")
-        super().__init__(*args)
+
+class Categories:
+    """Dictionary encoding of a string column: `values[code]` is the string of `code`"""
+
+    def __init__(self, values: Iterable[str] = ()):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, values: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.code(value) for value in values), dtype=np.int32)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.asarray(self.values, dtype=object)[codes] if len(self.values) else np.empty(len(codes), dtype=object)
+
+
+def to_day(date) -> int:
+    """Day number (days since 1970-01-01) of a date string or datetime"""
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+class DateIndex:
+    """
+    Row positions sorted by day, searched with bisect.
+
+    Both arrays are compact int32 `array.array`s. Rows appended in date order are
+    added at the end, older dates are inserted at their place.
+    """
+
+    __slots__ = ('days', 'rows')
+
+    def __init__(self):
+        self.days = array('i')
+        self.rows = array('i')
+
+    @classmethod
+    def build(cls, days: np.ndarray, rows: np.ndarray) -> 'DateIndex':
+        index = cls()
+        order = np.argsort(days, kind="stable")
+        index.days.frombytes(np.ascontiguousarray(days[order], dtype=np.int32).tobytes())
+        index.rows.frombytes(np.ascontiguousarray(rows[order], dtype=np.int32).tobytes())
+        return index
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, day: int, row: int):
+        if not self.days or day >= self.days[-1]:
+            self.days.append(day)
+            self.rows.append(row)
+        else:
+            position = bisect_right(self.days, day)
+            self.days.insert(position, day)
+            self.rows.insert(position, row)
+
+    def range(self, start: Optional[int] = None, end: Optional[int] = None) -> np.ndarray:
+        """Rows with start <= day < end, in date order"""
+        lo = 0 if start is None else bisect_left(self.days, start)
+        hi = len(self.days) if end is None else bisect_left(self.days, end)
+        return np.frombuffer(self.rows[lo:hi], dtype=np.int32).astype(np.intp)
+
+
+class Transactions:
+    """
+    Columnar transaction ledger.
+
+    Symbols, asset types, transaction types and currencies are dictionary-encoded
+    into int32 code columns, dates are int32 day numbers and amount, price and
+    transaction cost are float64 columns. A `Transaction` object is only built
+    when a single row is indexed or iterated over; slicing, filtering, paging
+    and export work on the columns.
+
+    `query` answers lookups by symbol and date range from secondary indexes, a
+    date index over all rows and one per symbol. They are built on the first
+    query and then kept up to date by every appended row.
+    """
+
+    CATEGORIES = ('symbol', 'asset_type', 'type', 'currency')
+    DTYPES = {
+        'symbol': np.int32,
+        'asset_type': np.int32,
+        'type': np.int32,
+        'currency': np.int32,
+        'day': np.int32,
+        'amount': np.float64,
+        'price': np.float64,
+        'transaction_cost': np.float64,
+    }
+
+    def __init__(self, *transactions, transactions_per_page=20):
+        # Accept both Transactions(t1, t2) and Transactions([t1, t2])
+        if len(transactions) == 1 and not isinstance(transactions[0], Transaction):
+            transactions = transactions[0]
+        self.categories: Dict[str, Categories] = {name: Categories() for name in self.CATEGORIES}
+        self._data = {name: np.empty(16, dtype=dtype) for name, dtype in self.DTYPES.items()}
+        self._size = 0
+        self._indexes = None
         self.transactions_per_page = transactions_per_page
         self._current_page = None
+        self.extend(transactions)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray], categories: Dict[str, Categories],
+                     transactions_per_page=20) -> 'Transactions':
+        """Build a ledger from code and value columns, sharing the given dictionaries"""
+        transactions = cls(transactions_per_page=transactions_per_page)
+        transactions.categories = categories
+        transactions._data = {name: np.ascontiguousarray(columns[name], dtype=dtype)
+                              for name, dtype in cls.DTYPES.items()}
+        transactions._size = len(transactions._data['day'])
+        return transactions
+
+    def __len__(self):
+        return self._size
+
+    def __getstate__(self):
+        # Only the used rows are pickled, the indexes are rebuilt by the next query
+        state = self.__dict__.copy()
+        state['_data'] = {name: self.column(name) for name in self.DTYPES}
+        state['_indexes'] = None
+        return state
+
+    def column(self, name: str) -> np.ndarray:
+        """Raw column: codes for the categories, day numbers for 'day', values otherwise"""
+        return self._data[name][:self._size]
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.column('day').astype('datetime64[D]')
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self.column('amount')
+
+    @property
+    def prices(self) -> np.ndarray:
+        return self.column('price')
+
+    @property
+    def transaction_costs(self) -> np.ndarray:
+        return self.column('transaction_cost')
+
+    def values(self, name: str) -> np.ndarray:
+        """Decoded strings of a category column"""
+        return self.categories[name].decode(self.column(name))
+
+    def _reserve(self, size: int):
+        capacity = len(self._data['day'])
+        if size <= capacity:
+            return
+        capacity = max(capacity, 16)
+        while capacity < size:
+            capacity *= 2
+        for name, values in self._data.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self._size] = values[:self._size]
+            self._data[name] = grown
+
+    def append_row(self, symbol: str, asset_type: str, type: str, currency: str, amount: float, price: float,
+                   transaction_cost: float, date=None):
+        row = self._size
+        self._reserve(row + 1)
+        data, categories = self._data, self.categories
+        data['symbol'][row] = categories['symbol'].code(symbol)
+        data['asset_type'][row] = categories['asset_type'].code(asset_type)
+        data['type'][row] = categories['type'].code(type)
+        data['currency'][row] = categories['currency'].code(currency)
+        data['day'][row] = to_day(date or datetime.now().strftime("%Y-%m-%d"))
+        data['amount'][row] = amount
+        data['price'][row] = price
+        data['transaction_cost'][row] = transaction_cost
+        self._size = row + 1
+        if self._indexes is not None:
+            self._index_row(row)
+        return row
+
+    def append_columns(self, columns: Dict[str, np.ndarray]):
+        """Append rows given as code and value columns, with codes of this ledger's categories"""
+        start, size = self._size, len(columns['day'])
+        self._reserve(start + size)
+        for name in self.DTYPES:
+            self._data[name][start:start + size] = columns[name]
+        self._size = start + size
+        # Rebuilt on the next query, cheaper than inserting a bulk load row by row
+        self._indexes = None
+
+    def append(self, transaction):
+        if not isinstance(transaction, Transaction):
+            raise ValueError("Only Transaction objects can be appended")
+        self.append_row(transaction.asset.name, transaction.asset.asset_type(), transaction.type,
+                        transaction.currency, transaction.amount, transaction.price,
+                        transaction.transaction_cost, transaction.date)
+
+    def extend(self, transactions: Iterable[Transaction]):
+        for transaction in transactions:
+            self.append(transaction)
+
+    def _row(self, row: int) -> Transaction:
+        data, categories = self._data, self.categories
+        symbol = categories['symbol'].values[data['symbol'][row]]
+        currency = categories['currency'].values[data['currency'][row]]
+        asset = identify_asset(categories['asset_type'].values[data['asset_type'][row]])(name=symbol, currency=currency)
+        return Transaction(asset, categories['type'].values[data['type'][row]], currency,
+                           float(data['amount'][row]), float(data['price'][row]),
+                           float(data['transaction_cost'][row]), str(data['day'][row].astype('datetime64[D]')))
+
+    def take(self, rows) -> 'Transactions':
+        """New ledger with the given rows (slice, positions or boolean mask)"""
+        return Transactions.from_columns({name: self.column(name)[rows] for name in self.DTYPES},
+                                         self.categories, self.transactions_per_page)
 
     # If access the item by index, return the transaction
     def __getitem__(self, index) -> Union[Transaction, 'Transactions']:
-        return super().__getitem__(index)
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += self._size
+            if not 0 <= index < self._size:
+                raise IndexError("Transaction index out of range")
+            return self._row(int(index))
+        return self.take(index)
+
+    def __iter__(self) -> Iterator[Transaction]:
+        for row in range(self._size):
+            yield self._row(row)
 
     @property
     def current_page(self):
         if self._current_page is None:
             self._current_page = self.total_pages()
         return self._current_page
-    
-    def append(self, transaction):
-        if not isinstance(transaction, Transaction):
-            raise ValueError("Only Transaction objects can be appended")
-        super().append(transaction)
 
     def add_transaction(self, asset_name, amount, price, transaction_type):
         transaction = Transaction(asset_name, amount, price, transaction_type)
         self.append(transaction)
 
+    def _build_indexes(self):
+        days, symbols = self.column('day'), self.column('symbol')
+        rows = np.arange(self._size)
+        by_symbol = {}
+        if self._size:
+            order = np.argsort(symbols, kind="stable")
+            bounds = np.flatnonzero(np.diff(symbols[order])) + 1
+            for group in np.split(order, bounds):
+                by_symbol[int(symbols[group[0]])] = DateIndex.build(days[group], rows[group])
+        self._indexes = {'date': DateIndex.build(days, rows), 'symbol': by_symbol}
+
+    def _index_row(self, row: int):
+        day, symbol = int(self._data['day'][row]), int(self._data['symbol'][row])
+        self._indexes['date'].add(day, row)
+        if symbol not in self._indexes['symbol']:
+            self._indexes['symbol'][symbol] = DateIndex()
+        self._indexes['symbol'][symbol].add(day, row)
+
+    def rows(self, symbol: str = None, type: str = None, currency: str = None, start=None, end=None) -> np.ndarray:
+        """
+        Positions of the rows matching every given criterion, in ledger order.
+
+        start : str
+            First date included (YYYY-MM-DD or datetime)
+        end : str
+            First date excluded
+
+        The symbol or date index narrows the search to the k rows of the symbol in
+        the date range with two bisections, type and currency are then checked on
+        those k rows only.
+        """
+        if self._indexes is None:
+            self._build_indexes()
+        start = None if start is None else to_day(start)
+        end = None if end is None else to_day(end)
+        if symbol is None:
+            index = self._indexes['date']
+        else:
+            index = self._indexes['symbol'].get(self.categories['symbol'].codes.get(symbol))
+            if index is None:
+                return np.empty(0, dtype=np.intp)
+        rows = index.range(start, end)
+        for name, value in (('type', type), ('currency', currency)):
+            if value is not None:
+                code = self.categories[name].codes.get(value)
+                rows = rows[self._data[name][rows] == code] if code is not None else rows[:0]
+        return np.sort(rows)
+
+    def query(self, symbol: str = None, type: str = None, currency: str = None, start=None, end=None) -> 'Transactions':
+        """
+        Transactions matching every given criterion, e.g. all the sells of AAPL in 2023:
+        `query(symbol="AAPL", type="sell", start="2023-01-01", end="2024-01-01")`
+        """
+        return self.take(self.rows(symbol, type, currency, start, end))
+
     def filter_by_asset(self, asset_name) -> 'Transactions':
-        return Transactions([transaction for transaction in self if transaction.name == asset_name])
+        return self.query(symbol=asset_name)
+
+    def filter_by_date(self, start=None, end=None) -> 'Transactions':
+        return self.query(start=start, end=end)
+
+    def to_arrow(self):
+        """Arrow table with dictionary-encoded categories, sharing the value columns"""
+        from .arrow_io import transactions_to_arrow
+        return transactions_to_arrow(self)
+
+    @classmethod
+    def from_arrow(cls, table, transactions_per_page=20) -> 'Transactions':
+        from .arrow_io import transactions_from_arrow
+        return transactions_from_arrow(table, transactions_per_page)
+
+    def to_parquet(self, path: str):
+        from .arrow_io import write_table
+        write_table(self.to_arrow(), path, "parquet")
+
+    @classmethod
+    def from_parquet(cls, path: str) -> 'Transactions':
+        from .arrow_io import read_table
+        return cls.from_arrow(read_table(path, format="parquet"))
+
+    def to_ipc(self, path: str):
+        """Write an Arrow IPC file, see `from_ipc`"""
+        from .arrow_io import write_table
+        write_table(self.to_arrow(), path, "arrow")
+
+    @classmethod
+    def from_ipc(cls, path: str, memory_map: bool = True) -> 'Transactions':
+        """
+        Read an Arrow IPC file. When memory-mapped the value and code columns are
+        read-only views on the file until rows are appended.
+        """
+        from .arrow_io import read_table
+        return cls.from_arrow(read_table(path, memory_map, "arrow"))
+
+    def to_csv_rows(self) -> Iterator[list]:
+        """Rows in the CSV format of `Transaction.to_csv_row`, read from the columns"""
+        columns = [self.values('symbol'), self.values('asset_type'), self.values('currency'), self.values('type'),
+                   self.amounts.tolist(), self.prices.tolist(), self.transaction_costs.tolist(),
+                   self.dates.astype(str)]
+        return (list(row) for row in zip(*columns))
 
     def first_page(self):
         self._current_page = 1
@@ -111,6 +430,8 @@ class Transactions(list):
         return self[start:end]
 
     def __rich__(self) -> str:
+        from rich.panel import Panel
+        from rich.table import Table
         table = Table(box=None, show_header=True)
         table.add_column("Asset Name")
         table.add_column("Amount")
@@ -119,18 +440,114 @@ class Transactions(list):
         table.add_column("Transaction Cost")
         table.add_column("Date")
 
-        for transaction in self.get_paginated_transactions():
+        page = self.get_paginated_transactions()
+        rows = zip(page.values('symbol'), page.amounts.tolist(), page.prices.tolist(), page.values('type'),
+                   page.transaction_costs.tolist(), page.dates.astype(str))
+        for name, amount, price, transaction_type, transaction_cost, date in rows:
             table.add_row(
-                transaction.asset.name,
-                str(transaction.amount),
-                f"${transaction.price:.2f}",
-                transaction.type,
-                f"${transaction.transaction_cost:.2f}",
-                transaction.date
+                name,
+                str(amount),
+                f"${price:.2f}",
+                transaction_type,
+                f"${transaction_cost:.2f}",
+                date
             )
 
         return Panel(table, title=f"Transactions (Page {self.current_page}/{self.total_pages()})")
 
     def __repr__(self):
+        from .richtools import repr_rich
         return repr_rich(self)
 
+
+class CashFlows:
+    """
+    Columnar log of deposits and withdrawals.
+
+    `position` is the number of ledger rows recorded before the flow, so the
+    flows can be put back between the transactions they happened among, e.g.
+    when the portfolio is saved.
+    """
+
+    DTYPES = {
+        'currency': np.int32,
+        'type': np.int32,
+        'day': np.int32,
+        'amount': np.float64,
+        'position': np.int64,
+    }
+
+    def __init__(self):
+        self.categories: Dict[str, Categories] = {'currency': Categories(), 'type': Categories()}
+        self._data = {name: np.empty(16, dtype=dtype) for name, dtype in self.DTYPES.items()}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_data'] = {name: self.column(name) for name in self.DTYPES}
+        return state
+
+    def column(self, name: str) -> np.ndarray:
+        return self._data[name][:self._size]
+
+    def values(self, name: str) -> np.ndarray:
+        return self.categories[name].decode(self.column(name))
+
+    def _reserve(self, size: int):
+        capacity = len(self._data['day'])
+        if size <= capacity:
+            return
+        capacity = max(capacity, 16)
+        while capacity < size:
+            capacity *= 2
+        for name, values in self._data.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self._size] = values[:self._size]
+            self._data[name] = grown
+
+    def append_row(self, currency: str, type: str, amount: float, position: int, date=None):
+        row = self._size
+        self._reserve(row + 1)
+        self._data['currency'][row] = self.categories['currency'].code(currency)
+        self._data['type'][row] = self.categories['type'].code(type)
+        self._data['day'][row] = to_day(date or datetime.now().strftime("%Y-%m-%d"))
+        self._data['amount'][row] = amount
+        self._data['position'][row] = position
+        self._size = row + 1
+        return row
+
+    def append_columns(self, columns: Dict[str, np.ndarray]):
+        """Append flows given as code and value columns, with codes of this log's categories"""
+        start, size = self._size, len(columns['day'])
+        self._reserve(start + size)
+        for name in self.DTYPES:
+            self._data[name][start:start + size] = columns[name]
+        self._size = start + size
+
+    def csv_row(self, row: int) -> list:
+        currency = self.categories['currency'].values[self._data['currency'][row]]
+        return [currency, 'Cash', currency, self.categories['type'].values[self._data['type'][row]],
+                float(self._data['amount'][row]), 1.0, 0.0, str(self._data['day'][row].astype('datetime64[D]'))]
+
+    def to_csv_rows(self) -> Iterator[list]:
+        """Rows in the transaction CSV format, a unit price of 1 and no transaction cost"""
+        currencies = self.values('currency')
+        columns = [currencies, ['Cash'] * self._size, currencies, self.values('type'),
+                   self.column('amount').tolist(), [1.0] * self._size, [0.0] * self._size,
+                   self.column('day').astype('datetime64[D]').astype(str)]
+        return (list(row) for row in zip(*columns))
+
+    def merge_csv_rows(self, transactions: Transactions) -> Iterator[list]:
+        """CSV rows of `transactions` with the flows put back at their positions"""
+        positions = self.column('position').tolist()
+        flows = self.to_csv_rows()
+        flow = 0
+        for row, transaction in enumerate(transactions.to_csv_rows()):
+            while flow < len(positions) and positions[flow] <= row:
+                yield next(flows)
+                flow += 1
+            yield transaction
+        yield from flows
@@ -0,0 +1,238 @@
+from typing import List, Mapping, Optional, Union
+
+import numpy as np
+
+from .fx import FXRates, get_fx_rates
+from .price_history import PriceHistory
+from .price_matrix import PriceMatrix
+from .transaction import CashFlows, Categories, Transactions, to_day
+
+__all__ = ['Valuation', 'first_ledger_day', 'trade_flows', 'valuation_series']
+
+Prices = Union[PriceMatrix, Mapping[str, PriceHistory]]
+
+
+class Valuation:
+    """
+    Daily valuation of a portfolio over consecutive calendar days.
+
+    Every series has one value per day of `dates`, taken at the end of the day.
+    Matrices have one row per day and one column per symbol or currency.
+
+    holdings : ndarray
+        Amount held of each of `symbols`
+    prices : ndarray
+        Last price of each symbol on or before the day, NaN before the first one
+    market_value : ndarray
+        Value of the holdings, NaN on days a held symbol has no price
+    balances : ndarray
+        Cash held in each of `currencies`, never converted
+    cash : ndarray
+        Sum of the balances
+    invested : ndarray
+        Net capital invested, the running sum of amount * price of buys less sells like `total_invested`
+    flows : ndarray
+        Deposits less withdrawals of each day
+
+    With a valuation currency, prices, market value, cash, invested capital and
+    flows are converted into it, each amount at the rate of its own day.
+    """
+
+    __slots__ = ('dates', 'symbols', 'currencies', 'holdings', 'prices', 'market_value', 'balances', 'cash',
+                 'invested', 'flows', 'currency')
+
+    def __init__(self, dates, symbols, currencies, holdings, prices, market_value, balances, cash, invested, flows,
+                 currency=None):
+        self.dates: np.ndarray = dates
+        self.symbols: List[str] = symbols
+        self.currencies: List[str] = currencies
+        self.holdings: np.ndarray = holdings
+        self.prices: np.ndarray = prices
+        self.market_value: np.ndarray = market_value
+        self.balances: np.ndarray = balances
+        self.cash: np.ndarray = cash
+        self.invested: np.ndarray = invested
+        self.flows: np.ndarray = flows
+        self.currency: Optional[str] = currency
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        if not len(self):
+            return "Valuation([])"
+        return (f"Valuation({len(self)} days from {self.dates[0]} to {self.dates[-1]}, "
+                f"{len(self.symbols)} symbols, {len(self.currencies)} currencies)")
+
+    @property
+    def total(self) -> np.ndarray:
+        """Market value plus cash"""
+        return self.market_value + self.cash
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame({'market_value': self.market_value, 'cash': self.cash, 'total': self.total,
+                             'invested': self.invested, 'flows': self.flows},
+                            index=pd.DatetimeIndex(self.dates, name="Date"))
+
+
+def _signs(categories: Categories, positive: str, negative: str) -> np.ndarray:
+    """+1, -1 or 0 per category code, so a code column maps to signs in one lookup"""
+    return np.array([1.0 if value.lower() == positive else -1.0 if value.lower() == negative else 0.0
+                     for value in categories.values], dtype=np.float64)
+
+
+def _aligned_prices(prices: Prices, symbols: List[str], calendar: np.ndarray) -> np.ndarray:
+    """Price as of each day of `calendar` per symbol, NaN where unknown"""
+    aligned = np.full((len(calendar), len(symbols)), np.nan)
+    if isinstance(prices, PriceMatrix):
+        known = [column for column, symbol in enumerate(symbols) if symbol in prices.columns]
+        if known and len(prices):
+            rows = np.searchsorted(prices.dates, calendar, side="right") - 1
+            values = prices.values[np.ix_(np.maximum(rows, 0), [prices.columns[symbols[i]] for i in known])]
+            values[rows < 0] = np.nan
+            aligned[:, known] = values
+        return aligned
+    for column, symbol in enumerate(symbols):
+        history = prices.get(symbol)
+        if history is not None:
+            aligned[:, column] = history.asof_many(calendar)
+    return aligned
+
+
+def _daily(rows: np.ndarray, columns: np.ndarray, values: np.ndarray, days: int, width: int) -> np.ndarray:
+    """Sum of `values` per (day, column) cell, as a days x width matrix"""
+    return np.bincount(rows * width + columns, values, minlength=days * width).reshape(days, width)
+
+
+def first_ledger_day(transactions: Transactions, cash_flows: CashFlows) -> Optional[int]:
+    """Day number of the earliest transaction or cash flow, None for an empty ledger"""
+    days = [int(column.min()) for column in (transactions.column('day'), cash_flows.column('day')) if len(column)]
+    return min(days) if days else None
+
+
+def trade_flows(transactions: Transactions, symbols: List[str], start, end) -> np.ndarray:
+    """
+    Money put into each of `symbols` on every day with start <= date < end, as a day x symbol matrix.
+
+    A purchase puts in its value and transaction cost, a sale takes out its
+    value less the cost. Rows of other symbols are ignored.
+    """
+    start, end = to_day(start), to_day(end)
+    days = transactions.column('day')
+    signs = _signs(transactions.categories['type'], 'buy', 'sell')[transactions.column('type')]
+    lookup = np.full(len(transactions.categories['symbol']), -1, dtype=np.intp)
+    codes = transactions.categories['symbol'].codes
+    for column, symbol in enumerate(symbols):
+        if symbol in codes:
+            lookup[codes[symbol]] = column
+    columns = lookup[transactions.column('symbol')]
+    rows = np.flatnonzero((signs != 0) & (columns >= 0) & (days >= start) & (days < end))
+    flows = signs[rows] * transactions.amounts[rows] * transactions.prices[rows] + transactions.transaction_costs[rows]
+    return _daily((days[rows] - start).astype(np.intp), columns[rows], flows, end - start, len(symbols))
+
+
+def valuation_series(transactions: Transactions, cash_flows: CashFlows, prices: Prices, start=None, end=None,
+                     currency: str = None, fx: FXRates = None) -> Valuation:
+    """
+    Value a ledger on every day with start <= date < end by vectorized replay.
+
+    Buys and sells become per-day position deltas, summed into a day x symbol
+    matrix by one `bincount` and accumulated by a cumulative sum down the days;
+    the holdings are then valued with prices aligned on the same calendar.
+    Cash follows the rules of `LedgerLoader`: deposits and sales add to the
+    balance of their currency, withdrawals and purchases, with their
+    transaction cost, take from it. Rows before `start` make up the opening
+    state, rows from `end` on are ignored.
+
+    prices : PriceMatrix or dict
+        Price matrix, or PriceHistory per symbol
+    start, end : str
+        First day valued, the first ledger day by default, and first day not
+        valued, the day after today or after the last ledger day by default
+    currency : str
+        Convert every amount into this currency with the historical rates of `fx`
+    """
+    days = transactions.column('day')
+    flow_days = cash_flows.column('day')
+    if start is None:
+        start = first_ledger_day(transactions, cash_flows)
+        if start is None:
+            raise ValueError("No ledger rows to value.")
+    else:
+        start = to_day(start)
+    if end is None:
+        end = max(to_day(np.datetime64("today", "D")), int(days.max()) if len(days) else 0,
+                  int(flow_days.max()) if len(flow_days) else 0) + 1
+    else:
+        end = to_day(end)
+    if end <= start:
+        raise ValueError("End of the valuation must be after its start.")
+    calendar = np.arange(start, end).astype("datetime64[D]")
+    count = len(calendar)
+
+    # Trades
+    signs = _signs(transactions.categories['type'], 'buy', 'sell')[transactions.column('type')]
+    traded = np.flatnonzero((signs != 0) & (days < end))
+    rows = np.maximum(days[traded] - start, 0).astype(np.intp)
+    signed = signs[traded] * transactions.amounts[traded]
+    value = transactions.amounts[traded] * transactions.prices[traded]
+    symbol_codes = transactions.column('symbol')[traded]
+    used = np.unique(symbol_codes)
+    symbol_names = transactions.categories['symbol'].values
+    symbols = [symbol_names[code] for code in used.tolist()]
+    columns = np.searchsorted(used, symbol_codes)
+    holdings = np.cumsum(_daily(rows, columns, signed, count, len(symbols)), axis=0)
+
+    # Cash movements, in the currencies of both the ledger and the flows
+    trade_currency = transactions.categories['currency'].values
+    flow_currency = cash_flows.categories['currency'].values
+    currencies = list(dict.fromkeys(trade_currency + flow_currency))
+    lookup = {name: code for code, name in enumerate(currencies)}
+    trade_currencies = np.array([lookup[name] for name in trade_currency], dtype=np.intp)[
+        transactions.column('currency')[traded]] if len(traded) else np.empty(0, dtype=np.intp)
+    flow_signs = _signs(cash_flows.categories['type'], 'deposit', 'withdraw')[cash_flows.column('type')]
+    flowed = np.flatnonzero((flow_signs != 0) & (flow_days < end))
+    flow_rows = np.maximum(flow_days[flowed] - start, 0).astype(np.intp)
+    flow_amounts = flow_signs[flowed] * cash_flows.column('amount')[flowed]
+    flow_currencies = np.array([lookup[name] for name in flow_currency], dtype=np.intp)[
+        cash_flows.column('currency')[flowed]] if len(flowed) else np.empty(0, dtype=np.intp)
+    costs = transactions.transaction_costs[traded]
+    trade_cash = np.where(signs[traded] > 0, -(value + costs), value - costs)
+    balances = np.cumsum(
+        _daily(rows, trade_currencies, trade_cash, count, len(currencies))
+        + _daily(flow_rows, flow_currencies, flow_amounts, count, len(currencies)), axis=0)
+
+    # Flows before `start` are part of the opening state, not flows of the first day
+    in_range = flow_days[flowed] >= start
+    invested_values = signs[traded] * value
+    flow_values = flow_amounts[in_range]
+    aligned = _aligned_prices(prices, symbols, calendar)
+    cash_rates = np.ones((count, len(currencies)))
+    if currency is not None:
+        fx = fx if fx is not None else get_fx_rates()
+        for code, name in enumerate(currencies):
+            cash_rates[:, code] = fx.rates(name, currency, calendar)
+        # Symbols are quoted in the currency of their first trade
+        _, first = np.unique(columns, return_index=True)
+        symbol_rates = cash_rates[:, trade_currencies[first]]
+        aligned = aligned * symbol_rates
+        names = np.asarray(currencies, dtype=object)
+        invested_values = fx.convert(invested_values, names[trade_currencies], currency,
+                                     days[traded].astype("datetime64[D]"))
+        flow_values = flow_values * cash_rates[flow_rows[in_range], flow_currencies[in_range]]
+
+    market_value = np.where(holdings != 0, holdings * aligned, 0.0).sum(axis=1)
+    return Valuation(
+        dates=calendar,
+        symbols=symbols,
+        currencies=currencies,
+        holdings=holdings,
+        prices=aligned,
+        market_value=market_value,
+        balances=balances,
+        cash=(balances * cash_rates).sum(axis=1),
+        invested=np.cumsum(np.bincount(rows, invested_values, minlength=count)),
+        flows=np.bincount(flow_rows[in_range], flow_values, minlength=count),
+        currency=currency,
+    )
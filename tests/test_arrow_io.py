@@ -0,0 +1,82 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from pt import Portfolio, Stock, Transaction
+from pt.arrow_io import read_table
+from pt.transaction import Transactions
+from tests.test_ingest import random_ledger, write_ledger
+
+
+@pytest.fixture
+def portfolio(tmp_path):
+    return Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", random_ledger(2000)))
+
+
+@pytest.mark.parametrize("name", ["ledger.parquet", "ledger.arrow"])
+def test_transactions_round_trip(portfolio, tmp_path, name):
+    path = str(tmp_path / name)
+    portfolio.transactions.to_ipc(path) if name.endswith(".arrow") else portfolio.transactions.to_parquet(path)
+    table = read_table(path)
+    assert table.schema.field("symbol").type == pa.dictionary(pa.int32(), pa.string())
+    assert table.schema.field("date").type == pa.date32()
+
+    loaded = Transactions.from_ipc(path) if name.endswith(".arrow") else Transactions.from_parquet(path)
+    for column in Transactions.DTYPES:
+        np.testing.assert_array_equal(loaded.column(column), portfolio.transactions.column(column))
+    assert list(loaded.to_csv_rows()) == list(portfolio.transactions.to_csv_rows())
+
+
+def test_format_does_not_follow_the_extension(portfolio, tmp_path):
+    parquet, ipc = str(tmp_path / "ledger.pq"), str(tmp_path / "ledger.parquet")
+    portfolio.transactions.to_parquet(parquet)
+    portfolio.transactions.to_ipc(ipc)
+    assert pq.read_table(parquet).num_rows == len(portfolio.transactions)
+    with open(ipc, "rb") as file:
+        assert file.read(6) == b"ARROW1"
+    assert len(Transactions.from_parquet(parquet)) == len(Transactions.from_ipc(ipc)) == len(portfolio.transactions)
+    with pytest.raises(ValueError, match="Invalid format: csv"):
+        read_table(parquet, format="csv")
+
+
+def test_memory_mapped_ipc_does_not_copy(portfolio, tmp_path):
+    path = str(tmp_path / "ledger.arrow")
+    portfolio.transactions.to_ipc(path)
+    table = read_table(path)
+    allocated = pa.total_allocated_bytes()
+    loaded = Transactions.from_arrow(table)
+    assert pa.total_allocated_bytes() - allocated < 4096
+    for name, column in (("amount", "amount"), ("day", "date"), ("symbol", "symbol")):
+        buffer = table.column(column).chunk(0)
+        buffer = (buffer.indices if name == "symbol" else buffer).buffers()[1]
+        assert loaded.column(name).__array_interface__["data"][0] == buffer.address
+
+    # Appending moves the ledger off the read-only mapping
+    loaded.append(Transaction(Stock("SYM1", "USD"), "buy", "USD", 1.0, 2.0, 0.0, "2030-01-01"))
+    assert loaded[-1].date == "2030-01-01" and len(loaded) == len(portfolio.transactions) + 1
+
+
+def test_plain_string_columns_are_encoded(portfolio):
+    table = portfolio.transactions.to_arrow()
+    table = table.set_column(0, "symbol", table.column("symbol").cast(pa.string()))
+    loaded = Transactions.from_arrow(table)
+    np.testing.assert_array_equal(loaded.values("symbol"), portfolio.transactions.values("symbol"))
+
+
+@pytest.mark.parametrize("format", ["parquet", "ipc"])
+def test_portfolio_round_trip(portfolio, tmp_path, format):
+    portfolio.assets["SYM1"]._price = 123.0
+    getattr(portfolio, f"to_{format}")(str(tmp_path / "export"))
+    loaded = getattr(Portfolio, f"from_{format}")(str(tmp_path / "export"))
+    assert list(loaded.assets) == list(portfolio.assets)
+    for column in ("amount", "total_invested", "average_loading_price", "price"):
+        np.testing.assert_array_equal(loaded.assets.column(column), portfolio.assets.column(column))
+    assert loaded.cash.balances == portfolio.cash.balances
+    assert list(loaded.cash_flows.merge_csv_rows(loaded.transactions)) == \
+        list(portfolio.cash_flows.merge_csv_rows(portfolio.transactions))
+
+    if format == "parquet":
+        positions = pq.read_table(tmp_path / "export" / "positions.parquet")
+        row = list(portfolio.assets).index("SYM1")
+        assert positions.column("current_value")[row].as_py() == pytest.approx(123.0 * portfolio.assets["SYM1"].amount)
@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+import pt
+from pt import ConsolidatedPortfolio, Portfolio
+from pt import market_data
+from pt.consolidated import account_name, find_portfolio_files
+from pt.market_data import QuoteCache, StaticProvider
+from tests.test_ingest import random_ledger, write_ledger
+
+
+@pytest.fixture
+def directory(tmp_path):
+    for seed, name in enumerate(["broker", "pension", "savings"]):
+        write_ledger(tmp_path / f"portfolio_{name}.csv", random_ledger(300, seed))
+    write_ledger(tmp_path / "notes.csv", [["not", "a", "ledger"]])
+    return tmp_path
+
+
+@pytest.fixture
+def provider():
+    provider = StaticProvider({f"SYM{i}": 10.0 + i for i in range(40)})
+    previous = market_data.set_provider(provider)
+    previous_quotes = market_data.set_quote_cache(QuoteCache())
+    yield provider
+    market_data.set_provider(previous)
+    market_data.set_quote_cache(previous_quotes)
+
+
+def test_find_portfolio_files(directory):
+    paths = find_portfolio_files(str(directory))
+    assert [account_name(path) for path in paths] == ["broker", "pension", "savings"]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_holdings_and_cash_are_merged(directory, processes):
+    consolidated = pt.load_portfolios(str(directory), processes=processes)
+    accounts = {name: Portfolio.load_transactions(str(directory / f"portfolio_{name}.csv"))
+                for name in ["broker", "pension", "savings"]}
+    assert list(consolidated) == list(accounts)
+
+    symbols = {symbol for portfolio in accounts.values() for symbol in portfolio.assets}
+    assert set(consolidated.assets) == symbols
+    for symbol in symbols:
+        held = [portfolio.assets[symbol] for portfolio in accounts.values() if symbol in portfolio.assets]
+        merged = consolidated.assets[symbol]
+        assert merged.amount == pytest.approx(sum(asset.amount for asset in held))
+        assert merged.total_invested == pytest.approx(sum(asset.total_invested for asset in held))
+        assert consolidated.holders(symbol) == {name: portfolio.assets[symbol].amount
+                                                for name, portfolio in accounts.items()
+                                                if symbol in portfolio.assets}
+    for currency in ("usd", "EUR", "USD"):
+        assert consolidated.cash[currency] == pytest.approx(sum(p.cash[currency] for p in accounts.values()))
+    assert len(consolidated["broker"].transactions) == len(accounts["broker"].transactions)
+
+
+def test_prices_are_fetched_once_for_all_accounts(directory, provider):
+    consolidated = ConsolidatedPortfolio.load(str(directory), processes=1)
+    consolidated.refresh_prices()
+    assert provider.requests == 1
+    for portfolio in consolidated.accounts.values():
+        np.testing.assert_array_equal(portfolio.assets.column('price'),
+                                      [provider.prices[symbol] for symbol in portfolio.assets])
+
+    names, performance = consolidated.account_performance()
+    _, total = consolidated.performance()
+    for name, value in zip(names, performance['current_value']):
+        assert value == pytest.approx(consolidated[name].assets.performance()[1]['current_value'])
+    assert performance['current_value'].sum() == pytest.approx(total['current_value'])
+    assert performance['total_invested'].sum() == pytest.approx(consolidated.assets.total_invested())
+
+
+def test_consolidate_after_account_changes(directory):
+    consolidated = ConsolidatedPortfolio.load(str(directory), processes=1)
+    consolidated["broker"].deposit("CHF", 5.0)
+    consolidated["broker"].deposit("USD", 1000.0)
+    consolidated["broker"].add_transaction(pt.Transaction(pt.Stock("NEW", "USD"), "buy", "USD", 2.0, 50.0, 0.0,
+                                                          "2030-01-01"))
+    held = consolidated.assets["SYM1"].amount
+    consolidated["pension"].assets["SYM1"].amount += 1.0
+    consolidated.consolidate()
+    assert consolidated.cash["CHF"] == 5.0
+    assert list(consolidated.assets)[-1] == "NEW" and consolidated.assets["NEW"].total_invested == 100.0
+    assert consolidated.assets["SYM1"].amount == pytest.approx(held + 1.0)
+    assert list(consolidated.assets) == list(consolidated.assets.holdings.symbols)
+
+
+def test_errors(tmp_path, directory):
+    with pytest.raises(ValueError, match="No portfolio files"):
+        ConsolidatedPortfolio.load([], processes=1)
+    other = tmp_path / "other"
+    other.mkdir()
+    write_ledger(other / "portfolio_broker.csv", random_ledger(10))
+    with pytest.raises(ValueError, match="Duplicate account names: broker"):
+        ConsolidatedPortfolio.load([str(directory / "portfolio_broker.csv"), str(other / "portfolio_broker.csv")])
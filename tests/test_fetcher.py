@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from pt.fetcher import ConcurrentFetcher, TokenBucket
+from pt.market_data import StaticProvider
+
+
+class SlowProvider(StaticProvider):
+    """Fake provider answering after `latency` seconds, failing the first calls for some tickers"""
+
+    def __init__(self, prices, latency=0.05, failures=None):
+        super().__init__(prices, {ticker: price for ticker, price in prices.items()})
+        self.latency = latency
+        self.failures = dict(failures or {})
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _request(self, tickers):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            with self._lock:
+                for ticker in tickers:
+                    if self.failures.get(ticker, 0) > 0:
+                        self.failures[ticker] -= 1
+                        raise ConnectionError(f"Provider unavailable for {ticker}")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def fetch_prices(self, tickers):
+        self._request(tickers)
+        return super().fetch_prices(tickers)
+
+    def fetch_historical_prices(self, ticker, period="1mo", interval="1d", start=None, end=None):
+        self._request([ticker])
+        if ticker not in self.histories:
+            raise ValueError(f"No price history available for {ticker}.")
+        return self.histories[ticker]
+
+
+PRICES = {f"T{i}": float(i) for i in range(20)}
+
+
+def test_histories_fetched_concurrently():
+    provider = SlowProvider(PRICES, latency=0.05)
+    fetcher = ConcurrentFetcher(provider, max_workers=10)
+    started = time.perf_counter()
+    results = fetcher.fetch_historical_prices(PRICES)
+    elapsed = time.perf_counter() - started
+    assert results == PRICES
+    assert elapsed < 20 * 0.05 / 2
+    assert provider.max_in_flight <= 10
+
+
+def test_per_ticker_errors_do_not_fail_batch():
+    provider = SlowProvider(PRICES, latency=0, failures={"T3": 10})
+    fetcher = ConcurrentFetcher(provider, retries=2, sleep=lambda delay: None)
+    results = fetcher.fetch_historical_prices(list(PRICES) + ["MISSING"])
+    assert set(results.errors) == {"T3", "MISSING"}
+    assert isinstance(results.errors["T3"], ConnectionError)
+    assert isinstance(results.errors["MISSING"], ValueError)
+    assert len(results) == 19
+
+
+def test_transient_failures_are_retried_with_backoff():
+    delays = []
+    provider = SlowProvider(PRICES, latency=0, failures={"T1": 2})
+    fetcher = ConcurrentFetcher(provider, retries=3, backoff=1.0, sleep=delays.append)
+    results = fetcher.fetch_prices(["T1", "T2"])
+    assert results == {"T1": 1.0, "T2": 2.0}
+    assert not results.errors
+    assert len(delays) == 2
+    assert 0.5 <= delays[0] <= 1.0 and 1.0 <= delays[1] <= 2.0
+
+
+def test_price_batches_and_missing_tickers():
+    provider = SlowProvider(PRICES, latency=0)
+    fetcher = ConcurrentFetcher(provider, batch_size=7)
+    results = fetcher.fetch_prices(list(PRICES) + ["MISSING"])
+    assert provider.requests == 3
+    assert len(results) == 20
+    assert list(results.errors) == ["MISSING"]
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started = time.perf_counter()
+    for _ in range(10):
+        bucket.acquire()
+    assert time.perf_counter() - started >= 9 / 50 * 0.9
+
+
+def test_token_bucket_rejects_bad_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
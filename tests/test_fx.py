@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pt import Cash
+from pt import market_data
+from pt.fx import FXRates
+from pt.market_data import StaticProvider
+from pt.price_history import PriceHistory
+
+
+@pytest.fixture
+def rates():
+    fx = FXRates(fetch=None)
+    fx.set_rates("EUR", "USD", ["2024-01-01", "2024-01-03"], [1.10, 1.20])
+    fx.set_rates("USD", "GBP", ["2024-01-01"], [0.80])
+    return fx
+
+
+def test_asof_lookup(rates):
+    assert rates.rate("EUR", "USD", "2024-01-02") == 1.10
+    assert rates.rate("EUR", "USD", "2024-01-03") == 1.20
+    with pytest.raises(ValueError):
+        rates.rate("EUR", "USD", "2023-12-31")
+
+
+def test_inverse_and_cross_rates(rates):
+    assert rates.rate("USD", "EUR", "2024-01-03") == pytest.approx(1 / 1.20)
+    assert rates.rate("EUR", "GBP", "2024-01-03") == pytest.approx(1.20 * 0.80)
+    assert rates.rate("GBP", "EUR", "2024-01-01") == pytest.approx(1 / (1.10 * 0.80))
+    with pytest.raises(ValueError):
+        rates.rate("EUR", "JPY", "2024-01-03")
+
+
+def test_vector_convert(rates):
+    converted = rates.convert([100.0, 100.0, 50.0, 10.0], ["EUR", "EUR", "GBP", "USD"], "USD",
+                              ["2024-01-01", "2024-01-05", "2024-01-02", "2024-01-02"])
+    np.testing.assert_allclose(converted, [110.0, 120.0, 50.0 / 0.80, 10.0])
+
+
+def test_pairs_fetched_from_provider(tmp_path):
+    index = pd.date_range("2024-01-01", periods=3, freq="D", tz="Europe/London")
+    histories = {"EURUSD=X": pd.DataFrame({"Close": [1.1, 1.2, 1.3]}, index=index)}
+    previous = market_data.set_provider(StaticProvider(histories=histories))
+    previous_cache = market_data.set_history_cache(None)
+    try:
+        fx = FXRates()
+        assert fx.rate("USD", "EUR", "2024-01-02") == pytest.approx(1 / 1.2)
+        assert fx.rate("EUR", "USD", "2024-01-09") == 1.3
+    finally:
+        market_data.set_provider(previous)
+        market_data.set_history_cache(previous_cache)
+
+
+def test_failed_fetches_are_retried():
+    now, down, calls = [0.0], [True], []
+
+    def fetch(base, quote):
+        calls.append((base, quote))
+        if down[0]:
+            raise ValueError(f"Exchange rate from {base} to {quote} not available.")
+        return PriceHistory(np.array(["2024-01-01"], dtype="datetime64[D]"), np.array([1.1]))
+
+    fx = FXRates(fetch=fetch, retry_after=60, clock=lambda: now[0])
+    with pytest.raises(ValueError):
+        fx.rate("EUR", "USD", "2024-01-02")
+    fetched = len(calls)
+    down[0] = False
+    # The failure is remembered for `retry_after` seconds
+    now[0] = 59.0
+    with pytest.raises(ValueError):
+        fx.rate("EUR", "USD", "2024-01-02")
+    assert len(calls) == fetched
+    now[0] = 61.0
+    assert fx.rate("EUR", "USD", "2024-01-02") == 1.1
+
+    fx = FXRates(fetch=fetch, retry_after=60, clock=lambda: now[0])
+    down[0] = True
+    with pytest.raises(ValueError):
+        fx.rate("EUR", "USD", "2024-01-02")
+    down[0] = False
+    fx.refresh()
+    assert fx.rate("EUR", "USD", "2024-01-02") == 1.1
+
+
+def test_cash_total_balance(rates):
+    cash = Cash(exchange_rates={"GBP": {"USD": 1.5}}, fx=rates)
+    cash.deposit("USD", 100.0)
+    cash.deposit("EUR", 100.0)
+    cash.deposit("GBP", 100.0)
+    assert cash.total_balance("USD", "2024-01-02") == pytest.approx(100.0 + 110.0 + 150.0)
+    assert cash.convert("EUR", "GBP", 10.0, "2024-01-03") == pytest.approx(10.0 * 1.20 * 0.80)
@@ -0,0 +1,172 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from pt import Portfolio, Stock, ETF
+from pt.asset import Assets
+
+
+def make_assets():
+    assets = Assets()
+    for i, name in enumerate(["AAPL", "SPY", "MSFT"]):
+        asset = (ETF if name == "SPY" else Stock)(name, "USD")
+        asset.amount = 10.0 * (i + 1)
+        asset.total_invested = 100.0 * (i + 1)
+        assets[name] = asset
+    return assets
+
+
+def test_assets_are_views_on_table():
+    assets = make_assets()
+    np.testing.assert_array_equal(assets.holdings.amount, [10.0, 20.0, 30.0])
+    assets["SPY"].amount += 5
+    assert assets.holdings.amount[1] == 25.0
+    assets.holdings.total_invested[2] = 1.0
+    assert assets["MSFT"].total_invested == 1.0
+    assert assets.total_invested() == 100.0 + 200.0 + 1.0
+    assert not hasattr(assets["AAPL"], "__dict__")
+
+
+def test_filter_shares_table():
+    assets = make_assets()
+    view = assets.filter(["MSFT", "AAPL"])
+    np.testing.assert_array_equal(view.column("amount"), [30.0, 10.0])
+    view["MSFT"].amount = 0.0
+    assert assets.holdings.amount[2] == 0.0
+    with pytest.raises(ValueError):
+        view["TSLA"] = Stock("TSLA", "USD")
+
+
+def test_delete_keeps_rows_in_order():
+    assets = make_assets()
+    removed = assets.pop("AAPL")
+    assert removed.amount == 10.0 and removed._holdings is None
+    assert assets.holdings.symbols == ["SPY", "MSFT"]
+    assert assets["MSFT"].amount == 30.0
+    assets["AAPL"] = removed
+    assert assets.holdings.symbols == ["SPY", "MSFT", "AAPL"]
+    np.testing.assert_array_equal(assets.column("amount"), [20.0, 30.0, 10.0])
+
+
+def test_asset_of_another_table_is_copied():
+    assets = make_assets()
+    other = Assets({"AAPL": assets["AAPL"]})
+    other["AAPL"].amount = 99.0
+    assert assets["AAPL"].amount == 10.0
+
+
+def test_table_grows_and_pickles():
+    assets = Assets()
+    for i in range(100):
+        asset = Stock(f"T{i}", "USD")
+        asset.amount = float(i)
+        assets[asset.name] = asset
+    assert assets.holdings.capacity >= 100
+    restored = pickle.loads(pickle.dumps(assets))
+    assert restored["T42"].amount == 42.0
+    restored["T42"].amount = 1.0
+    assert restored.holdings.amount[42] == 1.0
+    assert restored.to_frame().loc["T99", "amount"] == 99.0
+
+
+def test_vectorized_performance():
+    assets = make_assets()
+    performance, total = assets.performance(np.array([20.0, 5.0, 10.0]))
+    np.testing.assert_array_equal(performance["current_value"], [200.0, 100.0, 300.0])
+    np.testing.assert_array_equal(performance["profit_loss"], [100.0, -100.0, 0.0])
+    np.testing.assert_array_equal(performance["profit_loss_percentage"], [100.0, -50.0, 0.0])
+    assert total == {"current_value": 600.0, "profit_loss": 0.0, "profit_loss_percentage": 0.0}
+
+    view = assets.filter(["MSFT", "AAPL"])
+    performance, total = view.performance(np.array([10.0, 20.0]))
+    np.testing.assert_array_equal(performance["current_value"], [300.0, 200.0])
+
+
+def test_performance_with_nothing_invested():
+    assets = make_assets()
+    assets.holdings.total_invested[:] = 0.0
+    assets["SPY"].total_invested = -50.0
+    performance, total = assets.performance(np.ones(3))
+    np.testing.assert_array_equal(performance["profit_loss_percentage"], [0.0, 0.0, 0.0])
+    assert total["profit_loss_percentage"] == 0.0
+    assert total["profit_loss"] == 60.0 + 50.0
+
+
+def test_running_totals_follow_price_updates():
+    assets = make_assets()
+    assets["EUR"] = Stock("EUR", "EUR")
+    assets["EUR"].amount, assets["EUR"].total_invested = 4.0, 40.0
+    assert np.isnan(assets.totals()["current_value"])
+    for name, price in zip(assets, [20.0, 5.0, 10.0, 12.0]):
+        assets.update_price(name, price)
+    assert assets.totals() == {"current_value": 648.0, "total_invested": 640.0, "profit_loss": 8.0,
+                               "profit_loss_percentage": 8.0 / 640.0 * 100}
+    assert assets.currency_totals() == {"USD": {"current_value": 600.0, "total_invested": 600.0},
+                                        "EUR": {"current_value": 48.0, "total_invested": 40.0}}
+    assets["SPY"].amount -= 20.0
+    assets["SPY"].total_invested = 0.0
+    assets.update_price("SPY", None)
+    del assets["AAPL"]
+    assert assets.totals()["current_value"] == 348.0
+    assert assets.filter("EUR").totals()["current_value"] == 48.0
+    assets.check_totals()
+
+    # Direct writes bypass the running totals until invalidated
+    assets.holdings.amount[1] = 1.0
+    with pytest.raises(ValueError, match="Running value of USD"):
+        assets.check_totals()
+    assets.holdings.invalidate()
+    assert assets.totals()["current_value"] == 58.0
+
+
+def test_running_totals_match_full_recompute(tmp_path):
+    from pt.transaction import Transaction
+    from tests.test_ingest import random_ledger, write_ledger
+    portfolio = Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", random_ledger(500)))
+    rng = np.random.default_rng(1)
+    rows = portfolio.assets._rows()
+    portfolio.assets.holdings.update_prices(rows, rng.uniform(1, 100, len(portfolio.assets)))
+    names = list(portfolio.assets)
+    for i in range(200):
+        name = names[rng.integers(len(names))]
+        if i % 3:
+            portfolio.update_price(name, float(rng.uniform(1, 100)))
+        else:
+            asset = portfolio.assets[name]
+            portfolio.add_transaction(Transaction(asset, "buy", asset.currency, 1.0, 50.0, 0.0, "2030-01-01"))
+    portfolio.check_totals()
+    full = portfolio.assets.holdings.totals(rows)
+    for key, value in portfolio.totals().items():
+        assert value == pytest.approx(full[key])
+    _, total = portfolio.assets.performance()
+    assert portfolio.totals()["current_value"] == pytest.approx(total["current_value"])
+    assert sum(figures["current_value"] for figures in portfolio.currency_totals().values()) \
+        == pytest.approx(total["current_value"])
+
+
+def test_batch_removal_and_clear():
+    assets = Assets()
+    for i in range(10):
+        assets[f"S{i}"] = Stock(f"S{i}", "USD" if i % 2 else "EUR")
+        assets[f"S{i}"].amount, assets[f"S{i}"].total_invested = float(i), 10.0 * i
+        assets.update_price(f"S{i}", 2.0)
+    kept = assets["S9"]
+    removed = assets["S3"]
+    assets.remove(["S7", "S3", "S0"])
+    assert list(assets) == list(assets.holdings.symbols) == ["S1", "S2", "S4", "S5", "S6", "S8", "S9"]
+    assert [asset._row for asset in assets.values()] == list(range(7))
+    np.testing.assert_array_equal(assets.column("amount"), [1, 2, 4, 5, 6, 8, 9])
+    assert kept.amount == 9.0 and removed.amount == 3.0 and removed._holdings is None
+    assert assets.currency_totals()["USD"] == {"current_value": 30.0, "total_invested": 150.0}
+    assets.check_totals()
+    with pytest.raises(KeyError):
+        assets.remove(["S1", "S3"])
+    assert "S1" in assets
+
+    assets.clear()
+    assert len(assets) == len(assets.holdings) == 0 and kept.amount == 9.0
+    assert assets.totals()["current_value"] == 0.0
+    assets["S1"] = Stock("S1", "USD")
+    assert assets["S1"].amount == 0.0 and np.isnan(assets.holdings.price[0])
+    assets.check_totals()
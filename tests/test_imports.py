@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from tests.test_ingest import random_ledger, write_ledger
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("yfinance", "pandas", "pyarrow", "rich")
+
+
+def loaded_after(statements):
+    script = textwrap.dedent(statements) + textwrap.dedent(f"""
+        import json, sys
+        print(json.dumps([name for name in {HEAVY + ("numpy",)!r} if name in sys.modules]))
+    """)
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_pt_loads_no_dependency():
+    assert loaded_after("import pt") == []
+
+
+def test_heavy_dependencies_load_on_first_use(tmp_path):
+    path = write_ledger(tmp_path / "ledger.csv", random_ledger(50))
+    assert loaded_after("from pt import Portfolio, Stock, Cash") == ["numpy"]
+    # Parsing the CSV needs pyarrow (which probes pandas itself), neither market data nor rendering is touched
+    loaded = loaded_after(f"from pt import Portfolio; Portfolio.load_transactions({path!r})")
+    assert "pyarrow" in loaded and not {"yfinance", "rich"} & set(loaded)
+    assert "rich" in loaded_after("from pt import Cash; repr(Cash())")
+
+
+def test_lazy_attributes():
+    import pt
+    from pt.portfolio import Portfolio
+    assert pt.Portfolio is Portfolio
+    assert pt.market_data.get_provider() is not None
+    assert {"Portfolio", "ConsolidatedPortfolio", "market_data"} <= set(dir(pt))
+    try:
+        pt.missing
+    except AttributeError as error:
+        assert "missing" in str(error)
+    else:
+        raise AssertionError("pt.missing did not raise")
+
+
+def test_every_submodule_is_lazy():
+    import pt
+    modules = {name[:-3] for name in os.listdir(os.path.join(ROOT, "pt"))
+               if name.endswith(".py") and name != "__init__.py"}
+    assert modules <= set(dir(pt))
+    assert pt.valuation.__name__ == "pt.valuation" and pt.returns.__name__ == "pt.returns"
@@ -0,0 +1,181 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from pt import Portfolio
+from pt.asset import Cash
+from pt.ingest import BUY, DEPOSIT, SELL, WITHDRAW, _apply_cash, _apply_reduced_cash, _reduce_cash, split_ranges
+from pt.transaction import Categories
+
+
+def write_ledger(path, rows):
+    with open(path, "w", newline="") as file:
+        csv.writer(file).writerows(rows)
+    return str(path)
+
+
+def random_ledger(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [["usd", "Cash", "usd", "deposit", 1e9, 1.0, 0.0, "2020-01-01"],
+            ["EUR", "Cash", "EUR", "deposit", 1e9, 1.0, 0.0, "2020-01-01"]]
+    held = {}
+    for i in range(n):
+        day = str(np.datetime64("2020-01-02") + i // 10)
+        if rng.random() < 0.05:
+            rows.append(["EUR", "Cash", "EUR", "Deposit" if rng.random() < 0.5 else "withdraw",
+                         float(rng.integers(1, 100)), 1.0, 0.0, day])
+            continue
+        symbol = f"sym{rng.integers(0, 40)}"
+        currency = "EUR" if symbol.endswith("7") else "USD"
+        amount = float(rng.integers(1, 20))
+        sell = held.get(symbol, 0) >= amount and rng.random() < 0.4
+        held[symbol] = held.get(symbol, 0) + (-amount if sell else amount)
+        rows.append([symbol, "ETF" if symbol.endswith("3") else "Stock", currency, "SELL" if sell else "buy",
+                     amount, round(float(rng.uniform(10, 500)), 2), round(float(rng.uniform(0, 5)), 2), day])
+    return rows
+
+
+def replay_rows(rows):
+    """Row-by-row reference: positions as (amount, total_invested, average_loading_price)"""
+    positions, cash = {}, Cash()
+    for name, asset_type, currency, kind, amount, price, cost, _ in rows:
+        name, currency, kind = name.upper(), currency.upper(), kind.lower()
+        amount, price, cost = float(amount), float(price), float(cost)
+        if asset_type == "Cash":
+            getattr(cash, kind)(currency, amount)
+            continue
+        held, invested, average = positions.get(name, (0.0, 0.0, 0.0))
+        if kind == "buy":
+            average = (average * held + amount * price) / (held + amount)
+            positions[name] = (held + amount, invested + amount * price, average)
+            cash.asset_bought(currency, amount * price, cost)
+        else:
+            positions[name] = (held - amount, invested - amount * price, average)
+            cash.asset_sold(currency, amount * price, cost)
+    return positions, cash.balances
+
+
+@pytest.mark.parametrize("block_size", [1 << 20, 256])
+def test_streaming_load_matches_row_by_row(tmp_path, block_size):
+    rows = random_ledger()
+    path = write_ledger(tmp_path / "ledger.csv", rows)
+    calls = []
+    portfolio = Portfolio.load_transactions(path, block_size=block_size, progress=lambda *args: calls.append(args))
+
+    positions, balances = replay_rows(rows)
+    assert list(portfolio.assets) == list(positions)
+    expected = np.array(list(positions.values()))
+    np.testing.assert_allclose(portfolio.assets.column("amount"), expected[:, 0])
+    np.testing.assert_allclose(portfolio.assets.column("total_invested"), expected[:, 1])
+    np.testing.assert_allclose(portfolio.assets.column("average_loading_price"), expected[:, 2], rtol=1e-9)
+    assert portfolio.cash.balances == balances
+    assert type(portfolio.assets["SYM3"]).__name__ == "ETF"
+
+    assert calls[-1][0] == len(rows)
+    assert calls[-1][1] == calls[-1][2]
+    if block_size == 256:
+        assert len(calls) > 10
+
+
+def test_save_round_trips_cash_flows(tmp_path):
+    rows = random_ledger(300)
+    portfolio = Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", rows))
+    assert len(portfolio.transactions) + len(portfolio.cash_flows) == len(rows)
+
+    portfolio.save_transactions(tmp_path / "saved.csv")
+    with open(tmp_path / "saved.csv") as file:
+        saved = list(csv.reader(file))
+    assert [row[:4] for row in saved] == [[row[0].upper(), row[1], row[2].upper(), row[3].lower()] for row in rows]
+    reloaded = Portfolio.load_transactions(str(tmp_path / "saved.csv"))
+    assert reloaded.cash.balances == portfolio.cash.balances
+
+
+def test_keep_transactions_off(tmp_path):
+    rows = random_ledger(200)
+    portfolio = Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", rows), keep_transactions=False)
+    assert len(portfolio.transactions) == 0 and len(portfolio.cash_flows) == 0
+    assert portfolio.cash.balances == replay_rows(rows)[1]
+
+
+@pytest.mark.parametrize("rows, error", [
+    ([["USD", "Cash", "USD", "withdraw", 10.0, 1.0, 0.0, "2024-01-01"]], "Insufficient cash balance"),
+    ([["USD", "Cash", "USD", "deposit", 100.0, 1.0, 0.0, "2024-01-01"],
+      ["AAPL", "Stock", "USD", "buy", 1.0, 150.0, 0.0, "2024-01-02"]], "Insufficient cash balance for USD."),
+    ([["USD", "Cash", "USD", "deposit", -1.0, 1.0, 0.0, "2024-01-01"]], "Deposit amount must be positive."),
+    ([["X", "Warrant", "USD", "buy", 1.0, 1.0, 0.0, "2024-01-01"]], "Unknown asset type"),
+])
+def test_refused_rows_raise(tmp_path, rows, error):
+    with pytest.raises(ValueError, match=error):
+        Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", rows))
+
+
+def test_empty_file(tmp_path):
+    portfolio = Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", []))
+    assert len(portfolio.assets) == 0 and portfolio.cash.balances == {}
+
+
+def test_process_pool_load_matches_serial(tmp_path):
+    path = write_ledger(tmp_path / "ledger.csv", random_ledger(3000, seed=1))
+    serial = Portfolio.load_transactions(path, block_size=4096)
+    parallel = Portfolio.load_transactions(path, block_size=4096, processes=3)
+    assert list(parallel.assets) == list(serial.assets)
+    np.testing.assert_array_equal(parallel.assets.column("amount"), serial.assets.column("amount"))
+    # Ranges are summed separately, then added
+    for column in ("total_invested", "average_loading_price"):
+        np.testing.assert_allclose(parallel.assets.column(column), serial.assets.column(column), rtol=1e-12)
+    assert parallel.cash.balances == pytest.approx(serial.cash.balances, rel=1e-12)
+    for name in ("symbol", "type", "currency"):
+        np.testing.assert_array_equal(parallel.transactions.values(name), serial.transactions.values(name))
+    np.testing.assert_array_equal(parallel.transactions.column("day"), serial.transactions.column("day"))
+    for name in ("currency", "type"):
+        np.testing.assert_array_equal(parallel.cash_flows.values(name), serial.cash_flows.values(name))
+    np.testing.assert_array_equal(parallel.cash_flows.column("position"), serial.cash_flows.column("position"))
+
+
+def test_ranges_start_at_lines(tmp_path):
+    path = write_ledger(tmp_path / "ledger.csv", random_ledger(500))
+    ranges = split_ranges(path, 7)
+    assert len(ranges) == 7 and ranges[0][0] == 0 and ranges[-1][1] == os.path.getsize(path)
+    with open(path, "rb") as file:
+        data = file.read()
+    assert all(data[start - 1:start] == b"\n" for start, _ in ranges[1:])
+    assert [stop for _, stop in ranges[:-1]] == [start for start, _ in ranges[1:]]
+
+
+@pytest.mark.parametrize("row, error", [
+    (["AAPL", "Stock", "USD", "buy", "", 1.0, 0.0, "2024-01-01"], "Missing amount on line 1501."),
+    (["AAPL", "Stock", "USD", "buy", 1e12, 1.0, 0.0, "2024-01-01"], "Insufficient cash balance for USD."),
+])
+def test_parallel_errors_name_the_ledger_line(tmp_path, row, error):
+    rows = random_ledger(3000, seed=1)
+    rows.insert(1500, row)
+    path = write_ledger(tmp_path / "ledger.csv", rows)
+    with pytest.raises(ValueError, match=error):
+        Portfolio.load_transactions(path, block_size=4096, processes=4)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_reduced_cash_matches_movement_by_movement(seed):
+    rng = np.random.default_rng(seed)
+    count = 200
+    names = Categories(["USD", "EUR", "GBP"])
+    currencies = rng.integers(0, 3, count).astype(np.int32)
+    kinds = rng.choice([DEPOSIT, WITHDRAW, BUY, SELL], count, p=[0.4, 0.1, 0.3, 0.2]).astype(np.int8)
+    values = rng.uniform(1, 100, count)
+    values[rng.random(count) < 0.002] = 0.0
+    costs = rng.uniform(0, 2, count)
+    # About a third of the seeds go through, the others fail on any of the checks
+    opening = {name: float(rng.uniform(0, 1500)) for name in names.values if rng.random() < 0.9}
+
+    expected = dict(opening)
+    error = _apply_cash(expected, currencies, names, kinds, values, costs)
+    reduced = dict(opening)
+    refused = _apply_reduced_cash(reduced, _reduce_cash(currencies, names, kinds, values, costs))
+    if error is None:
+        assert refused is None
+        assert reduced == pytest.approx(expected, rel=1e-12)
+    else:
+        assert refused == (kinds[error], values[error], names.values[currencies[error]])
+        assert reduced == opening
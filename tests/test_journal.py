@@ -0,0 +1,164 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from pt import Portfolio, Stock, Transaction
+from pt.journal import Journal
+from tests.test_ingest import write_ledger
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASE = [["USD", "Cash", "USD", "deposit", 100000.0, 1.0, 0.0, "2024-01-01"],
+        ["AAPL", "Stock", "USD", "buy", 10.0, 150.0, 1.0, "2024-01-02"]]
+
+
+def buy(i):
+    return Transaction(Stock("MSFT", "USD"), "buy", "USD", 1.0, 100.0 + i, 0.5, f"2024-02-{i + 1:02d}")
+
+
+def ledger_rows(portfolio):
+    return [row[:4] + [float(value) for value in row[4:7]] + [row[7]]
+            for row in portfolio.cash_flows.merge_csv_rows(portfolio.transactions)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return write_ledger(tmp_path / "ledger.csv", BASE)
+
+
+def test_journal_rows_survive_restart(path):
+    with Portfolio.load(path) as portfolio:
+        for i in range(5):
+            portfolio.add_transaction(buy(i))
+        portfolio.deposit("EUR", 50.0, "2024-03-01")
+        expected = ledger_rows(portfolio)
+    # The CSV is untouched until compaction
+    assert os.path.getsize(path) == sum(len(",".join(map(str, row))) + 2 for row in BASE)
+
+    with Portfolio.load(path) as reloaded:
+        assert ledger_rows(reloaded) == expected
+        assert reloaded.assets["MSFT"].amount == 5.0
+        assert reloaded.cash["EUR"] == 50.0
+        reloaded.compact()
+    assert os.path.getsize(path + ".journal") == 0
+    with Portfolio.load(path) as compacted:
+        assert ledger_rows(compacted) == expected
+
+
+def test_session_state_matches_reload(tmp_path):
+    path = write_ledger(tmp_path / "ledger.csv", BASE[:1])
+    with Portfolio.load(path) as portfolio:
+        portfolio.deposit("EUR", 1000.0, "2024-01-03")
+        portfolio.add_transaction(Transaction(Stock("SAP", "EUR"), "buy", "EUR", 5.0, 120.0, 1.0, "2024-01-04"))
+        refused = Transaction(Stock("SAP", "EUR"), "buy", "EUR", 4.0, 100.0, 0.0, "2024-01-05")
+        with pytest.raises(ValueError, match="Insufficient cash balance for EUR."):
+            portfolio.add_transaction(refused)
+        portfolio.add_transaction(Transaction(Stock("SAP", "EUR"), "sell", "EUR", 2.0, 130.0, 0.5, "2024-01-06"))
+        expected = ledger_rows(portfolio)
+        assets = {name: (asset.amount, asset.total_invested) for name, asset in portfolio.assets.items()}
+        cash = dict(portfolio.cash.balances)
+    assert cash["EUR"] == 1000.0 - 601.0 + 259.5
+
+    with Portfolio.load(path) as reloaded:
+        assert ledger_rows(reloaded) == expected
+        assert {name: (asset.amount, asset.total_invested) for name, asset in reloaded.assets.items()} == assets
+        assert dict(reloaded.cash.balances) == cash
+
+
+def test_lower_case_input_matches_reload(path):
+    with Portfolio.load(path) as portfolio:
+        portfolio.deposit("eur", 500.0, "2024-01-03")
+        portfolio.add_transaction(Transaction(Stock("aapl", "usd"), "BUY", "usd", 2.0, 160.0, 1.0, "2024-01-04"))
+        portfolio.add_transaction(Transaction(Stock("sap", "eur"), "Buy", "eur", 1.0, 120.0, 0.0, "2024-01-05"))
+        assert list(portfolio.assets) == ["AAPL", "SAP"] and portfolio.assets["AAPL"].amount == 12.0
+        expected = ledger_rows(portfolio)
+        assets = {name: (asset.currency, asset.amount, asset.total_invested)
+                  for name, asset in portfolio.assets.items()}
+        cash = dict(portfolio.cash.balances)
+    assert set(cash) == {"USD", "EUR"}
+
+    with Portfolio.load(path) as reloaded:
+        assert ledger_rows(reloaded) == expected
+        assert {name: (asset.currency, asset.amount, asset.total_invested)
+                for name, asset in reloaded.assets.items()} == assets
+        assert dict(reloaded.cash.balances) == cash
+
+
+def test_process_killed_after_appends(path):
+    script = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {ROOT!r})
+        from tests.test_journal import buy
+        from pt import Portfolio
+        portfolio = Portfolio.load({path!r}, sync="never")
+        for i in range(3):
+            portfolio.add_transaction(buy(i))
+        os._exit(1)
+    """)
+    assert subprocess.run([sys.executable, "-c", script]).returncode == 1
+    with Portfolio.load(path) as portfolio:
+        assert portfolio.assets["MSFT"].amount == 3.0
+        assert len(portfolio.transactions) == 4
+
+
+def test_torn_last_line_is_dropped(path):
+    with Portfolio.load(path) as portfolio:
+        portfolio.add_transaction(buy(0))
+    with open(path + ".journal", "a") as file:
+        file.write("3,MSFT,Stock,USD,buy,1.0,10")
+    with Portfolio.load(path) as portfolio:
+        assert len(portfolio.transactions) == 2
+        portfolio.add_transaction(buy(1))
+    with Portfolio.load(path) as portfolio:
+        assert portfolio.assets["MSFT"].amount == 2.0
+
+
+@pytest.mark.parametrize("failing", ["replace", "snapshot", "truncate"])
+def test_crash_during_compaction_loses_and_duplicates_nothing(path, monkeypatch, failing):
+    with Portfolio.load(path) as portfolio:
+        for i in range(4):
+            portfolio.add_transaction(buy(i))
+        expected = ledger_rows(portfolio)
+
+        def crash(*args, **kwargs):
+            raise RuntimeError("crash")
+        target = {"replace": (os, "replace"), "snapshot": ("pt.portfolio.write_snapshot", None),
+                  "truncate": (Journal, "truncate")}[failing]
+        with monkeypatch.context() as patch:
+            if target[1] is None:
+                patch.setattr(target[0], crash)
+            else:
+                patch.setattr(*target, crash)
+            with pytest.raises(RuntimeError):
+                portfolio.compact()
+
+    with Portfolio.load(path) as reloaded:
+        assert ledger_rows(reloaded) == expected
+        assert reloaded.assets["MSFT"].amount == 4.0
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith(".tmp")]
+
+
+@pytest.mark.parametrize("sync, fsyncs", [("always", 7), ("batch", 2), ("never", 0)])
+def test_sync_modes(tmp_path, monkeypatch, sync, fsyncs):
+    calls = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (calls.append(fd), real_fsync(fd)))
+    journal = Journal(str(tmp_path / "journal"), sync=sync, batch_size=3, interval=3600)
+    for seq in range(7):
+        journal.append(seq, BASE[1])
+    assert len(calls) == fsyncs
+    journal.close()
+    assert len(Journal.read(str(tmp_path / "journal"), start=5)) == 2
+
+
+def test_batch_interval(tmp_path, monkeypatch):
+    now = [0.0]
+    calls = []
+    monkeypatch.setattr(os, "fsync", lambda fd: calls.append(fd))
+    journal = Journal(str(tmp_path / "journal"), batch_size=100, interval=1.0, clock=lambda: now[0])
+    journal.append(0, BASE[1])
+    now[0] = 1.5
+    journal.append(1, BASE[1])
+    assert len(calls) == 1
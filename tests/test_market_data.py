@@ -0,0 +1,265 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from pt import Portfolio, Stock
+from pt.asset import Assets
+from pt import market_data
+from pt.market_data import StaticProvider, QuoteCache
+from pt.history_cache import HistoryCache
+from pt.replay import RecordingProvider, ReplayProvider
+
+CSV_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "portfolio_transactions.csv")
+
+
+def make_history(start, periods):
+    index = pd.date_range(start, periods=periods, freq="D", tz="America/New_York", name="Date")
+    close = [100.0 + i for i in range(periods)]
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1000}, index=index)
+
+
+@pytest.fixture
+def provider(tmp_path):
+    provider = StaticProvider({"AAPL": 200.0, "SPY": 500.0, "MSFT": 400.0}, {"AAPL": make_history("2024-01-01", 30)})
+    previous = market_data.set_provider(provider)
+    previous_cache = market_data.set_history_cache(HistoryCache(str(tmp_path)))
+    previous_quotes = market_data.set_quote_cache(QuoteCache())
+    yield provider
+    market_data.set_provider(previous)
+    market_data.set_history_cache(previous_cache)
+    market_data.set_quote_cache(previous_quotes)
+
+
+def make_assets(*names):
+    assets = Assets()
+    for name in names:
+        asset = Stock(name, "USD")
+        asset.amount = 10
+        asset.total_invested = 1000
+        assets[name] = asset
+    return assets
+
+
+def test_fetch_prices_uses_provider(provider):
+    assert market_data.fetch_prices(["AAPL", "SPY"]) == {"AAPL": 200.0, "SPY": 500.0}
+    assert market_data.fetch_price("MSFT") == 400.0
+
+
+def test_fetch_price_unknown_ticker(provider):
+    with pytest.raises(ValueError):
+        market_data.fetch_price("NOPE")
+
+
+def test_refresh_prices_is_one_request(provider):
+    assets = make_assets("AAPL", "SPY", "MSFT")
+    assets.refresh_prices()
+    assert provider.requests == 1
+    assert assets["SPY"].price == 500.0
+
+    # Prices already known are not requested again
+    assets.refresh_prices()
+    assert provider.requests == 1
+
+
+def test_portfolio_render_batches_prices(provider):
+    portfolio = Portfolio.load_transactions(CSV_FILE)
+    portfolio.__rich__()
+    assert provider.requests == 1
+    performance, total = portfolio.calculate_performance()
+    assert performance["AAPL"]["current_value"] == 2000.0
+    assert total["current_value"] == 2000.0 + 2500.0
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_quote_cache_shared_between_assets(provider):
+    assert Stock("AAPL", "USD").price == 200.0
+    assert Stock("AAPL", "USD").price == 200.0
+    assert provider.requests == 1
+
+
+def test_quote_cache_ttl(provider):
+    clock = FakeClock()
+    cache = QuoteCache(ttl=60, clock=clock)
+    assert cache.get("AAPL") == 200.0
+    provider.prices["AAPL"] = 210.0
+    clock.now = 59
+    assert cache.get("AAPL") == 200.0
+    clock.now = 61
+    assert cache.get("AAPL") == 210.0
+    assert provider.requests == 2
+
+
+def test_quote_cache_lru_eviction(provider):
+    cache = QuoteCache(maxsize=2)
+    cache.get_many(["AAPL", "SPY"])
+    cache.get("AAPL")
+    cache.get("MSFT")
+    assert "SPY" not in cache
+    assert "AAPL" in cache and "MSFT" in cache
+
+
+def test_quote_cache_stale_while_revalidate(provider):
+    clock = FakeClock()
+    cache = QuoteCache(ttl=60, stale_while_revalidate=600, clock=clock)
+    cache.get("AAPL")
+    provider.prices["AAPL"] = 210.0
+    clock.now = 120
+    # The stale quote is served right away and refreshed in the background
+    assert cache.get("AAPL") == 200.0
+    for _ in range(100):
+        if cache.get("AAPL") == 210.0:
+            break
+        time.sleep(0.01)
+    assert cache.get("AAPL") == 210.0
+
+    # Past the stale window the quote is fetched in line
+    provider.prices["AAPL"] = 220.0
+    clock.now = 1000
+    assert cache.get("AAPL") == 220.0
+
+
+def test_history_cache_persists_between_runs(provider, tmp_path):
+    first = Stock("AAPL", "USD").price_history
+    assert len(first) == 30
+    assert os.path.exists(HistoryCache(str(tmp_path)).path("AAPL"))
+
+    # A new process reads the cached file without touching the provider
+    requests = provider.requests
+    assert Stock("AAPL", "USD").price_history == first
+    assert provider.requests == requests
+
+
+def test_history_cache_tops_up_from_last_date(provider, tmp_path):
+    cache = HistoryCache(str(tmp_path), max_age=0)
+    market_data.set_history_cache(cache)
+    market_data.fetch_historical_prices("AAPL", period="max")
+
+    provider.histories["AAPL"] = make_history("2024-01-01", 40)
+    calls = []
+    original = provider.fetch_historical_prices
+
+    def recording_fetch(ticker, period="1mo", interval="1d", start=None, end=None):
+        calls.append(start)
+        return original(ticker, period=period, interval=interval, start=start, end=end)
+
+    provider.fetch_historical_prices = recording_fetch
+    data = market_data.fetch_historical_prices("AAPL", period="max")
+    assert calls == ["2024-01-30"]
+    assert len(data) == 40
+    assert data.index.is_unique
+    assert data["Close"].iloc[-1] == 139.0
+
+
+class SlowStaticProvider(StaticProvider):
+    def fetch_prices(self, tickers):
+        time.sleep(0.05)
+        return super().fetch_prices(tickers)
+
+    def fetch_historical_prices(self, ticker, period="1mo", interval="1d", start=None, end=None):
+        time.sleep(0.05)
+        return super().fetch_historical_prices(ticker, period=period, interval=interval, start=start, end=end)
+
+
+def run_concurrently(fn, count=8):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        barrier.wait()
+        results[i] = fn()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_history_requests_are_coalesced(provider):
+    slow = SlowStaticProvider(histories=provider.histories)
+    market_data.set_provider(slow)
+    results = run_concurrently(lambda: market_data.fetch_historical_prices("AAPL", period="1y"))
+    assert slow.requests == 1
+    assert all(result is results[0] for result in results)
+    assert market_data._flights.in_flight() == 0
+
+
+def test_concurrent_quote_requests_are_coalesced(provider):
+    slow = SlowStaticProvider(provider.prices)
+    market_data.set_provider(slow)
+    results = run_concurrently(lambda: Stock("AAPL", "USD").price)
+    assert results == [200.0] * 8
+    assert slow.requests == 1
+
+
+def test_single_flight_shares_errors():
+    flights = market_data.SingleFlight()
+
+    def failing():
+        time.sleep(0.05)
+        raise ConnectionError("down")
+
+    def call():
+        try:
+            flights.do("key", failing)
+        except ConnectionError as error:
+            return error
+
+    errors = run_concurrently(call, count=4)
+    assert all(isinstance(error, ConnectionError) for error in errors)
+    assert flights.in_flight() == 0
+
+
+def test_record_and_replay(provider, tmp_path):
+    path = str(tmp_path / "recording.pt.gz")
+    market_data.set_history_cache(None)
+    with RecordingProvider(provider, path) as recorder:
+        market_data.set_provider(recorder)
+        Portfolio.load_transactions(CSV_FILE).__rich__()
+        recorded = market_data.fetch_historical_prices("AAPL", start="2024-01-10", end="2024-01-20")
+
+    market_data.set_provider(ReplayProvider(path, latency=0.01))
+    market_data.set_quote_cache(QuoteCache())
+    portfolio = Portfolio.load_transactions(CSV_FILE)
+    _, total = portfolio.calculate_performance()
+    assert total["current_value"] == 4500.0
+    replayed = market_data.fetch_historical_prices("AAPL", start="2024-01-10", end="2024-01-20")
+    pd.testing.assert_frame_equal(replayed, recorded, check_freq=False)
+
+    with pytest.raises(ValueError):
+        market_data.fetch_historical_prices("AAPL", period="1y")
+
+
+def test_coarse_intervals_derived_from_cached_daily_bars(provider, tmp_path):
+    provider.histories["AAPL"] = make_history("2024-01-01", 70)
+    provider.histories["AAPL"]["Volume"] = 10
+    daily = market_data.fetch_historical_prices("AAPL", period="max")
+    requests = provider.requests
+
+    weekly = market_data.fetch_historical_prices("AAPL", period="max", interval="1wk")
+    monthly = market_data.fetch_historical_prices("AAPL", start="2024-01-15", interval="1mo")
+    assert provider.requests == requests
+    assert not os.path.exists(HistoryCache(str(tmp_path)).path("AAPL", "1wk"))
+
+    # 2024-01-01 is a Monday: ten full weeks
+    assert len(weekly) == 10
+    assert weekly.index[1].strftime("%Y-%m-%d") == "2024-01-08"
+    assert weekly["Open"].iloc[1] == daily["Open"].iloc[7]
+    assert weekly["Close"].iloc[1] == daily["Close"].iloc[13]
+    assert weekly["High"].iloc[1] == daily["High"].iloc[7:14].max()
+    assert weekly["Volume"].iloc[1] == 70
+
+    assert [bar.strftime("%Y-%m-%d") for bar in monthly.index] == ["2024-01-01", "2024-02-01", "2024-03-01"]
+    assert monthly["Open"].iloc[0] == daily["Open"].iloc[14]
+    assert monthly["Close"].iloc[-1] == daily["Close"].iloc[-1]
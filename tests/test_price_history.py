@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pt import Stock
+from pt import market_data
+from pt.market_data import StaticProvider
+from pt.price_history import PriceHistory
+
+
+@pytest.fixture
+def frame():
+    index = pd.date_range("2024-01-01", periods=10, freq="2D", tz="America/New_York", name="Date")
+    close = np.arange(10, dtype=float) + 100
+    close[3] = np.nan
+    return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 5}, index=index)
+
+
+def test_from_frame_keeps_dates(frame):
+    history = PriceHistory.from_frame(frame)
+    assert len(history) == 9
+    assert history.dates.dtype == np.dtype("datetime64[D]")
+    assert history.dates[0] == np.datetime64("2024-01-01")
+    assert history.close.flags["C_CONTIGUOUS"]
+    pd.testing.assert_series_equal(history.to_frame()["Close"], frame["Close"].dropna().tz_localize(None),
+                                   check_freq=False, check_index_type=False)
+
+
+def test_asof(frame):
+    history = PriceHistory.from_frame(frame)
+    assert history.asof("2024-01-03") == 101.0
+    assert history.asof("2024-01-04") == 101.0
+    # The bar without a close is skipped
+    assert history.asof("2024-01-07") == 102.0
+    with pytest.raises(KeyError):
+        history.asof("2023-12-31")
+    np.testing.assert_array_equal(history.asof_many(["2023-12-31", "2024-01-02", "2030-01-01"]),
+                                  [np.nan, 100.0, 109.0])
+
+
+def test_window_is_a_view(frame):
+    history = PriceHistory.from_frame(frame)
+    window = history.window("2024-01-05", "2024-01-11")
+    assert window.dates.tolist() == history.dates[2:4].tolist()
+    assert np.shares_memory(window.close, history.close)
+    assert window.asof("2024-01-20") == 104.0
+
+
+def test_float32_storage(frame):
+    history = PriceHistory.from_frame(frame, dtype=np.float32)
+    assert history.close.dtype == np.float32
+    assert history.nbytes < PriceHistory.from_frame(frame).nbytes
+
+
+def test_asset_history(frame, tmp_path):
+    previous = market_data.set_provider(StaticProvider(histories={"AAPL": frame}))
+    previous_cache = market_data.set_history_cache(None)
+    try:
+        asset = Stock("AAPL", "USD")
+        assert isinstance(asset.history, PriceHistory)
+        assert asset.price_history == frame["Close"].dropna().tolist()
+    finally:
+        market_data.set_provider(previous)
+        market_data.set_history_cache(previous_cache)
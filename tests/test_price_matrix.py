@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pt.price_matrix import PriceMatrix
+
+
+@pytest.fixture
+def matrix(tmp_path):
+    prices = PriceMatrix.create(str(tmp_path / "prices"), ["AAPL", "SPY"], capacity=2)
+    prices.append("2024-01-02", {"AAPL": 100.0, "SPY": 400.0})
+    prices.append("2024-01-03", {"AAPL": 101.0})
+    prices.append("2024-01-05", np.array([102.0, 402.0]))
+    return prices
+
+
+def test_append_grows_in_place(matrix):
+    assert matrix.shape == (3, 2)
+    assert matrix.dates[-1] == np.datetime64("2024-01-05")
+    assert np.isnan(matrix.values[1, 1])
+    np.testing.assert_array_equal(matrix.column("AAPL"), [100.0, 101.0, 102.0])
+
+
+def test_reader_shares_mapped_file(matrix):
+    reader = PriceMatrix(matrix.path)
+    assert isinstance(reader.values.base, np.memmap) or isinstance(reader.values, np.memmap)
+    window = reader.window("2024-01-03", "2024-01-06", "SPY")
+    assert np.shares_memory(window, reader.values)
+    matrix.append("2024-01-08", {"AAPL": 103.0, "SPY": 403.0})
+    assert len(reader) == 3
+    reader.refresh()
+    assert len(reader) == 4
+    with pytest.raises(ValueError):
+        reader.append("2024-01-09", {"AAPL": 1.0})
+
+
+def test_asof_lookup(matrix):
+    assert matrix.asof("2024-01-04", "AAPL") == 101.0
+    np.testing.assert_array_equal(matrix.asof("2024-01-31"), [102.0, 402.0])
+    with pytest.raises(KeyError):
+        matrix.asof("2023-12-31")
+
+
+def test_dates_must_increase(matrix):
+    with pytest.raises(ValueError):
+        matrix.append("2024-01-05", {"AAPL": 1.0})
+
+
+def test_add_tickers_keeps_data(matrix):
+    matrix.add_tickers(["MSFT", "AAPL"])
+    assert matrix.tickers == ["AAPL", "SPY", "MSFT"]
+    np.testing.assert_array_equal(matrix.column("SPY")[[0, 2]], [400.0, 402.0])
+    assert np.isnan(matrix.column("MSFT")).all()
+
+
+def test_from_histories(tmp_path):
+    index = pd.date_range("2024-01-01", periods=3, freq="D", tz="America/New_York")
+    histories = {
+        "AAPL": pd.DataFrame({"Close": [1.0, 2.0, 3.0]}, index=index),
+        "SPY": pd.DataFrame({"Close": [5.0, 6.0]}, index=index[1:]),
+    }
+    prices = PriceMatrix.from_histories(str(tmp_path / "prices"), histories)
+    assert prices.shape == (3, 2)
+    assert prices.dates[0] == np.datetime64("2024-01-01")
+    assert np.isnan(prices.values[0, 1])
+    assert prices.asof("2024-01-03", "SPY") == 6.0
@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from pt import ConsolidatedPortfolio, Portfolio
+from pt.price_history import PriceHistory
+from pt.returns import daily_returns, money_weighted_return, time_weighted_return, xirr
+from tests.test_ingest import random_ledger, write_ledger
+from tests.test_valuation import histories
+
+
+def residual(rate, days, amounts):
+    """Present value of the flows relative to the present value of their sizes"""
+    discount = (1 + rate) ** -((np.asarray(days) - min(days)) / 365.0)
+    return float(np.sum(amounts * discount) / np.sum(np.abs(amounts) * discount))
+
+
+def test_xirr_known_rates():
+    rates = xirr([0, 0, 1, 1, 1, 2, 2], [0, 365, 0, 365, 730, 0, 365], [-1000, 1100, -1000, 0, 1210, -100, -5])
+    np.testing.assert_allclose(rates[:2], [0.1, 0.1])
+    assert np.isnan(rates[2])
+    days = np.array(["2020-01-01", "2021-01-01"], dtype="datetime64[D]")
+    assert xirr([0, 0], days, [-100, 50])[0] == pytest.approx(0.5 ** (365 / 366) - 1)
+
+
+def test_xirr_batch_of_thousands():
+    rng = np.random.default_rng(0)
+    count, per_entity = 3000, 12
+    entities = np.repeat(np.arange(count), per_entity)
+    days = np.sort(rng.integers(0, 3650, (count, per_entity)), axis=1).ravel()
+    amounts = -rng.uniform(10, 100, (count, per_entity))
+    # The last flow takes the money out with a wide spread of outcomes, from near total loss to tenfold
+    amounts[:, -1] = -amounts[:, :-1].sum(axis=1) * rng.choice([0.001, 0.5, 1.0, 2.0, 10.0], count)
+    amounts = amounts.ravel()
+    rates = xirr(entities, days, amounts)
+    assert np.isfinite(rates).all() and (rates >= -1).all()
+    # Near total losses within weeks have rates that round to -100%
+    for entity in rng.choice(np.flatnonzero(rates > -1 + 1e-9), 50, replace=False):
+        flows = entities == entity
+        assert abs(residual(rates[entity], days[flows], amounts[flows])) < 1e-8
+
+
+def test_time_weighted_return_ignores_flows():
+    values = np.array([100.0, 110.0, 170.0, 85.0, 93.5])
+    flows = np.array([0.0, 0.0, 50.0, -100.0, 0.0])
+    np.testing.assert_allclose(daily_returns(values, flows), [0, 0.1, 10 / 110, 15 / 170, 0.1])
+    assert time_weighted_return(values, flows) == pytest.approx(1.1 * (1 + 10 / 110) * (1 + 15 / 170) * 1.1 - 1)
+
+    # Two columns, the second bought on day 1 and sold in full on day 3
+    values = np.array([[100.0, 0.0], [110.0, 50.0], [121.0, 55.0], [133.1, 0.0]])
+    flows = np.array([[0.0, 0.0], [0.0, 50.0], [0.0, 0.0], [0.0, -60.5]])
+    np.testing.assert_allclose(time_weighted_return(values, flows), [0.331, 0.21])
+
+
+@pytest.fixture
+def simple_portfolio(tmp_path):
+    rows = [["USD", "Cash", "USD", "deposit", 2000.0, 1.0, 0.0, "2021-01-01"],
+            ["ABC", "Stock", "USD", "buy", 10.0, 100.0, 0.0, "2021-01-01"],
+            ["ABC", "Stock", "USD", "sell", 5.0, 110.0, 0.0, "2021-01-03"],
+            ["USD", "Cash", "USD", "deposit", 1000.0, 1.0, 0.0, "2021-01-04"]]
+    portfolio = Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", rows))
+    dates = np.arange(np.datetime64("2021-01-01"), np.datetime64("2021-01-06"))
+    prices = {"ABC": PriceHistory(dates, [100.0, 105.0, 110.0, 121.0, 121.0])}
+    return portfolio, prices
+
+
+def test_portfolio_and_asset_returns(simple_portfolio):
+    portfolio, prices = simple_portfolio
+    symbols, assets = portfolio.asset_returns(end="2021-01-06", prices=prices)
+    assert symbols == ["ABC"]
+    assert assets["time_weighted"][0] == pytest.approx(0.21)
+    # 1000 in on day 0, 550 out on day 2, 605 left on day 4
+    expected = xirr([0, 0, 0], [0, 2, 4], [-1000, 550, 605])[0]
+    assert assets["money_weighted"][0] == pytest.approx(expected)
+
+    returns = portfolio.returns(end="2021-01-06", prices=prices)
+    # Cash 1000 and stock 1000 on day 0, the deposit of day 3 earns the stock's 10% on its share of the value
+    values = np.array([0.0, 2000.0, 2050.0, 2100.0, 3155.0, 3155.0])
+    flows = np.array([0.0, 2000.0, 0.0, 0.0, 1000.0, 0.0])
+    assert returns["time_weighted"] == pytest.approx(time_weighted_return(values, flows))
+    assert returns["money_weighted"] == pytest.approx(
+        money_weighted_return(values, flows, np.arange(np.datetime64("2020-12-31"), np.datetime64("2021-01-06"))))
+
+
+def test_flows_count_at_the_end_of_their_day(tmp_path):
+    rows = [["USD", "Cash", "USD", "deposit", 1000.0, 1.0, 0.0, "2021-01-01"],
+            ["ABC", "Stock", "USD", "buy", 10.0, 10.0, 0.0, "2021-01-01"],
+            ["ABC", "Stock", "USD", "buy", 10.0, 11.0, 0.0, "2021-01-02"],
+            ["ABC", "Stock", "USD", "sell", 20.0, 12.0, 0.0, "2021-01-03"]]
+    portfolio = Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", rows))
+    dates = np.arange(np.datetime64("2021-01-01"), np.datetime64("2021-01-04"))
+    prices = {"ABC": PriceHistory(dates, [10.0, 11.0, 12.0])}
+    # Values 100, 220, 0 with flows 100, 110, -240: (220 - 110) / 100 = 1.1, then (0 + 240) / 220
+    _, assets = portfolio.asset_returns(end="2021-01-04", prices=prices)
+    assert assets["time_weighted"][0] == pytest.approx(0.2)
+    np.testing.assert_allclose(daily_returns([100.0, 220.0, 0.0], [100.0, 110.0, -240.0]), [0, 0.1, 1 / 11])
+
+
+def test_account_returns_match_each_portfolio(tmp_path):
+    for seed, name in enumerate(["broker", "pension"]):
+        write_ledger(tmp_path / f"portfolio_{name}.csv", random_ledger(300, seed))
+    consolidated = ConsolidatedPortfolio.load(str(tmp_path), processes=1)
+    prices = histories(consolidated.assets)
+    names, returns = consolidated.account_returns(end="2020-02-20", prices=prices)
+    for name, time_weighted, money_weighted in zip(names, returns["time_weighted"], returns["money_weighted"]):
+        expected = consolidated[name].returns("2020-01-01", "2020-02-20", prices)
+        assert time_weighted == pytest.approx(expected["time_weighted"])
+        assert money_weighted == pytest.approx(expected["money_weighted"], rel=1e-6)
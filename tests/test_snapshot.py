@@ -0,0 +1,115 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+from pt import Portfolio
+from pt.snapshot import SnapshotError, ledger_fingerprint, ledger_fingerprints, read_header, read_snapshot
+from tests.test_ingest import random_ledger, write_ledger
+
+
+def append_rows(path, rows):
+    with open(path, "a", newline="") as file:
+        csv.writer(file).writerows(rows)
+
+
+def assert_same(portfolio, expected):
+    assert list(portfolio.assets) == list(expected.assets)
+    for column in ("amount", "total_invested", "average_loading_price"):
+        np.testing.assert_allclose(portfolio.assets.column(column), expected.assets.column(column))
+    assert portfolio.cash.balances == expected.cash.balances
+    assert list(portfolio.transactions.to_csv_rows()) == list(expected.transactions.to_csv_rows())
+    assert len(portfolio.cash_flows) == len(expected.cash_flows)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    rows = random_ledger(1000)
+    return write_ledger(tmp_path / "ledger.csv", rows[:800]), rows[800:]
+
+
+def test_restart_replays_only_appended_rows(ledger):
+    path, appended = ledger
+    first = Portfolio.load(path)
+    assert read_header(path + ".snapshot")["offset"] == os.path.getsize(path)
+
+    calls = []
+    restarted = Portfolio.load(path, progress=lambda *args: calls.append(args))
+    assert calls == []
+    assert_same(restarted, first)
+
+    size = os.path.getsize(path)
+    append_rows(path, appended)
+    resumed = Portfolio.load(path, progress=lambda *args: calls.append(args))
+    assert calls[-1][0] == len(appended)
+    assert calls[-1][2] == os.path.getsize(path) - size
+    assert_same(resumed, Portfolio.load_transactions(path))
+    assert read_header(path + ".snapshot")["rows"] == 1002
+
+    # The resumed ledger keeps growing and answers queries
+    assert len(resumed.transactions.query(symbol="SYM1")) == len(resumed.transactions.rows(symbol="SYM1"))
+
+
+@pytest.mark.parametrize("damage", ["truncate", "flip", "garbage"])
+def test_corrupt_snapshot_is_rebuilt(ledger, damage):
+    path, _ = ledger
+    Portfolio.load(path)
+    with open(path + ".snapshot", "r+b") as file:
+        if damage == "truncate":
+            file.truncate(os.path.getsize(path + ".snapshot") // 2)
+        elif damage == "flip":
+            file.seek(-10, os.SEEK_END)
+            byte = file.read(1)
+            file.seek(-10, os.SEEK_END)
+            file.write(bytes([byte[0] ^ 0xFF]))
+        else:
+            file.write(b"garbage!")
+    with pytest.raises(SnapshotError):
+        read_snapshot(path + ".snapshot")
+
+    assert_same(Portfolio.load(path), Portfolio.load_transactions(path))
+    read_snapshot(path + ".snapshot")
+
+
+def test_rewritten_ledger_invalidates_snapshot(ledger, tmp_path):
+    path, _ = ledger
+    Portfolio.load(path)
+    # Same size, different first rows
+    with open(path, "r+b") as file:
+        file.write(b"usd,Cash,usd,deposit,2")
+    portfolio = Portfolio.load(path)
+    assert portfolio.cash["USD"] == Portfolio.load_transactions(path).cash["USD"]
+    assert portfolio.cash["USD"] > 1.5e9
+
+    Portfolio.load_transactions(path).save_transactions(tmp_path / "other.csv")
+    os.replace(tmp_path / "other.csv", path)
+    assert_same(Portfolio.load(path), Portfolio.load_transactions(path))
+
+
+def test_row_edited_in_place_invalidates_snapshot(tmp_path):
+    # Larger than any head and tail window a sampled hash could use
+    path = write_ledger(tmp_path / "ledger.csv", random_ledger(6000))
+    before = Portfolio.load(path).assets.total_invested()
+    with open(path, "rb") as file:
+        data = file.read()
+    assert len(data) > 1 << 18
+    middle = data.index(b"\nsym", len(data) // 2) + 1
+    line = data[middle:data.index(b"\n", middle)].split(b",")
+    line[5] = line[5].replace(line[5][:1], b"9" if line[5][:1] != b"9" else b"8", 1)
+    with open(path, "r+b") as file:
+        file.seek(middle)
+        file.write(b",".join(line))
+    assert os.path.getsize(path) == len(data)
+
+    total_invested = Portfolio.load(path).assets.total_invested()
+    assert total_invested == pytest.approx(Portfolio.load_transactions(path).assets.total_invested())
+    assert total_invested != pytest.approx(before)
+
+
+def test_fingerprints_of_prefixes_in_one_pass(ledger):
+    path, _ = ledger
+    size = os.path.getsize(path)
+    assert ledger_fingerprints(path, [size, 100, size // 2]) == \
+        [ledger_fingerprint(path, size), ledger_fingerprint(path, 100), ledger_fingerprint(path, size // 2)]
+    assert ledger_fingerprint(path, 100) != ledger_fingerprint(path, 101)
@@ -0,0 +1,127 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from pt import Portfolio, Stock, Transaction
+from pt.price_history import PriceHistory
+from pt.sqlite_store import SQLiteStore
+from pt.transaction import Transactions
+from tests.test_ingest import random_ledger, write_ledger
+
+
+@pytest.fixture
+def portfolio(tmp_path):
+    return Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", random_ledger(500)))
+
+
+def test_round_trip(portfolio, tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    portfolio.to_sqlite(path)
+    loaded = Portfolio.from_sqlite(path)
+    assert list(loaded.assets) == list(portfolio.assets)
+    for column in ("amount", "total_invested", "average_loading_price"):
+        np.testing.assert_array_equal(loaded.assets.column(column), portfolio.assets.column(column))
+    assert type(loaded.assets["SYM3"]).__name__ == "ETF"
+    assert loaded.cash.balances == portfolio.cash.balances
+    assert list(loaded.cash_flows.merge_csv_rows(loaded.transactions)) == \
+        list(portfolio.cash_flows.merge_csv_rows(portfolio.transactions))
+
+
+def test_append_updates_positions(portfolio, tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    portfolio.to_sqlite(path)
+    new = [Transaction(Stock("SYM1", "USD"), "buy", "USD", 3.0, 99.0, 1.0, "2021-01-01"),
+           Transaction(Stock("SYM1", "USD"), "sell", "USD", 1.0, 120.0, 1.0, "2021-01-02"),
+           Transaction(Stock("NEW", "USD"), "buy", "USD", 2.0, 10.0, 1.0, "2021-01-03")]
+    with SQLiteStore(path) as store:
+        store.append(Transactions(new))
+    for transaction in new:
+        portfolio.add_transaction(transaction)
+
+    loaded = Portfolio.from_sqlite(path)
+    assert list(loaded.assets) == list(portfolio.assets)
+    for column in ("amount", "total_invested", "average_loading_price"):
+        np.testing.assert_allclose(loaded.assets.column(column), portfolio.assets.column(column))
+    assert len(loaded.transactions) == len(portfolio.transactions)
+    assert loaded.cash.balances == pytest.approx(portfolio.cash.balances)
+
+
+def test_append_refuses_unaffordable_trades(portfolio, tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    portfolio.to_sqlite(path)
+    balance = portfolio.cash["USD"]
+    new = [Transaction(Stock("SYM1", "USD"), "buy", "USD", 1.0, 10.0, 0.0, "2021-01-01"),
+           Transaction(Stock("SYM1", "USD"), "buy", "USD", 1.0, balance, 0.0, "2021-01-02")]
+    with SQLiteStore(path) as store:
+        with pytest.raises(ValueError, match="Insufficient cash balance for USD."):
+            store.append(Transactions(new))
+    loaded = Portfolio.from_sqlite(path)
+    assert loaded.cash.balances == portfolio.cash.balances
+    np.testing.assert_array_equal(loaded.assets.column("amount"), portfolio.assets.column("amount"))
+    assert len(loaded.transactions) == len(portfolio.transactions)
+
+
+def test_append_takes_positions_to_zero(portfolio, tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    portfolio.to_sqlite(path)
+    held = portfolio.assets["SYM1"].amount
+    new = [Transaction(Stock("SYM1", "USD"), "sell", "USD", held, 100.0, 0.0, "2021-01-01"),
+           Transaction(Stock("SHORT", "USD"), "sell", "USD", 2.0, 10.0, 0.0, "2021-01-02"),
+           Transaction(Stock("SHORT", "USD"), "buy", "USD", 2.0, 10.0, 0.0, "2021-01-03")]
+    with SQLiteStore(path) as store:
+        store.append(Transactions(new))
+        rows = dict((row[0], row[1:]) for row in store.connection.execute(
+            "SELECT symbol, amount, average_loading_price FROM positions WHERE symbol IN ('SYM1', 'SHORT')"))
+    assert rows["SYM1"] == (0.0, portfolio.assets["SYM1"].average_loading_price)
+    assert rows["SHORT"] == (0.0, 0.0)
+
+
+def test_indexed_queries(portfolio, tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    portfolio.to_sqlite(path)
+    with SQLiteStore(path) as store:
+        found = store.transactions(symbol="SYM1", start="2020-02-01", end="2020-03-01")
+        expected = portfolio.transactions.query(symbol="SYM1", start="2020-02-01", end="2020-03-01")
+        assert list(found.to_csv_rows()) == list(expected.to_csv_rows())
+        assert len(store.transactions(type="sell")) == len(portfolio.transactions.query(type="sell"))
+
+        for where, index in (("symbol = 'A' AND date >= '2020'", "transactions_symbol_date"),
+                             ("type = 'sell' AND date >= '2020'", "transactions_type_date")):
+            plan = store.connection.execute(f"EXPLAIN QUERY PLAN SELECT * FROM transactions WHERE {where}").fetchall()
+            assert index in str(plan)
+
+
+def test_performance_in_sql(portfolio, tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    portfolio.to_sqlite(path)
+    rng = np.random.default_rng(0)
+    prices = {}
+    with SQLiteStore(path) as store:
+        dates = np.arange("2023-01-01", "2023-01-11", dtype="datetime64[D]")
+        for symbol in list(portfolio.assets)[:-1]:
+            closes = rng.uniform(10, 500, len(dates))
+            store.store_prices(symbol, PriceHistory(dates, closes))
+            prices[symbol] = closes[4]
+        np.testing.assert_array_equal(store.prices("SYM1", "2023-01-03", "2023-01-05").dates, dates[2:4])
+
+        symbols, performance, total = store.performance(as_of="2023-01-05")
+    assert symbols == list(portfolio.assets)
+    expected, expected_total = portfolio.assets.performance(
+        [prices.get(symbol, np.nan) for symbol in symbols])
+    for key in ("current_value", "profit_loss", "profit_loss_percentage"):
+        np.testing.assert_allclose(performance[key], expected[key])
+    assert np.isnan(performance["current_value"][-1]) and np.isnan(total["current_value"])
+
+
+def test_wal_reader_not_blocked_by_writer(portfolio, tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    portfolio.to_sqlite(path)
+    with SQLiteStore(path) as writer:
+        assert writer.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        writer.connection.execute("BEGIN IMMEDIATE")
+        writer.connection.execute("DELETE FROM transactions")
+        reader = sqlite3.connect(path, timeout=0)
+        assert reader.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == len(portfolio.transactions)
+        reader.close()
+        writer.connection.rollback()
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from pt import Transaction, Stock, ETF
+from pt.transaction import Transactions
+
+
+def make_ledger():
+    transactions = Transactions(transactions_per_page=2)
+    transactions.append(Transaction(Stock("AAPL", "USD"), "buy", "USD", 10.0, 150.0, 1.0, "2023-01-05"))
+    transactions.append(Transaction(ETF("SPY", "USD"), "buy", "USD", 5.0, 400.0, 1.0, "2023-02-01"))
+    transactions.append_row("AAPL", "Stock", "sell", "USD", 4.0, 170.0, 1.0, "2023-06-30")
+    return transactions
+
+
+def test_columns_are_dictionary_encoded():
+    transactions = make_ledger()
+    assert len(transactions) == 3
+    assert transactions.categories["symbol"].values == ["AAPL", "SPY"]
+    np.testing.assert_array_equal(transactions.column("symbol"), [0, 1, 0])
+    assert transactions.column("day").dtype == np.int32
+    assert transactions.dates[2] == np.datetime64("2023-06-30")
+    np.testing.assert_array_equal(transactions.amounts, [10.0, 5.0, 4.0])
+
+
+def test_rows_materialize_on_index():
+    transactions = make_ledger()
+    transaction = transactions[-1]
+    assert isinstance(transaction, Transaction)
+    assert isinstance(transaction.asset, Stock)
+    assert (transaction.asset.name, transaction.type, transaction.amount, transaction.date) == \
+        ("AAPL", "sell", 4.0, "2023-06-30")
+    assert [t.asset.name for t in transactions] == ["AAPL", "SPY", "AAPL"]
+    with pytest.raises(IndexError):
+        transactions[3]
+
+
+def test_slice_and_filter_stay_columnar():
+    transactions = make_ledger()
+    assert isinstance(transactions[1:], Transactions)
+    assert len(transactions[1:]) == 2
+    aapl = transactions.filter_by_asset("AAPL")
+    np.testing.assert_array_equal(aapl.prices, [150.0, 170.0])
+    assert len(transactions.filter_by_asset("MSFT")) == 0
+    # Appending to a slice does not touch the ledger it came from
+    aapl.append_row("AAPL", "Stock", "buy", "USD", 1.0, 1.0, 0.0, "2024-01-01")
+    assert len(transactions) == 3
+
+
+def test_growth_and_export():
+    transactions = Transactions()
+    for i in range(100):
+        transactions.append_row(f"T{i % 7}", "Stock", "buy", "USD", float(i), 1.0, 0.0, "2024-01-01")
+    assert len(transactions) == 100
+    rows = list(transactions.to_csv_rows())
+    assert rows[99] == ["T1", "Stock", "USD", "buy", 99.0, 1.0, 0.0, "2024-01-01"]
+    assert rows[0] == transactions[0].to_csv_row()
+
+
+def test_pagination():
+    transactions = make_ledger()
+    assert transactions.total_pages() == 2
+    assert transactions.current_page == 2
+    assert "Page 2/2" in transactions.__repr__()
+    transactions.first_page()
+    assert len(transactions.get_paginated_transactions()) == 1
+
+
+def test_indexed_queries():
+    transactions = make_ledger()
+    sells = transactions.query(symbol="AAPL", type="sell", start="2023-01-01", end="2024-01-01")
+    assert len(sells) == 1 and sells[0].price == 170.0
+    assert len(transactions.query(start="2023-02-01")) == 2
+    assert len(transactions.query(end="2023-02-01")) == 1
+    assert len(transactions.query(currency="EUR")) == 0
+    assert len(transactions.query(symbol="MSFT")) == 0
+
+
+def test_indexes_follow_appends():
+    transactions = make_ledger()
+    transactions.query(symbol="AAPL")
+    # An older row is inserted at its place in the date indexes
+    transactions.append_row("AAPL", "Stock", "sell", "USD", 1.0, 120.0, 0.0, "2022-12-01")
+    transactions.append(Transaction(Stock("MSFT", "USD"), "buy", "USD", 1.0, 300.0, 0.0, "2023-03-01"))
+    np.testing.assert_array_equal(transactions.rows(symbol="AAPL", type="sell"), [2, 3])
+    np.testing.assert_array_equal(transactions.rows(end="2023-01-01"), [3])
+    np.testing.assert_array_equal(transactions.rows(symbol="MSFT"), [4])
+
+
+def test_queries_match_scan():
+    rng = np.random.default_rng(0)
+    transactions = Transactions()
+    days = rng.integers(0, 400, 500)
+    for i, day in enumerate(days):
+        date = str(np.datetime64("2023-01-01") + day)
+        transactions.append_row(f"T{i % 5}", "Stock", ["buy", "sell"][i % 2], "USD", 1.0, 1.0, 0.0, date)
+    symbols = transactions.values("symbol")
+    types = transactions.values("type")
+    dates = transactions.dates
+    expected = np.flatnonzero((symbols == "T3") & (types == "sell") &
+                              (dates >= np.datetime64("2023-03-01")) & (dates < np.datetime64("2023-09-01")))
+    np.testing.assert_array_equal(transactions.rows("T3", "sell", start="2023-03-01", end="2023-09-01"), expected)
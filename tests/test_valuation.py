@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from pt import Portfolio
+from pt.fx import FXRates
+from pt.price_history import PriceHistory
+from pt.price_matrix import PriceMatrix
+from tests.test_ingest import random_ledger, replay_rows, write_ledger
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    rows = random_ledger(500)
+    return rows, Portfolio.load_transactions(write_ledger(tmp_path / "ledger.csv", rows))
+
+
+def histories(symbols, seed=1):
+    rng = np.random.default_rng(seed)
+    result = {}
+    for i, symbol in enumerate(symbols):
+        # Prices start at different days and skip weekends, as of lookups fill the gaps
+        dates = np.arange(np.datetime64("2019-12-20") + i % 5, np.datetime64("2020-03-01"))
+        dates = dates[(dates.astype(np.int64) + 3) % 7 < 5]
+        result[symbol] = PriceHistory(dates, rng.uniform(10, 100, len(dates)))
+    return result
+
+
+def test_matches_day_by_day_replay(ledger):
+    rows, portfolio = ledger
+    prices = histories(portfolio.assets)
+    valuation = portfolio.valuation_series(end="2020-02-25", prices=prices)
+    assert valuation.dates[0] == np.datetime64("2020-01-01") and len(valuation) == 55
+
+    for day, date in enumerate(valuation.dates.astype(str)):
+        positions, balances = replay_rows([row for row in rows if row[7] <= date])
+        expected_holdings = [positions.get(symbol, (0.0,))[0] for symbol in valuation.symbols]
+        np.testing.assert_allclose(valuation.holdings[day], expected_holdings, atol=1e-9)
+        price = np.array([prices[symbol].asof_many([date])[0] for symbol in valuation.symbols])
+        held = np.array(expected_holdings) != 0
+        assert valuation.market_value[day] == pytest.approx((np.array(expected_holdings) * price)[held].sum())
+        assert valuation.cash[day] == pytest.approx(sum(balances.values()))
+        assert valuation.invested[day] == pytest.approx(sum(position[1] for position in positions.values()))
+    deposits = sum(row[4] * (1 if row[3].lower() == "deposit" else -1)
+                   for row in rows if row[1] == "Cash" and row[7] < "2020-02-25")
+    assert valuation.flows.sum() == pytest.approx(deposits)
+
+
+def test_price_matrix_and_window(ledger, tmp_path):
+    _, portfolio = ledger
+    prices = histories(portfolio.assets)
+    full = portfolio.valuation_series(end="2020-02-25", prices=prices)
+    matrix = PriceMatrix.from_histories(str(tmp_path / "prices"), prices)
+    np.testing.assert_allclose(portfolio.valuation_series(end="2020-02-25", prices=matrix).total, full.total)
+
+    # Rows before the start make up the opening state
+    window = portfolio.valuation_series("2020-01-20", "2020-02-10", prices=prices)
+    offset = 19
+    np.testing.assert_array_equal(window.holdings, full.holdings[offset:offset + 21])
+    np.testing.assert_allclose(window.cash, full.cash[offset:offset + 21])
+    np.testing.assert_allclose(window.invested, full.invested[offset:offset + 21])
+    np.testing.assert_allclose(window.flows, full.flows[offset:offset + 21])
+    assert list(window.to_frame().columns) == ["market_value", "cash", "total", "invested", "flows"]
+
+
+def test_missing_price_of_held_asset_is_nan(ledger):
+    _, portfolio = ledger
+    prices = histories(portfolio.assets)
+    del prices["SYM1"]
+    valuation = portfolio.valuation_series(end="2020-02-25", prices=prices)
+    held = valuation.holdings[:, valuation.symbols.index("SYM1")] != 0
+    assert np.isnan(valuation.market_value[held]).all()
+    assert not np.isnan(valuation.market_value[~held]).any()
+
+
+def test_currency_conversion(ledger):
+    _, portfolio = ledger
+    fx = FXRates(fetch=None)
+    dates = np.arange(np.datetime64("2019-12-01"), np.datetime64("2020-03-01"))
+    rates = np.linspace(1.0, 1.2, len(dates))
+    fx.set_rates("EUR", "USD", dates, rates)
+    portfolio.cash.fx = fx
+    prices = histories(portfolio.assets)
+    native = portfolio.valuation_series(end="2020-02-25", prices=prices)
+    converted = portfolio.valuation_series(end="2020-02-25", prices=prices, currency="USD")
+
+    rate = fx.rates("EUR", "USD", native.dates)
+    for name in ("EUR", "USD"):
+        column = native.currencies.index(name)
+        np.testing.assert_array_equal(converted.balances[:, column], native.balances[:, column])
+    factors = np.array([rate if name == "EUR" else np.ones(len(rate)) for name in native.currencies]).T
+    np.testing.assert_allclose(converted.cash, (native.balances * factors).sum(axis=1))
+    eur = native.symbols.index("SYM7")
+    np.testing.assert_allclose(converted.prices[:, eur], native.prices[:, eur] * rate)
+
+
+def test_errors(tmp_path):
+    portfolio = Portfolio.load_transactions(write_ledger(tmp_path / "empty.csv", []))
+    with pytest.raises(ValueError, match="No ledger rows"):
+        portfolio.valuation_series(prices={})
+    with pytest.raises(ValueError, match="after its start"):
+        portfolio.valuation_series("2020-01-02", "2020-01-02", prices={})